@@ -15,9 +15,9 @@ class LicensePlateAdmin(admin.ModelAdmin):
 
 @admin.register(BorderCheck)
 class BorderCheckAdmin(admin.ModelAdmin):
-    list_display = ('vehicle', 'border_name', 'checked_at', 'is_approved')
+    list_display = ('vehicle', 'border_name', 'checked_at', 'authorization_status', 'is_approved')
     search_fields = ('vehicle__vehicle_model', 'border_name')
-    list_filter = ('is_approved', 'checked_at')
-    fields = ('vehicle', 'border_name', 'authorization_file', 'is_approved')  # Added authorization_file field
-    readonly_fields = ('is_approved',)  # is_approved field is set based on file content
+    list_filter = ('is_approved', 'authorization_status', 'checked_at')
+    fields = ('vehicle', 'border_name', 'authorization_file', 'authorization_status', 'is_approved')  # Added authorization_file field
+    readonly_fields = ('authorization_status', 'is_approved',)  # Both are set based on file content, in the background
 
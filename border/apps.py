@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BorderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'border'
+
+    def ready(self):
+        # Count registry changes for the plate indexes of other processes
+        from border import signals  # noqa: F401
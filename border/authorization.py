@@ -0,0 +1,159 @@
+import atexit
+import hashlib
+import queue
+import threading
+
+import fitz  # PyMuPDF
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection
+
+AUTHORIZATION_PATTERN = "AUTHORIZED TO PASS"
+
+
+def file_hash(file):
+    """SHA-256 of an uploaded or stored file, read in chunks."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def document_authorizes(path, pattern=AUTHORIZATION_PATTERN):
+    """
+    Check a PDF for the authorization pattern.
+
+    Pages are read one at a time and reading stops at the first page that
+    has the pattern, so an approved document is rarely read to the end.
+    """
+    if not path.lower().endswith('.pdf'):
+        return False
+    with fitz.open(path) as doc:
+        for page in doc:
+            # Collapse line breaks and runs of spaces, so a wrapped phrase still matches
+            if pattern in ' '.join(page.get_text().split()):
+                return True
+    return False
+
+
+class AuthorizationChecker:
+    """
+    Background checker of border check authorization files.
+
+    A border check with a new file is saved as pending and its id queued
+    here; a worker thread reads the file and stores the result on every
+    pending check with the same file content. Results are kept by content
+    hash, so a re-upload or a duplicate of a known file is decided at save
+    time without opening it again. The server starts the checker (see
+    border_control.wsgi), which first requeues every check still pending.
+    """
+
+    cache_size = 1024
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._results = {}  # file hash -> approved, oldest first
+        self._lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def cached_result(self, content_hash):
+        """
+        Result of an earlier check of the same file content.
+        :return: True or False, None if the content has not been checked yet.
+        """
+        with self._lock:
+            if content_hash in self._results:
+                return self._results[content_hash]
+
+        from border.models import BorderCheck
+
+        approved = (
+            BorderCheck.objects
+            .filter(authorization_file_hash=content_hash,
+                    authorization_status__in=(BorderCheck.APPROVED, BorderCheck.REJECTED))
+            .values_list('is_approved', flat=True).first()
+        )
+        if approved is not None:
+            self._remember(content_hash, approved)
+        return approved
+
+    def _remember(self, content_hash, approved):
+        with self._lock:
+            self._results[content_hash] = approved
+            while len(self._results) > self.cache_size:
+                del self._results[next(iter(self._results))]
+
+    def submit(self, check_id, content_hash):
+        """Queue a pending border check for its file to be read."""
+        self.start()
+        self._queue.put((check_id, content_hash))
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='authorization-checker', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout=5.0):
+        """Stop the worker after the check it is busy with."""
+        self._stop_event.set()
+        self._queue.put(None)
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self):
+        from border.models import BorderCheck
+
+        try:
+            try:
+                # Pick up checks left pending by an earlier process
+                for job in BorderCheck.objects.filter(authorization_status=BorderCheck.PENDING).values_list('pk', 'authorization_file_hash'):
+                    self._queue.put(job)
+            except Exception as e:
+                # Still check new files; the pending ones are picked up by the next start
+                print(f"Error requeuing pending border checks: {e}")
+
+            while not self._stop_event.is_set():
+                job = self._queue.get()
+                if job is None:
+                    continue
+                close_old_connections()
+                try:
+                    self._check(*job)
+                except Exception as e:
+                    print(f"Error checking authorization of border check {job[0]}: {e}")
+        finally:
+            connection.close()
+            with self._start_lock:
+                self._thread = None  # Let the next submit() start a new worker
+
+    def _check(self, check_id, content_hash):
+        from border.models import BorderCheck
+
+        approved = self.cached_result(content_hash)
+        if approved is None:
+            check = BorderCheck.objects.filter(pk=check_id, authorization_file_hash=content_hash).first()
+            if check is None:
+                return  # Deleted, or its file replaced, since it was queued
+            try:
+                approved = document_authorizes(default_storage.path(check.authorization_file.name))
+            except Exception as e:
+                print(f"Error reading file: {e}")
+                approved = False
+            self._remember(content_hash, approved)
+
+        # Every check still waiting on the same content gets the same result.
+        # Saving each one fires post_save, which refreshes the plate index.
+        status = BorderCheck.APPROVED if approved else BorderCheck.REJECTED
+        for check in BorderCheck.objects.filter(authorization_file_hash=content_hash,
+                                                authorization_status=BorderCheck.PENDING):
+            check.is_approved = approved
+            check.authorization_status = status
+            check.save(update_fields=['is_approved', 'authorization_status'])
+
+
+authorization_checker = AuthorizationChecker()
@@ -0,0 +1,23 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from border.registry import FORMATS, KINDS, export_records, guess_format
+
+
+class Command(BaseCommand):
+    help = "Export vehicles, plates or border checks as CSV or JSON Lines, streamed from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('--output', help="File to write (default: standard output).")
+        parser.add_argument('--format', choices=FORMATS, help="Output format (default: from the file extension, else csv).")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['output'])
+        output = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            output.writelines(export_records(options['kind'], fmt))
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from border.registry import FORMATS, KINDS, guess_format, import_records, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import vehicles, plates or border checks from a CSV or JSON Lines file, "
+        "validated and written in chunks. Invalid records are skipped and reported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help="File to import, - for standard input.")
+        parser.add_argument('--format', choices=FORMATS, help="Input format (default: from the file extension, else csv).")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Records per transaction (default: 1000).")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        if options['path'] == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(options['path'], newline='', encoding='utf-8-sig')
+            except OSError as e:
+                raise CommandError(f"Could not open {options['path']}: {e}")
+
+        read = imported = skipped = 0
+        with stream:
+            for read, imported, errors in import_records(options['kind'], read_records(stream, fmt), options['chunk_size']):
+                skipped += len(errors)
+                for line, message in errors:
+                    self.stderr.write(f"Line {line}: {message}")
+                self.stdout.write(f"Read {read}, imported {imported}, skipped {skipped}")
+
+        style = self.style.WARNING if skipped else self.style.SUCCESS
+        self.stdout.write(style(f"Imported {imported} {options['kind']} record(s), skipped {skipped}"))
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:35
+
+import hashlib
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+
+def set_authorization_status(apps, schema_editor):
+    """Existing checks were read synchronously; keep their result and hash their files where they still exist."""
+    BorderCheck = apps.get_model('border', 'BorderCheck')
+    for check in BorderCheck.objects.exclude(authorization_file='').exclude(authorization_file__isnull=True):
+        check.authorization_status = 'approved' if check.is_approved else 'rejected'
+        try:
+            digest = hashlib.sha256()
+            with default_storage.open(check.authorization_file.name) as file:
+                for chunk in file.chunks():
+                    digest.update(chunk)
+            check.authorization_file_hash = digest.hexdigest()
+        except OSError:
+            pass
+        check.save(update_fields=['authorization_status', 'authorization_file_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('border', '0003_alter_bordercheck_vehicle_alter_licenseplate_vehicle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bordercheck',
+            name='authorization_file_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='bordercheck',
+            name='authorization_status',
+            field=models.CharField(choices=[('none', 'No file'), ('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='none', editable=False, max_length=10),
+        ),
+        migrations.RunPython(set_authorization_status, migrations.RunPython.noop),
+    ]
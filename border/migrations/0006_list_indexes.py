@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('border', '0005_registryversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bordercheck',
+            name='checked_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='licenseplate',
+            name='license_plate_number',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='vehicle',
+            name='owner_name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(django.db.models.functions.text.Upper('owner_name'), name='border_vehicle_owner_upper'),
+        ),
+        migrations.AddIndex(
+            model_name='vehicle',
+            index=models.Index(django.db.models.functions.text.Upper('vehicle_model'), name='border_vehicle_model_upper'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:40
+
+import re
+
+from django.db import migrations, models
+
+# Frozen copy of plate_formats.plate_key() as it was when this migration
+# was written, so later changes to the grammar do not change what it did
+
+_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_DIGITS = '0123456789'
+_LETTER_CONFUSIONS = {'0': 'C', '1': 'I', '3': 'J', '4': 'A', '6': 'G', '5': 'S', '8': 'B', '2': 'Z'}
+_DIGIT_CONFUSIONS = {'O': '0', 'I': '1', 'J': '3', 'A': '4', 'G': '6', 'S': '5', 'B': '8', 'Z': '2'}
+_PATTERNS = ['R@@###@', 'R@@###@@', 'U@@###@', 'K@@###@', 'T###@@@']
+
+
+def _read(pattern, text):
+    """(letter/digit confusions undone, text read as the pattern), None if it does not fit."""
+    fixes, plate = 0, ''
+    for symbol, char in zip(pattern, text):
+        valid, confusions = {
+            '@': (_LETTERS, _LETTER_CONFUSIONS),
+            '#': (_DIGITS, _DIGIT_CONFUSIONS),
+            '*': (_LETTERS + _DIGITS, {}),
+        }.get(symbol, (symbol, _LETTER_CONFUSIONS if symbol in _LETTERS else _DIGIT_CONFUSIONS))
+        if char in valid:
+            plate += char
+        elif char in confusions and confusions[char] in valid:
+            fixes += 1
+            plate += confusions[char]
+        else:
+            return None
+    return fixes, plate
+
+
+def plate_key(text):
+    text = re.sub('[^A-Z0-9]', '', text.upper())
+    readings = [_read(pattern, text) for pattern in _PATTERNS if len(pattern) == len(text)]
+    readings = [reading for reading in readings if reading is not None]
+    if readings:
+        text = min(readings, key=lambda reading: reading[0])[1]
+    return text or None
+
+
+def backfill_plate_keys(apps, schema_editor):
+    """
+    Key every plate, and list the plates that share a key: the gate can
+    only tell them apart by an exact reading of their number.
+    """
+    LicensePlate = apps.get_model('border', 'LicensePlate')
+    by_key = {}
+    for plate in LicensePlate.objects.order_by('vehicle_id', 'pk'):
+        plate.plate_key = plate_key(plate.license_plate_number)
+        plate.save(update_fields=['plate_key'])
+        by_key.setdefault(plate.plate_key, []).append(plate)
+
+    for key, plates in by_key.items():
+        if key is not None and len(plates) > 1:
+            numbers = ', '.join(f"{plate.pk} ({plate.license_plate_number!r}, vehicle {plate.vehicle_id})" for plate in plates)
+            print(f"\n  Plates {numbers} share the key {key}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('border', '0006_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='licenseplate',
+            name='plate_key',
+            field=models.CharField(db_index=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(backfill_plate_keys, migrations.RunPython.noop),
+    ]
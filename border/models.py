@@ -1,78 +1,153 @@
-from django.db import models
-import fitz  # PyMuPDF
-from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Upper
+
+from border.authorization import authorization_checker, file_hash
+import plate_formats
 
 class Vehicle(models.Model):
     vehicle_model = models.CharField(max_length=100)
     vehicle_color = models.CharField(max_length=50)
-    owner_name = models.CharField(max_length=100)
+    owner_name = models.CharField(max_length=100, db_index=True)
     country_of_origin = models.CharField(max_length=50)
     destination_country = models.CharField(max_length=50)
     vehicle_photo = models.ImageField(upload_to='vehicle_photos/', blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Case-insensitive prefix search of the vehicle list
+            models.Index(Upper('owner_name'), name='border_vehicle_owner_upper'),
+            models.Index(Upper('vehicle_model'), name='border_vehicle_model_upper'),
+        ]
+
     def __str__(self):
         return f"{self.vehicle_model} - {self.owner_name}"
 
 
 class LicensePlate(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='license_plates')
-    license_plate_number = models.CharField(max_length=20)
+    license_plate_number = models.CharField(max_length=20, db_index=True)
+    # plate_formats.plate_key of license_plate_number, what the gate looks plates up by.
+    # Not unique: numbers that only differ in a letter/digit confusion share it.
+    plate_key = models.CharField(max_length=20, null=True, editable=False, db_index=True)
     license_plate_image = models.ImageField(upload_to='license_plates/', blank=True, null=True)
     issued_at = models.DateField()
 
+    def clean(self):
+        self.plate_key = plate_formats.plate_key(self.license_plate_number)
+        if self.plate_key is None:
+            raise ValidationError({'license_plate_number': "A plate number needs letters or digits."})
+        number = plate_formats.PlateGrammar.clean(self.license_plate_number)
+        for registered in LicensePlate.objects.filter(plate_key=self.plate_key).exclude(pk=self.pk):
+            if plate_formats.PlateGrammar.clean(registered.license_plate_number) == number:
+                raise ValidationError({
+                    'license_plate_number': f"Plate {registered.license_plate_number} is already registered."
+                })
+
+    def save(self, *args, **kwargs):
+        self.plate_key = plate_formats.plate_key(self.license_plate_number)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'license_plate_number' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'plate_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.license_plate_number
 
 
 class BorderCheck(models.Model):
+    NO_FILE = 'none'
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+    AUTHORIZATION_STATUSES = [
+        (NO_FILE, 'No file'),
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (REJECTED, 'Rejected'),
+    ]
+
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='border_checks')
     border_name = models.CharField(max_length=100)
-    checked_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(auto_now_add=True, db_index=True)
     authorization_file = models.FileField(upload_to='authorization_docs/', blank=True, null=True)
+    authorization_file_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    authorization_status = models.CharField(
+        max_length=10, choices=AUTHORIZATION_STATUSES, default=NO_FILE, editable=False
+    )
     is_approved = models.BooleanField(default=False)
 
     def save(self, *args, **kwargs):
-        # If an authorization file is uploaded, check for the specific pattern
-        if self.authorization_file:
-            # Save the instance first to get the file path
-            super().save(*args, **kwargs)
-            # Check file authorization status
-            self.is_approved = self.check_authorization_file(self.authorization_file)
-            # Update the instance again with the approval status
-            super().save(update_fields=['is_approved'])
-        else:
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'authorization_file' not in update_fields:
             super().save(*args, **kwargs)
+            return
 
-    def check_authorization_file(self, file):
+        pending = self._prepare_authorization()
+        super().save(*args, **kwargs)
+        if pending:
+            # The file is read in the background once the row is committed
+            check_id, content_hash = self.pk, self.authorization_file_hash
+            transaction.on_commit(lambda: authorization_checker.submit(check_id, content_hash))
+
+    def _prepare_authorization(self):
         """
-        This method reads the uploaded PDF file and checks if the specific pattern is found.
-        If the pattern is found, the vehicle will be approved.
+        Set the authorization status for the current file before saving.
+        Files already checked, here or in another border check, are decided
+        right away by their content hash.
+        :return: True if the file still has to be read.
         """
-        specific_pattern = "AUTHORIZED TO PASS"  # Define your pattern here
-
-        try:
-            # Ensure file exists and is of correct type
-            file_path = default_storage.path(file.name)
-            if not file_path.lower().endswith('.pdf'):
-                return False
-
-            # Open and read the PDF file
-            doc = fitz.open(file_path)
-            full_text = []
-            for page_num in range(doc.page_count):
-                page = doc.load_page(page_num)
-                full_text.append(page.get_text())
-            document_text = '\n'.join(full_text)
-            doc.close()
-            
-            # Check if the pattern is in the document
-            if specific_pattern in document_text:
-                return True
-        except Exception as e:
-            # Log the exception or handle it as needed
-            print(f"Error reading file: {e}")
+        if not self.authorization_file:
+            self.authorization_file_hash = ''
+            self.authorization_status = self.NO_FILE
+            return False
+        if self.authorization_file._committed and self.authorization_status != self.NO_FILE:
+            return False  # Same file as before
+
+        self.authorization_file_hash = file_hash(self.authorization_file)
+        if not self.authorization_file.name.lower().endswith('.pdf'):
+            approved = False
+        else:
+            approved = authorization_checker.cached_result(self.authorization_file_hash)
 
+        if approved is None:
+            self.authorization_status = self.PENDING
+            self.is_approved = False
+            return True
+        self.authorization_status = self.APPROVED if approved else self.REJECTED
+        self.is_approved = approved
         return False
 
     def __str__(self):
         return f"Border Check for {self.vehicle} at {self.border_name} on {self.checked_at}"
+
+
+class RegistryVersion(models.Model):
+    """
+    Counter of changes to the registry the gate decides on, one row.
+
+    It is bumped in the same transaction as every change to a plate, a
+    border check or a vehicle, and by every chunk of a bulk import, so
+    processes holding a copy of the registry (recognition.plate_index in
+    web servers and lane workers) can tell from one cheap query that they
+    have to reload.
+    """
+    version = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls):
+        """Count one change. :return: The version it made."""
+        # The row stays locked until the change commits, so the version
+        # read back is the one this change made
+        with transaction.atomic():
+            bumped = cls.objects.filter(pk=1)
+            if not bumped.update(version=F('version') + 1):
+                _, created = cls.objects.get_or_create(pk=1, defaults={'version': 1})
+                if not created:  # Another process created the row first
+                    bumped.update(version=F('version') + 1)
+            return cls.current()
@@ -0,0 +1,412 @@
+"""
+Bulk import and export of the border registry as CSV or JSON Lines.
+
+Imports read one record at a time, validate them in chunks and write every
+chunk with bulk_create in its own transaction. Exports read the table
+through a server side cursor and yield it line by line. Neither side ever
+holds a whole table in memory.
+
+There are three kinds of record:
+
+    vehicles        a vehicle, with at most one of its plates per row;
+                    consecutive rows with the same id are one vehicle
+    plates          a plate of an existing vehicle, by vehicle_id
+    border_checks   a border check of an existing vehicle, by vehicle_id or
+                    license_plate_number
+
+Exports have an id column, plus one vehicles row per plate of a vehicle,
+so an exported vehicles file imports back as the same vehicles and plates.
+Imported records get new ids.
+
+bulk_create sends no model signals, so every chunk bumps the
+RegistryVersion itself, which has the plate indexes of every process,
+the web servers' and the lane workers', reload.
+"""
+import csv
+import json
+from collections import namedtuple
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+
+from border.models import Vehicle, LicensePlate, BorderCheck, RegistryVersion
+from plate_formats import PlateGrammar, plate_key
+
+FORMATS = ('csv', 'jsonl')
+KINDS = ('vehicles', 'plates', 'border_checks')
+
+VEHICLE_FIELDS = ['vehicle_model', 'vehicle_color', 'owner_name', 'country_of_origin', 'destination_country']
+
+EXPORT_COLUMNS = {
+    'vehicles': ['id', *VEHICLE_FIELDS, 'license_plate_number', 'issued_at'],
+    'plates': ['id', 'vehicle_id', 'license_plate_number', 'issued_at'],
+    'border_checks': ['id', 'vehicle_id', 'border_name', 'checked_at', 'authorization_status', 'is_approved'],
+}
+
+ImportProgress = namedtuple('ImportProgress', ['read', 'imported', 'errors'])
+
+
+def guess_format(filename, default='csv'):
+    """'csv' or 'jsonl' from a file name's extension."""
+    suffix = Path(filename or '').suffix.lower()
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if suffix == '.csv':
+        return 'csv'
+    return default
+
+
+def read_records(stream, fmt):
+    """
+    Parse a text stream lazily.
+    :param fmt: 'csv' (with a header row) or 'jsonl' (one object per line).
+    :return: Generator of (line number, record dict); a record that cannot
+        be parsed comes out as None.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def _clean_record(record):
+    """Strip strings and drop empty values, so CSV and JSONL read the same."""
+    cleaned = {}
+    for key, value in record.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if key and value not in ('', None):
+            cleaned[key.strip()] = value
+    return cleaned
+
+
+def _error_message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def _vehicle_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({'vehicle_id': ['Must be an integer.']})
+
+
+def _boolean(value):
+    if isinstance(value, str):
+        value = value.lower()
+        if value in ('true', 't', 'yes', 'y', '1'):
+            return True
+        if value in ('false', 'f', 'no', 'n', '0'):
+            return False
+    return value
+
+
+def _build_plate(record, vehicle_id=None):
+    plate = LicensePlate(
+        vehicle_id=vehicle_id,
+        license_plate_number=record.get('license_plate_number', ''),
+        issued_at=record.get('issued_at'),
+    )
+    # Field checks only: LicensePlate.clean() would query every plate key on its own
+    plate.clean_fields(exclude=['vehicle', 'license_plate_image'])
+    plate.plate_key = plate_key(plate.license_plate_number)
+    if plate.plate_key is None:
+        raise ValidationError({'license_plate_number': ["A plate number needs letters or digits."]})
+    return plate
+
+
+def _registered_numbers(keys):
+    """Plate key -> {cleaned number: vehicle id} of the registered plates with those keys."""
+    registered = {}
+    for number, key, vehicle_id in LicensePlate.objects.filter(plate_key__in=keys).values_list(
+        'license_plate_number', 'plate_key', 'vehicle_id'
+    ):
+        registered.setdefault(key, {}).setdefault(PlateGrammar.clean(number), vehicle_id)
+    return registered
+
+
+def _unregistered(plates):
+    """
+    Yield (plate, error) for (line, plate) pairs, error None for plates whose
+    number is neither registered nor taken by an earlier plate of the chunk.
+    """
+    registered = _registered_numbers({plate.plate_key for _, plate in plates if plate is not None})
+    taken = {number for numbers in registered.values() for number in numbers}
+    for line, plate in plates:
+        if plate is None:
+            yield plate, None
+            continue
+        number = PlateGrammar.clean(plate.license_plate_number)
+        if number in taken:
+            yield plate, (line, f"license_plate_number: Plate {plate.license_plate_number} is already registered.")
+        else:
+            taken.add(number)
+            yield plate, None
+
+
+def _exported_id(record):
+    """id column of a record, None if it has none."""
+    value = record.get('id') if record is not None else None
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in ('', None) else value
+
+
+def _same_vehicle(record, other):
+    """Whether two vehicles records are rows of one vehicle, by their id."""
+    vehicle_id = _exported_id(record)
+    return vehicle_id is not None and vehicle_id == _exported_id(other)
+
+
+def _vehicle_rows_by_vehicle(records):
+    """Group consecutive (line, record) pairs that are rows of one vehicle."""
+    rows = []
+    for line, record in records:
+        if rows and not _same_vehicle(rows[-1][1], record):
+            yield rows
+            rows = []
+        rows.append((line, record))
+    if rows:
+        yield rows
+
+
+def _skip_vehicle(rows, errors):
+    """Error list entries for every row of a vehicle that is not imported, given its rows' own errors."""
+    failed = dict(errors)
+    first = min(failed)
+    return [(line, failed.get(line, f"Skipped with the vehicle of line {first}.")) for line, _ in rows]
+
+
+def _import_vehicles(records):
+    built, errors = [], []
+    for rows in _vehicle_rows_by_vehicle(records):
+        line, record = rows[0]
+        try:
+            vehicle = Vehicle(**{field: record.get(field, '') for field in VEHICLE_FIELDS})
+            vehicle.full_clean(exclude=['vehicle_photo'])
+        except ValidationError as e:
+            errors += _skip_vehicle(rows, [(line, _error_message(e))])
+            continue
+        plates, plate_errors = [], []
+        for line, record in rows:
+            if 'license_plate_number' not in record:
+                continue
+            try:
+                plates.append((line, _build_plate(record)))
+            except ValidationError as e:
+                plate_errors.append((line, _error_message(e)))
+        if plate_errors:
+            errors += _skip_vehicle(rows, plate_errors)
+            continue
+        built.append((rows, vehicle, plates))
+
+    vehicles = []
+    # Line -> error of the plates already registered
+    taken = dict(error for _, error in _unregistered([plate for _, _, plates in built for plate in plates]) if error)
+    for rows, vehicle, plates in built:
+        plate_errors = [(line, taken[line]) for line, _ in plates if line in taken]
+        if plate_errors:
+            errors += _skip_vehicle(rows, plate_errors)
+            continue
+        vehicles.append((vehicle, [plate for _, plate in plates]))
+
+    def write():
+        # Relies on bulk_create setting primary keys (PostgreSQL, SQLite 3.35+, MariaDB 10.5+)
+        Vehicle.objects.bulk_create([vehicle for vehicle, _ in vehicles])
+        for vehicle, plates in vehicles:
+            for plate in plates:
+                plate.vehicle = vehicle
+        LicensePlate.objects.bulk_create([plate for _, plates in vehicles for plate in plates])
+        return len(vehicles)
+
+    return write, errors
+
+
+def _existing_vehicles(vehicle_ids):
+    return set(Vehicle.objects.filter(pk__in=set(vehicle_ids)).values_list('pk', flat=True))
+
+
+def _import_plates(records):
+    built, errors = [], []
+    for line, record in records:
+        try:
+            built.append((line, _build_plate(record, _vehicle_id(record.get('vehicle_id')))))
+        except ValidationError as e:
+            errors.append((line, _error_message(e)))
+
+    existing = _existing_vehicles(plate.vehicle_id for _, plate in built)
+    plates = []
+    for (line, plate), (_, error) in zip(built, _unregistered(built)):
+        if plate.vehicle_id not in existing:
+            errors.append((line, f"vehicle_id: No vehicle {plate.vehicle_id}."))
+        elif error is not None:
+            errors.append(error)
+        else:
+            plates.append(plate)
+
+    return lambda: len(LicensePlate.objects.bulk_create(plates)), errors
+
+
+def _plate_vehicles(numbers):
+    """
+    Plate number -> vehicle id of the registered plates among the numbers,
+    found as the gate finds them: by cleaned number, else by a plate key
+    only one registered number has.
+    """
+    numbers = set(numbers)
+    registered = _registered_numbers({plate_key(number) for number in numbers})
+    vehicles = {}
+    for number in numbers:
+        candidates = registered.get(plate_key(number), {})
+        cleaned = PlateGrammar.clean(number)
+        if cleaned in candidates:
+            vehicles[number] = candidates[cleaned]
+        elif len(candidates) == 1:
+            vehicles[number] = next(iter(candidates.values()))
+    return vehicles
+
+
+def _import_border_checks(records):
+    parsed, errors = [], []
+    for line, record in records:
+        try:
+            if 'vehicle_id' in record:
+                record['vehicle_id'] = _vehicle_id(record['vehicle_id'])
+            elif 'license_plate_number' not in record:
+                raise ValidationError({'vehicle_id': ['Give a vehicle_id or a license_plate_number.']})
+        except ValidationError as e:
+            errors.append((line, _error_message(e)))
+            continue
+        parsed.append((line, record))
+
+    by_plate = _plate_vehicles(record['license_plate_number'] for _, record in parsed if 'vehicle_id' not in record)
+    existing = _existing_vehicles(record['vehicle_id'] for _, record in parsed if 'vehicle_id' in record)
+    checks = []
+    for line, record in parsed:
+        if 'vehicle_id' in record:
+            vehicle_id = record['vehicle_id'] if record['vehicle_id'] in existing else None
+            missing = f"vehicle_id: No vehicle {record['vehicle_id']}."
+        else:
+            vehicle_id = by_plate.get(record['license_plate_number'])
+            missing = f"license_plate_number: No vehicle with plate {record['license_plate_number']}."
+        if vehicle_id is None:
+            errors.append((line, missing))
+            continue
+        check = BorderCheck(
+            vehicle_id=vehicle_id,
+            border_name=record.get('border_name', ''),
+            is_approved=_boolean(record.get('is_approved', False)),
+        )
+        try:
+            check.full_clean(exclude=['vehicle', 'authorization_file'])
+        except ValidationError as e:
+            errors.append((line, _error_message(e)))
+            continue
+        checks.append(check)
+
+    return lambda: len(BorderCheck.objects.bulk_create(checks)), errors
+
+
+_IMPORTERS = {
+    'vehicles': _import_vehicles,
+    'plates': _import_plates,
+    'border_checks': _import_border_checks,
+}
+
+
+def import_records(kind, records, chunk_size=1000):
+    """
+    Validate and insert records chunk by chunk. Invalid records are skipped
+    and reported; the valid ones of a chunk are written in one transaction.
+    :param kind: One of KINDS.
+    :param records: Iterable of (line number, record dict), e.g. from read_records().
+    :param chunk_size: Records validated and written at a time; a chunk is
+        only cut between vehicles, so it can be longer by a vehicle's rows.
+    :return: Generator of one ImportProgress per chunk, with the running
+        totals and the (line number, message) errors of that chunk.
+    """
+    importer = _IMPORTERS[kind]
+    read = imported = 0
+    chunk = []
+
+    def flush():
+        errors = [(line, 'Not a record.') for line, record in chunk if record is None]
+        build, chunk_errors = importer([(line, _clean_record(record)) for line, record in chunk if record is not None])
+        errors += chunk_errors
+        try:
+            with transaction.atomic():
+                written = build()
+                if written:
+                    RegistryVersion.bump()
+        except DatabaseError as e:
+            written = 0
+            errors.append((chunk[0][0], f"Chunk of lines {chunk[0][0]}-{chunk[-1][0]} not written: {e}"))
+        return written, sorted(errors)
+
+    for item in records:
+        if len(chunk) >= chunk_size and not (kind == 'vehicles' and _same_vehicle(chunk[-1][1], item[1])):
+            read += len(chunk)
+            written, errors = flush()
+            imported += written
+            chunk = []
+            yield ImportProgress(read, imported, errors)
+        chunk.append(item)
+    if chunk:
+        read += len(chunk)
+        written, errors = flush()
+        imported += written
+        yield ImportProgress(read, imported, errors)
+
+
+def _vehicle_rows():
+    # One row per plate, vehicles without plates get one row with empty plate columns
+    return Vehicle.objects.order_by('pk', 'license_plates__pk').values_list(
+        'id', *VEHICLE_FIELDS, 'license_plates__license_plate_number', 'license_plates__issued_at'
+    )
+
+
+_EXPORT_ROWS = {
+    'vehicles': _vehicle_rows,
+    'plates': lambda: LicensePlate.objects.order_by('pk').values_list(*EXPORT_COLUMNS['plates']),
+    'border_checks': lambda: BorderCheck.objects.order_by('pk').values_list(*EXPORT_COLUMNS['border_checks']),
+}
+
+
+class _Echo:
+    """File-like object whose write() hands back the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def export_records(kind, fmt, chunk_size=2000):
+    """
+    Write every record of a kind.
+    :param kind: One of KINDS.
+    :param fmt: 'csv' or 'jsonl'.
+    :return: Generator of lines of text.
+    """
+    columns = EXPORT_COLUMNS[kind]
+    rows = _EXPORT_ROWS[kind]().iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(columns)
+        for row in rows:
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from border.models import Vehicle, LicensePlate, BorderCheck, RegistryVersion
+
+
+# Connected before the receivers of recognition.signals (border is the
+# earlier app), which hand the version on to the plate index of this process
+
+@receiver(post_save, sender=LicensePlate)
+@receiver(post_delete, sender=LicensePlate)
+@receiver(post_save, sender=BorderCheck)
+@receiver(post_delete, sender=BorderCheck)
+@receiver(post_delete, sender=Vehicle)
+def registry_changed(sender, instance, **kwargs):
+    # Tells the plate indexes of other processes to reload, see RegistryVersion
+    instance._registry_version = RegistryVersion.bump()
@@ -1,3 +1,284 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import fitz  # PyMuPDF
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from border.authorization import AuthorizationChecker
+from border.models import Vehicle, LicensePlate, BorderCheck, RegistryVersion
+from border.pagination import KeysetPaginator
+from border.registry import export_records, import_records, read_records
+from plate_formats import plate_key
+
+
+def make_vehicle(owner_name='Owner'):
+    return Vehicle.objects.create(
+        vehicle_model='Corolla', vehicle_color='White', owner_name=owner_name,
+        country_of_origin='Rwanda', destination_country='Uganda',
+    )
+
+
+def make_pdf(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), text)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+class AuthorizationCheckerTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.checker = AuthorizationChecker()
+        patcher = mock.patch('border.models.authorization_checker', self.checker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.vehicle = make_vehicle()
+
+    def make_check(self, content, name='authorization.pdf'):
+        check = BorderCheck(vehicle=self.vehicle, border_name='Gatuna')
+        check.authorization_file.save(name, ContentFile(content), save=False)
+        with mock.patch.object(self.checker, 'submit') as submit, self.captureOnCommitCallbacks(execute=True):
+            check.save()
+        if check.authorization_status == BorderCheck.PENDING:
+            submit.assert_called_once_with(check.pk, check.authorization_file_hash)
+        else:
+            submit.assert_not_called()
+        return check
+
+    def test_pending_check_is_approved_once_read(self):
+        check = self.make_check(make_pdf('Vehicle AUTHORIZED TO PASS'))
+        self.assertEqual(check.authorization_status, BorderCheck.PENDING)
+        self.assertFalse(check.is_approved)
+
+        self.checker._check(check.pk, check.authorization_file_hash)
+        check.refresh_from_db()
+        self.assertEqual(check.authorization_status, BorderCheck.APPROVED)
+        self.assertTrue(check.is_approved)
+
+    def test_document_without_the_pattern_is_rejected(self):
+        check = self.make_check(make_pdf('Entry refused'))
+        self.checker._check(check.pk, check.authorization_file_hash)
+        check.refresh_from_db()
+        self.assertEqual(check.authorization_status, BorderCheck.REJECTED)
+
+    def test_same_content_is_decided_from_its_hash(self):
+        content = make_pdf('AUTHORIZED TO PASS')
+        first = self.make_check(content)
+        second = self.make_check(content, name='copy.pdf')
+        self.assertEqual(second.authorization_status, BorderCheck.PENDING)
+
+        # One read decides every check waiting on the same file
+        with mock.patch('border.authorization.document_authorizes', return_value=True) as read:
+            self.checker._check(first.pk, first.authorization_file_hash)
+        self.assertEqual(read.call_count, 1)
+        second.refresh_from_db()
+        self.assertEqual(second.authorization_status, BorderCheck.APPROVED)
+
+        # Later uploads of the content are decided at save time, even by a fresh checker
+        self.assertTrue(self.checker.cached_result(first.authorization_file_hash))
+        self.checker._results.clear()
+        third = self.make_check(content, name='again.pdf')
+        self.assertEqual(third.authorization_status, BorderCheck.APPROVED)
+        self.assertTrue(third.is_approved)
+
+    def test_files_other_than_pdf_are_rejected_without_reading(self):
+        check = self.make_check(b'AUTHORIZED TO PASS', name='authorization.txt')
+        self.assertEqual(check.authorization_status, BorderCheck.REJECTED)
+        self.assertFalse(check.is_approved)
+
+    def test_stopped_worker_can_be_started_again(self):
+        self.checker.start()
+        thread = self.checker._thread
+        self.checker.close()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.checker._thread)
+
+
+class PlateKeyTests(TestCase):
+    def test_letter_digit_confusions_share_a_key(self):
+        self.assertEqual(plate_key('rab 123c'), 'RAB123C')
+        self.assertEqual(plate_key('RA8123C'), 'RAB123C')
+        self.assertEqual(plate_key('RAB12OC'), 'RAB120C')
+
+    def test_valid_letters_keep_their_own_key(self):
+        self.assertNotEqual(plate_key('RXY789C'), plate_key('RXY789D'))
+        self.assertNotEqual(plate_key('RAB123C'), plate_key('RAB123O'))
+
+    def test_text_of_no_format_is_only_cleaned(self):
+        self.assertEqual(plate_key('ab-12 3'), 'AB123')
+        self.assertIsNone(plate_key(' - '))
+
+    def test_distinct_plates_that_differ_in_a_letter_both_register(self):
+        LicensePlate.objects.create(vehicle=make_vehicle(), license_plate_number='RXY789C', issued_at=datetime.date.today())
+        plate = LicensePlate(vehicle=make_vehicle(), license_plate_number='RXY789D', issued_at=datetime.date.today())
+        plate.full_clean()
+        plate.save()
+        self.assertEqual(plate.plate_key, 'RXY789D')
+
+    def test_same_cleaned_number_is_rejected(self):
+        LicensePlate.objects.create(vehicle=make_vehicle(), license_plate_number='RXY789C', issued_at=datetime.date.today())
+        plate = LicensePlate(vehicle=make_vehicle(), license_plate_number='rxy 789c', issued_at=datetime.date.today())
+        with self.assertRaises(ValidationError):
+            plate.full_clean()
+
+
+class RegistryVersionTests(TestCase):
+    def test_registry_changes_bump_the_version(self):
+        before = RegistryVersion.current()
+        vehicle = make_vehicle()
+        self.assertEqual(RegistryVersion.current(), before)  # Vehicles alone do not reach the gate
+        LicensePlate.objects.create(vehicle=vehicle, license_plate_number='RAB123C', issued_at=datetime.date.today())
+        BorderCheck.objects.create(vehicle=vehicle, border_name='Gatuna', is_approved=True)
+        self.assertEqual(RegistryVersion.current(), before + 2)
+        vehicle.delete()  # Cascades to the plate and the border check
+        self.assertEqual(RegistryVersion.current(), before + 5)
+
+    def test_import_bumps_the_version(self):
+        before = RegistryVersion.current()
+        records = [(2, {'vehicle_model': 'Hilux', 'vehicle_color': 'Red', 'owner_name': 'A', 'country_of_origin': 'Rwanda',
+                        'destination_country': 'Kenya', 'license_plate_number': 'RAD456E', 'issued_at': '2024-01-01'})]
+        list(import_records('vehicles', records))
+        self.assertGreater(RegistryVersion.current(), before)
+
+
+class RegistryImportTests(TestCase):
+    def test_duplicate_numbers_are_skipped_with_their_line(self):
+        vehicle = make_vehicle()
+        LicensePlate.objects.create(vehicle=vehicle, license_plate_number='RAB123C', issued_at=datetime.date.today())
+        records = [
+            (2, {'vehicle_id': str(vehicle.pk), 'license_plate_number': 'rab-123c', 'issued_at': '2024-01-01'}),
+            (3, {'vehicle_id': str(vehicle.pk), 'license_plate_number': 'RAB123D', 'issued_at': '2024-01-01'}),
+            (4, {'vehicle_id': str(vehicle.pk), 'license_plate_number': 'RAB 123D', 'issued_at': '2024-01-01'}),
+            (5, {'vehicle_id': '999', 'license_plate_number': 'RAB999C', 'issued_at': '2024-01-01'}),
+        ]
+        progress = list(import_records('plates', records))
+        self.assertEqual(progress[-1].imported, 1)
+        self.assertEqual([line for line, _ in progress[-1].errors], [2, 4, 5])
+        self.assertTrue(LicensePlate.objects.filter(plate_key='RAB123D').exists())
+
+    def test_plates_of_missing_vehicles_are_skipped_with_their_line(self):
+        vehicle = make_vehicle()
+        records = [
+            (2, {'vehicle_id': str(vehicle.pk), 'license_plate_number': 'RAB123D', 'issued_at': '2024-01-01'}),
+            (3, {'vehicle_id': '999', 'license_plate_number': 'RAB999C', 'issued_at': '2024-01-01'}),
+            (4, {'vehicle_id': 'x', 'license_plate_number': 'RAB998C', 'issued_at': '2024-01-01'}),
+            (5, {'vehicle_id': str(vehicle.pk), 'license_plate_number': 'RAB997C', 'issued_at': 'not a date'}),
+        ]
+        progress = list(import_records('plates', records))
+        self.assertEqual(progress[-1].imported, 1)
+        self.assertEqual([line for line, _ in progress[-1].errors], [3, 4, 5])
+        self.assertTrue(LicensePlate.objects.filter(vehicle=vehicle, license_plate_number='RAB123D').exists())
+
+    def test_border_checks_find_their_vehicle_by_plate(self):
+        vehicle = make_vehicle()
+        LicensePlate.objects.create(vehicle=vehicle, license_plate_number='RAB123C', issued_at=datetime.date.today())
+        records = [
+            (2, {'license_plate_number': 'RA8 123C', 'border_name': 'Gatuna', 'is_approved': 'yes'}),
+            (3, {'license_plate_number': 'RAB123D', 'border_name': 'Gatuna'}),
+        ]
+        progress = list(import_records('border_checks', records))
+        self.assertEqual(progress[-1].imported, 1)
+        self.assertEqual([line for line, _ in progress[-1].errors], [3])
+        self.assertTrue(BorderCheck.objects.get(vehicle=vehicle).is_approved)
+
+    def test_exported_vehicles_import_back_with_all_their_plates(self):
+        vehicle = make_vehicle()
+        LicensePlate.objects.create(vehicle=vehicle, license_plate_number='RAB123C', issued_at=datetime.date.today())
+        LicensePlate.objects.create(vehicle=vehicle, license_plate_number='RAB124C', issued_at=datetime.date.today())
+        make_vehicle(owner_name='No plates')
+        exported = ''.join(export_records('vehicles', 'csv'))
+        Vehicle.objects.all().delete()
+
+        # A chunk may not split the rows of one vehicle
+        progress = list(import_records('vehicles', read_records(io.StringIO(exported), 'csv'), chunk_size=1))
+        self.assertEqual(progress[-1].imported, 2)
+        self.assertEqual([p.errors for p in progress], [[], []])
+        imported = Vehicle.objects.get(owner_name='Owner')
+        self.assertEqual(sorted(imported.license_plates.values_list('license_plate_number', flat=True)), ['RAB123C', 'RAB124C'])
+        self.assertFalse(Vehicle.objects.get(owner_name='No plates').license_plates.exists())
+
+    def test_a_bad_row_skips_its_whole_vehicle(self):
+        fields = {'vehicle_model': 'Hilux', 'vehicle_color': 'Red', 'owner_name': 'A',
+                  'country_of_origin': 'Rwanda', 'destination_country': 'Kenya', 'issued_at': '2024-01-01'}
+        records = [
+            (2, {**fields, 'id': '7', 'license_plate_number': 'RAD456E'}),
+            (3, {**fields, 'id': '7', 'license_plate_number': 'RAD457E', 'issued_at': 'not a date'}),
+            (4, {**fields, 'id': '8', 'license_plate_number': 'RAD458E'}),
+        ]
+        progress = list(import_records('vehicles', records))
+        self.assertEqual(progress[-1].imported, 1)
+        self.assertEqual([line for line, _ in progress[-1].errors], [2, 3])
+        self.assertEqual(list(LicensePlate.objects.values_list('license_plate_number', flat=True)), ['RAD458E'])
+
+    def test_jsonl_lines_that_are_not_records_are_reported(self):
+        stream = io.StringIO('{"vehicle_model": "Hilux"}\nnot json\n\n[1, 2]\n')
+        self.assertEqual([line for line, record in read_records(stream, 'jsonl') if record is None], [2, 4])
+
+
+class KeysetPaginatorTests(TestCase):
+    def setUp(self):
+        # Repeated owner names, so pages have to be split inside a run of equal keys
+        for index in range(11):
+            make_vehicle(owner_name=f'Owner {index % 3}')
+        self.queryset = Vehicle.objects.all()
+        self.ordering = ['owner_name', '-pk']
+        self.expected = list(self.queryset.order_by(*self.ordering).values_list('pk', flat=True))
+
+    def test_next_cursors_walk_every_row_once(self):
+        paginator = KeysetPaginator(self.queryset, self.ordering, per_page=4)
+        seen, page = [], paginator.page()
+        while True:
+            seen += [vehicle.pk for vehicle in page.object_list]
+            if page.next_cursor is None:
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_the_page_before(self):
+        paginator = KeysetPaginator(self.queryset, self.ordering, per_page=4)
+        first = paginator.page()
+        second = paginator.page(after=first.next_cursor)
+        self.assertIsNone(first.previous_cursor)
+        back = paginator.page(before=second.previous_cursor)
+        self.assertEqual([vehicle.pk for vehicle in back.object_list], self.expected[:4])
+        self.assertIsNone(back.previous_cursor)
+        self.assertEqual(back.next_cursor, first.next_cursor)
+
+    def test_last_page_has_no_next_cursor(self):
+        paginator = KeysetPaginator(self.queryset, self.ordering, per_page=4)
+        page = paginator.page(after=paginator.page(after=paginator.page().next_cursor).next_cursor)
+        self.assertEqual([vehicle.pk for vehicle in page.object_list], self.expected[8:])
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNotNone(page.previous_cursor)
+
+    def test_datetime_keys_keep_their_microseconds(self):
+        vehicle = make_vehicle()
+        for _ in range(5):
+            BorderCheck.objects.create(vehicle=vehicle, border_name='Gatuna')
+        queryset = BorderCheck.objects.all()
+        ordering = ['-checked_at', '-pk']
+        paginator = KeysetPaginator(queryset, ordering, per_page=2)
+        seen, page = [], paginator.page()
+        while True:
+            seen += [check.pk for check in page.object_list]
+            if page.next_cursor is None:
+                break
+            page = paginator.page(after=page.next_cursor)
+        self.assertEqual(seen, list(queryset.order_by(*ordering).values_list('pk', flat=True)))
+
+    def test_broken_cursor_gives_the_first_page(self):
+        paginator = KeysetPaginator(self.queryset, self.ordering, per_page=4)
+        page = paginator.page(after='not-a-cursor')
+        self.assertEqual([vehicle.pk for vehicle in page.object_list], self.expected[:4])
+        self.assertIsNone(page.previous_cursor)
@@ -20,4 +20,7 @@ urlpatterns = [
     path('border-check/update/<int:pk>/', views.update_border_check, name='border-check-update'),
     path('border-check/delete/<int:pk>/', views.delete_border_check, name='border-check-delete'),
 
+    path('registry/import/', views.registry_import, name='registry-import'),
+    path('registry/export/<str:kind>/', views.registry_export, name='registry-export'),
+
 ]
\ No newline at end of file
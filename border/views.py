@@ -1,8 +1,23 @@
+import io
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.db import models
+from django.db.models.functions import Upper
 from django import forms
+from django.http import Http404, StreamingHttpResponse
 
 from .models import Vehicle, LicensePlate, BorderCheck
+from .pagination import KeysetPaginator
+from plate_formats import plate_key
+from .registry import FORMATS, KINDS, export_records, guess_format, import_records, read_records
+
+
+PAGE_SIZE = 50
+
+
+def _prefix_lookup(field, prefix):
+    """Range filter matching values that start with prefix; unlike LIKE, any B-tree index on the field serves it."""
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'}
 
 
 class VehicleForm(forms.ModelForm):
@@ -40,6 +55,12 @@ class BorderCheckForm(forms.ModelForm):
             'authorization_file': forms.ClearableFileInput(attrs={'class': 'form-control'}),
         }
 
+class RegistryImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[(kind, kind.replace('_', ' ').title()) for kind in KINDS],
+                             widget=forms.Select(attrs={'class': 'form-control'}))
+    file = forms.FileField(help_text="CSV with a header row, or JSON Lines (.jsonl)",
+                           widget=forms.ClearableFileInput(attrs={'class': 'form-control'}))
+
 def vehicle_create(request):
     if request.method == 'POST':
         form = VehicleForm(request.POST, request.FILES)
@@ -55,15 +76,19 @@ def vehicle_create(request):
 
 def vehicle_list(request):
     query = request.GET.get('search')
+    vehicles = Vehicle.objects.prefetch_related('license_plates')
     if query:
-        vehicles = Vehicle.objects.filter(
-            models.Q(owner_name__icontains=query) | 
-            models.Q(vehicle_model__icontains=query)
+        # Prefix search, so the Upper() indexes on both columns can serve it
+        prefix = query.strip().upper()
+        vehicles = vehicles.annotate(
+            owner_upper=Upper('owner_name'), model_upper=Upper('vehicle_model'),
+        ).filter(
+            models.Q(**_prefix_lookup('owner_upper', prefix)) |
+            models.Q(**_prefix_lookup('model_upper', prefix))
         )
-    else:
-        vehicles = Vehicle.objects.all()
 
-    return render(request, 'border/vehicle_list.html', {'vehicles': vehicles, 'search_query': query})
+    page = KeysetPaginator(vehicles, ['-pk'], PAGE_SIZE).page_for(request)
+    return render(request, 'border/vehicle_list.html', {'vehicles': page.object_list, 'page': page, 'search_query': query})
 
 def vehicle_update(request, pk):
     vehicle = get_object_or_404(Vehicle, pk=pk)
@@ -101,13 +126,13 @@ def create_license_plate(request):
 
 def list_license_plate(request):
     query = request.GET.get('search')
+    license_plates = LicensePlate.objects.select_related('vehicle')
     if query:
-        license_plates = LicensePlate.objects.filter(
-            models.Q(license_plate_number__icontains=query)
-        )
-    else:
-        license_plates = LicensePlate.objects.all()
-    return render(request, 'border/license_plate_list.html', {'license_plates': license_plates, 'search_query': query})
+        # Plate keys are normalized, so 'rab 12' finds RAB123C too
+        license_plates = license_plates.filter(**_prefix_lookup('plate_key', plate_key(query) or ''))
+
+    page = KeysetPaginator(license_plates, ['-pk'], PAGE_SIZE).page_for(request)
+    return render(request, 'border/license_plate_list.html', {'license_plates': page.object_list, 'page': page, 'search_query': query})
 
 
 def update_license_plate(request, pk):
@@ -145,8 +170,9 @@ def create_border_check(request):
     return render(request, 'border/border_check_create.html', {'form': form})
 
 def list_border_check(request):
-    border_checks = BorderCheck.objects.all()
-    return render(request, 'border/border_check_list.html', {'border_checks': border_checks})
+    border_checks = BorderCheck.objects.select_related('vehicle')
+    page = KeysetPaginator(border_checks, ['-checked_at', '-pk'], PAGE_SIZE).page_for(request)
+    return render(request, 'border/border_check_list.html', {'border_checks': page.object_list, 'page': page})
 
 
 def update_border_check(request, pk):
@@ -171,3 +197,43 @@ def delete_border_check(request, pk):
         return redirect('border:border-check-list')
     
     return render(request, 'border/border_check_delete.html', {'border_check': border_check})
+
+
+def registry_import(request):
+    """
+    Bulk import an uploaded CSV or JSON Lines file. The import runs while the
+    response streams, one progress line per chunk and one per skipped record.
+    """
+    if request.method == 'POST':
+        form = RegistryImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            kind = form.cleaned_data['kind']
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            records = read_records(stream, guess_format(upload.name))
+
+            def progress():
+                skipped = 0
+                for read, imported, errors in import_records(kind, records):
+                    skipped += len(errors)
+                    for line, message in errors:
+                        yield f"Line {line}: {message}\n"
+                    yield f"Read {read}, imported {imported}, skipped {skipped}\n"
+                yield "Done\n"
+
+            return StreamingHttpResponse(progress(), content_type='text/plain; charset=utf-8')
+    else:
+        form = RegistryImportForm()
+
+    return render(request, 'border/registry_import.html', {'form': form, 'kinds': form.fields['kind'].choices})
+
+
+def registry_export(request, kind):
+    """Stream every record of a kind as CSV, or JSON Lines with ?format=jsonl."""
+    fmt = request.GET.get('format', 'csv')
+    if kind not in KINDS or fmt not in FORMATS:
+        raise Http404("Unknown export")
+    content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(export_records(kind, fmt), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+    return response
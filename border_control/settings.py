@@ -105,6 +105,55 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# License plate detector
+# 'ultralytics' runs the YOLO checkpoint as is, 'onnx' runs a model exported
+# with `manage.py export_detector` on ONNX Runtime.
+
+PLATE_DETECTOR_BACKEND = os.environ.get('PLATE_DETECTOR_BACKEND', 'ultralytics')
+PLATE_DETECTOR_MODEL = os.environ.get('PLATE_DETECTOR_MODEL', 'license_plate_detector.pt')
+# ONNX Runtime execution providers, in order of preference
+PLATE_DETECTOR_PROVIDERS = ['OpenVINOExecutionProvider', 'CPUExecutionProvider']
+
+# Camera of the single lane served at recognition/video-feed/, e.g. the IP
+# address of a phone stream. A border post with several lanes configures
+# them as Lane objects in the admin and runs `manage.py run_lanes` instead.
+RECOGNITION_CAMERA_URL = os.environ.get('RECOGNITION_CAMERA_URL', 'http://192.168.0.102:4747/video')
+
+# Lane region of interest of each camera source, as a polygon of (x, y)
+# points in fractions of the frame width and height, e.g.
+# {'http://192.168.0.102:4747/video': [(0.2, 0.3), (0.8, 0.3), (0.9, 1.0), (0.1, 1.0)]}.
+# Plates are only detected inside it; sources without one use the whole frame.
+RECOGNITION_ROIS = {}
+
+# Gate servo and IR sensor: 'gpio' drives the Raspberry Pi pins below,
+# 'simulated' runs the recognition loop off-device with an in-memory gate.
+RECOGNITION_HARDWARE = os.environ.get('RECOGNITION_HARDWARE', 'gpio')
+GATE_SERVO_PIN = 18
+IR_SENSOR_PIN = 23
+# Seconds the gate stays open, extended while the IR sensor still sees the vehicle
+GATE_HOLD_SECONDS = 5.0
+# (start, end) windows, in seconds after startup, during which the simulated
+# IR sensor reads triggered
+SIMULATED_IR_SCRIPT = []
+
+# Load the recognition models and run a dummy inference when the WSGI/ASGI
+# application starts, instead of on the first request
+RECOGNITION_WARMUP = True
+
+# Largest confusion-weighted edit distance at which a plate reading still
+# matches a registered plate at the gate. Reading a character of the wrong
+# class for its position as one it is confused with (e.g. an 8 where the
+# letter B belongs) costs 0.3, any other edit 1.0.
+PLATE_MATCH_MAX_DISTANCE = 0.6
+
+# Seconds between a plate index's background checks of the registry version
+# for changes made by other processes
+PLATE_INDEX_CHECK_SECONDS = 1.0
+
+# JSON lines file every recognized vehicle's timings, from first capture to
+# the gate opening, are appended to. Set to an empty value to disable.
+RECOGNITION_TRACE_FILE = os.environ.get('RECOGNITION_TRACE_FILE', os.path.join(BASE_DIR, 'vehicle_traces.jsonl'))
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -14,3 +14,15 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'border_control.settings')
 
 application = get_wsgi_application()
+
+# Load the recognition models and run one dummy inference in the background,
+# so the first vehicle is not hit by cold-start latency
+from recognition.model_registry import warm_up_in_background  # noqa: E402
+
+warm_up_in_background()
+
+# Read the authorization files of border checks an earlier server process
+# left pending, and keep checking new ones from now on
+from border.authorization import authorization_checker  # noqa: E402
+
+authorization_checker.start()
@@ -0,0 +1,278 @@
+"""
+License plate format grammar.
+
+A plate format is a pattern with one symbol per character position:
+
+    @   any letter
+    #   any digit
+    *   any letter or digit
+    X   anything else is a literal character, e.g. the leading R of Rwandan plates
+
+Every position also has a confusion map of characters OCR tends to read in
+place of a valid one (a 0 where a letter belongs, an S where a digit
+belongs, ...). A PlateGrammar compiles all formats into lookup tables of
+the normalized character and its cost for every (position, input
+character, format), so a raw OCR string is normalized and checked against
+every format in one pass, and the cheapest reading wins.
+
+Registered plates and readings are compared by plate_key(), which only
+undoes letter/digit confusions where a format allows a single class. Two
+valid letters or two valid digits are never folded together.
+"""
+import re
+import string
+from collections import namedtuple
+
+LETTERS = string.ascii_uppercase
+DIGITS = string.digits
+
+# Character OCR reads -> the character it most likely is, by expected class
+LETTER_CONFUSIONS = {'0': 'C', '1': 'I', '3': 'J', '4': 'A', '6': 'G', '5': 'S', '8': 'B', '2': 'Z'}
+DIGIT_CONFUSIONS = {'O': '0', 'I': '1', 'J': '3', 'A': '4', 'G': '6', 'S': '5', 'B': '8', 'Z': '2'}
+
+# Letter and digit pairs OCR mixes up: both confusion maps, which only keep
+# the likeliest reading of each character, and the other shapes OCR reads
+# across classes. Reading one of a pair where only the other's class fits
+# is a likely misread
+CLASS_CONFUSIONS = frozenset(
+    frozenset(pair) for confusions in (LETTER_CONFUSIONS, DIGIT_CONFUSIONS) for pair in confusions.items()
+) | frozenset(frozenset(pair) for pair in ('D0', 'Q0', 'U0', 'T7', 'L1'))
+
+CONFUSION_COST = 0.3  # Cost of reading a position through its confusion map
+DROP_COST = 1.0  # Cost of each extra character around a plate, e.g. a country code
+
+PlateMatch = namedtuple('PlateMatch', ['plate', 'country', 'format', 'cost'])
+
+_NOT_PLATE_CHARACTER = re.compile('[^A-Z0-9]')
+
+
+class PlateFormat:
+    """
+    One plate layout of one country.
+    :param country: ISO country code, e.g. 'RW'.
+    :param name: Name of the layout, e.g. 'private'.
+    :param pattern: One symbol per position, see the module docstring.
+    :param position_confusions: Extra confusion maps by position index, on
+        top of the class confusion maps, e.g. {6: {'O': 'C'}}.
+    """
+
+    def __init__(self, country, name, pattern, position_confusions=None):
+        self.country = country
+        self.name = name
+        self.pattern = pattern
+        self.position_confusions = position_confusions or {}
+
+    def __repr__(self):
+        return f'PlateFormat({self.country!r}, {self.name!r}, {self.pattern!r})'
+
+    def positions(self):
+        """
+        Yield (valid characters, confusion map) for every position of the pattern.
+        """
+        for index, symbol in enumerate(self.pattern):
+            if symbol == '@':
+                valid, confusions = LETTERS, dict(LETTER_CONFUSIONS)
+            elif symbol == '#':
+                valid, confusions = DIGITS, dict(DIGIT_CONFUSIONS)
+            elif symbol == '*':
+                valid, confusions = LETTERS + DIGITS, {}
+            else:
+                # A literal also accepts whatever its class confuses with it
+                class_confusions = LETTER_CONFUSIONS if symbol in LETTERS else DIGIT_CONFUSIONS
+                valid = symbol
+                confusions = {read: symbol for read, meant in class_confusions.items() if meant == symbol}
+            confusions.update(self.position_confusions.get(index, {}))
+            yield valid, confusions
+
+
+# Plates seen at the border, Rwandan layouts first: when two formats read
+# a plate equally well, the earlier one wins
+DEFAULT_FORMATS = [
+    PlateFormat('RW', 'private', 'R@@###@', {6: {'O': 'C'}}),
+    PlateFormat('RW', 'private', 'R@@###@@'),
+    PlateFormat('UG', 'private', 'U@@###@'),
+    PlateFormat('KE', 'private', 'K@@###@'),
+    PlateFormat('TZ', 'private', 'T###@@@'),
+]
+
+
+class PlateGrammar:
+    """
+    Compiled set of plate formats.
+
+    The formats are grouped by length, and every position of a length has
+    one lookup table: input character -> {format index: (cost, normalized
+    character)} over all formats of that length. Reading a string walks it
+    once, narrowing down the formats it still fits at every character.
+    Inputs longer than a format are also tried at every offset, paying
+    DROP_COST for each character left out. A second table per position
+    holds only the characters a format takes as they are, for the exact
+    check of complies().
+    """
+
+    def __init__(self, formats=DEFAULT_FORMATS):
+        self.formats = list(formats)
+        self._tables = {}  # length -> one {character: {format index: (cost, character)}} per position
+        self._exact = {}  # length -> one {character: bit mask of the formats that take it as is} per position
+        self._keys = {}  # length -> tables like _tables, with letter/digit confusions only, each costing 1
+
+        for index, plate_format in enumerate(self.formats):
+            tables = self._tables.setdefault(len(plate_format.pattern), [{} for _ in plate_format.pattern])
+            for table, (valid, confusions) in zip(tables, plate_format.positions()):
+                for character in valid:
+                    table.setdefault(character, {})[index] = (0.0, character)
+                # Position confusions may also override valid characters, e.g. O -> C
+                for read, meant in confusions.items():
+                    table.setdefault(read, {})[index] = (CONFUSION_COST, meant)
+
+            keys = self._keys.setdefault(len(plate_format.pattern), [{} for _ in plate_format.pattern])
+            for table, (valid, _) in zip(keys, plate_format.positions()):
+                for character in valid:
+                    table.setdefault(character, {})[index] = (0.0, character)
+                # Only where the position takes a single class: a 0 read for the C of a
+                # letter position, never an O read for a C or a 0 for a '*' position
+                if all(character in LETTERS for character in valid):
+                    confusions = LETTER_CONFUSIONS
+                elif all(character in DIGITS for character in valid):
+                    confusions = DIGIT_CONFUSIONS
+                else:
+                    confusions = {}
+                for read, meant in confusions.items():
+                    if meant in valid:
+                        table.setdefault(read, {})[index] = (1.0, meant)
+
+        for length, tables in self._tables.items():
+            self._exact[length] = [
+                {
+                    character: sum(1 << index for index, (cost, _) in entries.items() if cost == 0.0)
+                    for character, entries in table.items()
+                }
+                for table in tables
+            ]
+
+    @staticmethod
+    def clean(text):
+        """Uppercase the text and drop spaces, dashes and anything else that is not a letter or digit."""
+        return _NOT_PLATE_CHARACTER.sub('', text.upper())
+
+    def _read(self, tables, window):
+        """{format index: (cost, plate)} for every format of the window's length it fits."""
+        candidates = None
+        steps = []
+        for table, character in zip(tables, window):
+            entries = table.get(character)
+            if entries is None:
+                return {}
+            candidates = entries.keys() if candidates is None else candidates & entries.keys()
+            if not candidates:
+                return {}
+            steps.append(entries)
+        return {
+            index: (sum(step[index][0] for step in steps), ''.join(step[index][1] for step in steps))
+            for index in candidates
+        }
+
+    def matches(self, text, max_cost=float('inf')):
+        """
+        Every format the text can be read as, cheapest first.
+        :param text: Raw OCR text.
+        :param max_cost: Leave out readings that cost more than this.
+        :return: List of PlateMatch, at most one per format.
+        """
+        text = self.clean(text)
+
+        best = {}  # format index -> (cost, plate)
+        for length, tables in self._tables.items():
+            extra = len(text) - length
+            if extra < 0 or extra * DROP_COST > max_cost:
+                continue
+            for offset in range(extra + 1):
+                for index, (cost, plate) in self._read(tables, text[offset:offset + length]).items():
+                    cost += extra * DROP_COST
+                    if cost <= max_cost and (index not in best or cost < best[index][0]):
+                        best[index] = (cost, plate)
+
+        ordered = sorted(best.items(), key=lambda item: (item[1][0], item[0]))
+        return [
+            PlateMatch(plate, self.formats[index].country, self.formats[index].name, cost)
+            for index, (cost, plate) in ordered
+        ]
+
+    def best_match(self, text, max_cost=float('inf')):
+        """The cheapest reading of the text, or None if it fits no format."""
+        index = self._first_format(text)
+        if index is not None:
+            return PlateMatch(text, self.formats[index].country, self.formats[index].name, 0.0)
+
+        # Formats of the text's own length first: any other length costs at
+        # least DROP_COST, so a cheaper reading is final and a dearer one
+        # bounds how many characters are worth dropping
+        text = self.clean(text)
+        tables = self._tables.get(len(text))
+        readings = self._read(tables, text) if tables is not None else {}
+        if readings:
+            index, (cost, plate) = min(readings.items(), key=lambda item: (item[1][0], item[0]))
+            if cost < DROP_COST and cost <= max_cost:
+                return PlateMatch(plate, self.formats[index].country, self.formats[index].name, cost)
+            max_cost = min(max_cost, cost)
+        matches = self.matches(text, max_cost)
+        return matches[0] if matches else None
+
+    def _first_format(self, text):
+        """Index of the first format that takes the text as is, None if none does."""
+        tables = self._exact.get(len(text))
+        if not tables:
+            return None
+        candidates = -1  # Every format
+        for table, character in zip(tables, text):
+            candidates &= table.get(character, 0)
+            if not candidates:
+                return None
+        return (candidates & -candidates).bit_length() - 1
+
+    def key(self, text):
+        """
+        The text with its letter/digit confusions undone, as in plate_key().
+        :param text: Clean text, see clean().
+        """
+        tables = self._keys.get(len(text))
+        readings = self._read(tables, text) if tables is not None else {}
+        if not readings:
+            return text
+        _, (_, plate) = min(readings.items(), key=lambda item: (item[1][0], item[0]))
+        return plate
+
+    def slots(self, plate):
+        """
+        The characters every position of a plate takes, by the first format
+        the plate complies with. Positions of a plate that fits no format
+        take the class of their own character.
+        """
+        index = self._first_format(plate)
+        if index is None:
+            return [LETTERS if char in LETTERS else DIGITS if char in DIGITS else char for char in plate]
+        return [valid for valid, _ in self.formats[index].positions()]
+
+    def complies(self, text):
+        """True if the text already is a plate of one of the formats, as is."""
+        return self._first_format(text) is not None
+
+
+default_grammar = PlateGrammar()
+
+
+def plate_key(text, grammar=default_grammar):
+    """
+    Gate key of a plate number: uppercase letters and digits only, read as
+    the format it fits with the fewest letter/digit confusions undone, e.g.
+    'rab 12O c' -> 'RAB120C'. Only a position that takes letters alone or
+    digits alone is corrected, with the confusion maps, so a registered
+    'RAB123C' and an OCR reading 'RA8123C' share a key while 'RXY789C' and
+    'RXY789D' do not. Text that fits no format is only cleaned.
+
+    A key can stand for several cleaned numbers, e.g. 'RAB12OC' and
+    'RAB120C', so it must not be unique; registered plates are told apart
+    by PlateGrammar.clean().
+    :return: The key, or None if the text has no letters or digits.
+    """
+    return grammar.key(PlateGrammar.clean(text)) or None
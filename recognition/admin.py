@@ -1,11 +1,25 @@
 from django.contrib import admin
-from .models import MotorControlLog
+from .models import Lane, MotorControlLog, PlateRecognition
+
+
+@admin.register(Lane)
+class LaneAdmin(admin.ModelAdmin):
+    list_display = ('name', 'source', 'enabled', 'hardware', 'plate_countries', 'updated_at')
+    list_filter = ('enabled',)
+    search_fields = ('name', 'source')
 
 @admin.register(MotorControlLog)
 class MotorControlLogAdmin(admin.ModelAdmin):
-    list_display = ('vehicle', 'action', 'triggered_at')  # Columns to display in the list view
-    list_filter = ('action',)  # Filters to add to the admin sidebar
+    list_display = ('vehicle', 'lane', 'action', 'triggered_at')  # Columns to display in the list view
+    list_filter = ('action', 'lane')  # Filters to add to the admin sidebar
     search_fields = ('vehicle__license_plate_number', 'action')  # Search fields
 
     def __str__(self):
         return f"{self.action} for Vehicle {self.vehicle} at {self.triggered_at}"
+
+
+@admin.register(PlateRecognition)
+class PlateRecognitionAdmin(admin.ModelAdmin):
+    list_display = ('plate_number', 'score', 'vehicle', 'lane', 'is_successful', 'detected_at')
+    list_filter = ('is_successful', 'lane')
+    search_fields = ('plate_number',)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecognitionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recognition'
+
+    def ready(self):
+        # Keep the in-memory plate index in step with the border registry
+        from recognition import signals  # noqa: F401
@@ -0,0 +1,102 @@
+import atexit
+import queue
+import threading
+import time
+
+from django.db import connection
+from django.utils import timezone
+
+from recognition.models import PlateRecognition, MotorControlLog
+
+
+class AuditWriter:
+    """
+    Buffered background writer for recognition and gate audit rows.
+
+    The frame loop only enqueues unsaved model instances, stamped with the
+    time of the event. A worker thread writes them with bulk_create once
+    `batch_size` rows are waiting or `flush_interval` seconds have passed,
+    and again when the process exits. The queue is bounded: if the database
+    cannot keep up, new events are dropped and counted rather than letting
+    memory grow.
+    """
+
+    batch_size = 100
+    flush_interval = 2.0  # Seconds
+    max_pending = 10000
+
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.dropped = 0
+
+    def record_recognition(self, plate_number, score, vehicle_id=None, is_successful=False, lane_id=None):
+        """Queue a PlateRecognition row for a voted plate."""
+        self._put(PlateRecognition(
+            plate_number=plate_number, score=score, vehicle_id=vehicle_id,
+            is_successful=is_successful, detected_at=timezone.now(), lane_id=lane_id,
+        ))
+
+    def record_gate(self, action, vehicle_id=None, at=None, lane_id=None):
+        """Queue a MotorControlLog row for a gate action."""
+        self._put(MotorControlLog(
+            action=action, vehicle_id=vehicle_id, triggered_at=at or timezone.now(), lane_id=lane_id,
+        ))
+
+    def _put(self, row):
+        self.start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                print(f"Audit queue full, {self.dropped} event(s) dropped so far")
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def close(self, timeout=5.0):
+        """Stop the worker and wait for it to write every queued row."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while not (self._stop_event.is_set() and self._queue.empty()):
+                try:
+                    pending.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0.01)))
+                except queue.Empty:
+                    pass
+
+                if len(pending) >= self.batch_size or time.monotonic() >= deadline or self._stop_event.is_set():
+                    self._flush(pending)
+                    pending = []
+                    deadline = time.monotonic() + self.flush_interval
+            self._flush(pending)
+        finally:
+            connection.close()
+
+    def _flush(self, rows):
+        if not rows:
+            return
+        by_model = {}
+        for row in rows:
+            by_model.setdefault(type(row), []).append(row)
+        for model, objs in by_model.items():
+            try:
+                model.objects.bulk_create(objs)
+            except Exception as e:
+                print(f"Error writing {len(objs)} {model.__name__} row(s): {e}")
+
+
+audit_writer = AuditWriter()
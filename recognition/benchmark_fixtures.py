@@ -0,0 +1,128 @@
+import json
+import string
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Checked-in fixtures of the benchmark_recognition command
+FIXTURE_DIR = Path(__file__).resolve().parent / 'benchmark_data'
+MANIFEST = 'manifest.json'
+
+FRAME_SIZE = (640, 480)
+PLATE_SIZE = (220, 52)
+
+
+def random_plate(rng):
+    """A random plate number in the Rwandan format, e.g. RAB123C or RAB123CD."""
+    letters = list(string.ascii_uppercase)
+    suffix = ''.join(rng.choice(letters, size=rng.choice([1, 2])))
+    return 'R' + ''.join(rng.choice(letters, size=2)) + ''.join(rng.choice(list(string.digits), size=3)) + suffix
+
+
+def render_plate(plate):
+    """
+    Draw a plate as black characters on a white, black bordered plate.
+    :return: BGR image of PLATE_SIZE.
+    """
+    width, height = PLATE_SIZE
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.rectangle(image, (1, 1), (width - 2, height - 2), (0, 0, 0), 2)
+
+    text = f'{plate[:3]} {plate[3:6]} {plate[6:]}'
+    font, scale, thickness = cv2.FONT_HERSHEY_SIMPLEX, 1.0, 2
+    (text_width, text_height), _ = cv2.getTextSize(text, font, scale, thickness)
+    scale *= min(1.0, (width - 16) / text_width)
+    (text_width, text_height), _ = cv2.getTextSize(text, font, scale, thickness)
+    origin = ((width - text_width) // 2, (height + text_height) // 2)
+    cv2.putText(image, text, origin, font, scale, (0, 0, 0), thickness, cv2.LINE_AA)
+    return image
+
+
+def _background(rng):
+    width, height = FRAME_SIZE
+    # Road and sky gradient with sensor noise
+    gradient = np.linspace(90, 160, height, dtype=np.float32)[:, None, None]
+    frame = np.repeat(np.repeat(gradient, width, axis=1), 3, axis=2)
+    frame += rng.normal(0, 6, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def render_scene(plate, center, scale, rng, background=None):
+    """
+    Draw a car body with the plate on it onto a frame.
+    :param center: (x, y) of the plate centre in the frame.
+    :param scale: Plate size relative to PLATE_SIZE.
+    :return: (BGR frame of FRAME_SIZE, plate box [x1, y1, x2, y2]).
+    """
+    frame = _background(rng) if background is None else background.copy()
+    plate_image = render_plate(plate)
+    plate_width, plate_height = int(PLATE_SIZE[0] * scale), int(PLATE_SIZE[1] * scale)
+    plate_image = cv2.resize(plate_image, (plate_width, plate_height), interpolation=cv2.INTER_AREA)
+
+    x1 = int(center[0] - plate_width / 2)
+    y1 = int(center[1] - plate_height / 2)
+    body_color = tuple(int(c) for c in rng.integers(20, 200, size=3))
+    cv2.rectangle(
+        frame, (x1 - plate_width, y1 - 3 * plate_height), (x1 + 2 * plate_width, y1 + 2 * plate_height),
+        body_color, -1,
+    )
+
+    # Keep the plate inside the frame
+    x1 = min(max(x1, 0), FRAME_SIZE[0] - plate_width)
+    y1 = min(max(y1, 0), FRAME_SIZE[1] - plate_height)
+    frame[y1:y1 + plate_height, x1:x1 + plate_width] = plate_image
+    frame = cv2.GaussianBlur(frame, (3, 3), 0)
+    return frame, [x1, y1, x1 + plate_width, y1 + plate_height]
+
+
+def generate(directory=FIXTURE_DIR, images=24, clip_frames=45, clip_fps=15, seed=0):
+    """
+    Write the synthetic benchmark fixtures and their manifest.
+
+    Everything is drawn from one seeded random generator, so the same seed
+    always gives the same plates, boxes and pixels.
+    :param directory: Directory to write scenes/, clip.avi and manifest.json to.
+    :param images: Number of still scenes with one plate each.
+    :param clip_frames: Length of the clip of one car driving up to the gate.
+    :param clip_fps: Frame rate of the clip.
+    :return: The manifest.
+    """
+    directory = Path(directory)
+    (directory / 'scenes').mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    manifest = {'seed': seed, 'frame_size': list(FRAME_SIZE), 'images': [], 'clip': None}
+    for index in range(images):
+        plate = random_plate(rng)
+        center = (rng.integers(150, FRAME_SIZE[0] - 150), rng.integers(120, FRAME_SIZE[1] - 60))
+        frame, box = render_scene(plate, center, rng.uniform(0.8, 1.3), rng)
+        name = f'scenes/{index:03d}.jpg'
+        cv2.imwrite(str(directory / name), frame, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        manifest['images'].append({'file': name, 'plate': plate, 'box': box})
+
+    # A car entering from the bottom of the frame and stopping at the gate
+    plate = random_plate(rng)
+    background = _background(rng)
+    writer = cv2.VideoWriter(str(directory / 'clip.avi'), cv2.VideoWriter_fourcc(*'MJPG'), clip_fps, FRAME_SIZE)
+    boxes = []
+    try:
+        for index in range(clip_frames):
+            progress = min(index / (clip_frames * 0.6), 1.0)
+            center = (FRAME_SIZE[0] // 2, int(FRAME_SIZE[1] - 30 - progress * 200))
+            frame, box = render_scene(plate, center, 0.8 + 0.4 * progress, np.random.default_rng(seed), background)
+            writer.write(frame)
+            boxes.append(box)
+    finally:
+        writer.release()
+    manifest['clip'] = {'file': 'clip.avi', 'plate': plate, 'fps': clip_fps, 'boxes': boxes}
+
+    with open(directory / MANIFEST, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def load_manifest(directory=FIXTURE_DIR):
+    """Read the manifest of a fixture directory written by generate()."""
+    with open(Path(directory) / MANIFEST) as manifest_file:
+        return json.load(manifest_file)
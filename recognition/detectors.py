@@ -0,0 +1,210 @@
+import cv2
+import numpy as np
+from django.conf import settings
+
+from recognition.tracker import box_iou
+
+
+def letterbox(frame, size):
+    """
+    Resize a frame into a padded `size` canvas, keeping its aspect ratio.
+    :return: (image, ratio, pad_x, pad_y) needed to map boxes back to the frame.
+    """
+    input_width, input_height = size
+    height, width = frame.shape[:2]
+    ratio = min(input_width / width, input_height / height)
+    new_width, new_height = round(width * ratio), round(height * ratio)
+    pad_x, pad_y = (input_width - new_width) // 2, (input_height - new_height) // 2
+
+    image = np.full((input_height, input_width, 3), 114, dtype=np.uint8)
+    image[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = cv2.resize(
+        frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR
+    )
+    return image, ratio, pad_x, pad_y
+
+
+def to_blob(image, dtype=np.float32):
+    """Turn a letterboxed BGR image into a 1x3xHxW RGB tensor scaled to [0, 1]."""
+    return cv2.dnn.blobFromImage(image, 1 / 255.0, swapRB=True).astype(dtype, copy=False)
+
+
+class PlateDetector:
+    """
+    Base class of the license plate detector backends.
+
+    A backend takes a BGR frame and returns its detections as
+    [x1, y1, x2, y2, score, class_id] rows in frame coordinates.
+    """
+
+    name = None
+
+    def detect(self, frame):
+        raise NotImplementedError
+
+
+class UltralyticsDetector(PlateDetector):
+    """Runs a YOLO checkpoint (.pt, or anything else ultralytics can load)."""
+
+    name = 'ultralytics'
+
+    def __init__(self, model_path, **options):
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+
+    def detect(self, frame):
+        # ultralytics takes numpy images in OpenCV's BGR order, no conversion needed
+        results = self.model(frame, verbose=False)
+        return results[0].boxes.data.tolist()
+
+
+class OnnxDetector(PlateDetector):
+    """
+    Runs an exported YOLOv8 ONNX model with ONNX Runtime.
+
+    Any ONNX Runtime execution provider can be used, e.g. the OpenVINO
+    provider on Intel CPUs; FP32, FP16 and INT8 models are all accepted.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, model_path, providers=None, conf=0.25, iou=0.45, imgsz=640, **options):
+        import onnxruntime
+
+        available = onnxruntime.get_available_providers()
+        providers = [p for p in (providers or ['CPUExecutionProvider']) if p in available]
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), providers=providers or ['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = np.float16 if model_input.type == 'tensor(float16)' else np.float32
+
+        # Dynamic axes come back as strings, fall back to the export size then
+        height, width = model_input.shape[2:4]
+        self.input_size = (
+            width if isinstance(width, int) else imgsz,
+            height if isinstance(height, int) else imgsz,
+        )
+        self.conf = conf
+        self.iou = iou
+
+    def detect(self, frame):
+        image, ratio, pad_x, pad_y = letterbox(frame, self.input_size)
+        blob = to_blob(image, self.input_dtype)
+        output = self.session.run(None, {self.input_name: blob})[0]
+
+        # YOLOv8 output is (1, 4 + classes, candidates): cx, cy, w, h, class scores
+        predictions = output[0].T.astype(np.float32, copy=False)
+        class_scores = predictions[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores >= self.conf
+        if not keep.any():
+            return []
+
+        predictions, scores, class_ids = predictions[keep], scores[keep], class_ids[keep]
+        boxes = np.empty((len(predictions), 4), dtype=np.float32)
+        boxes[:, 0] = (predictions[:, 0] - predictions[:, 2] / 2 - pad_x) / ratio
+        boxes[:, 1] = (predictions[:, 1] - predictions[:, 3] / 2 - pad_y) / ratio
+        boxes[:, 2] = predictions[:, 2] / ratio
+        boxes[:, 3] = predictions[:, 3] / ratio
+
+        indices = cv2.dnn.NMSBoxes(boxes.tolist(), scores.tolist(), self.conf, self.iou)
+        detections = []
+        for i in np.array(indices).flatten():
+            x, y, w, h = boxes[i]
+            detections.append([float(x), float(y), float(x + w), float(y + h), float(scores[i]), float(class_ids[i])])
+        return detections
+
+
+DETECTOR_BACKENDS = {
+    UltralyticsDetector.name: UltralyticsDetector,
+    OnnxDetector.name: OnnxDetector,
+}
+
+
+def load_detector(backend=None, model_path=None):
+    """
+    Build the license plate detector selected in the settings.
+    :param backend: Backend name, defaults to settings.PLATE_DETECTOR_BACKEND.
+    :param model_path: Model file, defaults to settings.PLATE_DETECTOR_MODEL.
+    """
+    backend = backend or settings.PLATE_DETECTOR_BACKEND
+    model_path = model_path or settings.PLATE_DETECTOR_MODEL
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {sorted(DETECTOR_BACKENDS)}")
+    return DETECTOR_BACKENDS[backend](model_path, providers=settings.PLATE_DETECTOR_PROVIDERS)
+
+
+def clip_boxes(detections, shape):
+    """
+    Turn detector rows into integer boxes inside the frame.
+    :param detections: [x1, y1, x2, y2, score, class_id] rows.
+    :param shape: Shape of the frame the rows were detected in.
+    :return: List of ((x1, y1, x2, y2), score), empty boxes left out.
+    """
+    boxes = []
+    for license_plate in detections:
+        x1, y1, x2, y2, score, class_id = license_plate
+
+        # Ensure coordinates are within frame boundaries
+        x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
+        x1 = max(x1, 0)
+        y1 = max(y1, 0)
+        x2 = min(x2, shape[1])
+        y2 = min(y2, shape[0])
+        if x2 > x1 and y2 > y1:
+            boxes.append(((x1, y1, x2, y2), score))
+    return boxes
+
+
+def preprocess_plate_crop(frame, box):
+    """
+    Crop a plate out of a BGR frame and binarize it for OCR.
+    """
+    x1, y1, x2, y2 = box
+    license_plate_crop = frame[y1:y2, x1:x2]
+    license_plate_crop_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+    _, license_plate_crop_thresh = cv2.threshold(
+        license_plate_crop_gray, 64, 255, cv2.THRESH_BINARY_INV
+    )
+    return license_plate_crop_thresh
+
+
+def average_precision(detections, references, iou_threshold=0.5):
+    """
+    Average precision of detections against reference boxes over a set of images.
+    :param detections: Per image list of [x1, y1, x2, y2, score, ...] rows.
+    :param references: Per image list of reference [x1, y1, x2, y2, ...] boxes.
+    :param iou_threshold: IoU a detection needs to match a reference box.
+    :return: All-point interpolated AP, 1.0 when there is nothing to find.
+    """
+    total = sum(len(boxes) for boxes in references)
+    ranked = sorted(
+        ((row[4], image, row[:4]) for image, rows in enumerate(detections) for row in rows),
+        key=lambda item: item[0], reverse=True,
+    )
+    if total == 0:
+        return 1.0 if not ranked else 0.0
+
+    matched = [set() for _ in references]
+    hits = []
+    for _, image, box in ranked:
+        best, best_iou = None, iou_threshold
+        for index, reference in enumerate(references[image]):
+            iou = box_iou(box, reference[:4])
+            if index not in matched[image] and iou >= best_iou:
+                best, best_iou = index, iou
+        if best is not None:
+            matched[image].add(best)
+        hits.append(best is not None)
+
+    true_positives = np.cumsum(hits)
+    recall = true_positives / total
+    precision = true_positives / np.arange(1, len(hits) + 1)
+
+    # Make precision monotonically decreasing, then integrate over recall
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    previous_recall = np.concatenate(([0.0], recall[:-1]))
+    return float(np.sum((recall - previous_recall) * precision))
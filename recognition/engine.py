@@ -0,0 +1,125 @@
+import threading
+
+from recognition.pipeline import RecognitionPipeline
+
+
+class RecognitionEngine:
+    """
+    Background recognition engine for one camera source.
+
+    The engine owns the only RecognitionPipeline (and so the only capture,
+    detector loop and gate decisions) for its source and keeps the most
+    recent annotated JPEG frame. Stream clients subscribe to it and get that
+    frame fanned out to them, so the cost of inference does not depend on how
+    many viewers are connected. Each frame is joined into one multipart
+    chunk when it is published and every client yields that same bytes
+    object, which the response passes on without copying it.
+    """
+
+    retry_delay = 2.0  # Seconds before reopening a source that stopped
+
+    def __init__(self, source, **pipeline_kwargs):
+        self.source = source
+        self.pipeline_kwargs = pipeline_kwargs
+
+        self._frame = None
+        self._sequence = 0
+        self._frame_ready = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._pipeline = None
+        self.subscribers = 0
+
+    def start(self):
+        """Start the engine thread if it is not already running."""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=f'engine-{self.source}', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop the pipeline and wake every subscriber so it can return."""
+        self._stop_event.set()
+        if self._pipeline is not None:
+            self._pipeline.stop()
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    @property
+    def latest_frame(self):
+        """Most recent frame as its multipart chunk, or None before the first frame."""
+        with self._frame_ready:
+            return self._frame
+
+    def _run(self):
+        while not self.stopped:
+            self._pipeline = RecognitionPipeline(self.source, **self.pipeline_kwargs)
+            if self._pipeline.start():
+                for frame in self._pipeline.frames():
+                    self._publish(frame)
+                    if self.stopped:
+                        break
+                self._pipeline.stop()
+
+            # The camera dropped or could not be opened, try again shortly
+            self._stop_event.wait(self.retry_delay)
+
+    def _publish(self, parts):
+        """Publish a frame given as the parts of its multipart chunk."""
+        frame = b''.join(parts)
+        with self._frame_ready:
+            self._frame = frame
+            self._sequence += 1
+            self._frame_ready.notify_all()
+
+    def subscribe(self, timeout=5.0):
+        """
+        Yield each new frame published by the engine, starting it if needed.
+        :param timeout: Seconds to wait for a frame before checking the engine again.
+        """
+        self.start()
+        seen = 0
+        with self._frame_ready:
+            self.subscribers += 1
+        try:
+            while not self.stopped:
+                with self._frame_ready:
+                    self._frame_ready.wait_for(
+                        lambda: self._sequence != seen or self.stopped, timeout
+                    )
+                    if self._sequence == seen:
+                        continue
+                    seen = self._sequence
+                    frame = self._frame
+                yield frame
+        finally:
+            with self._frame_ready:
+                self.subscribers -= 1
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(source, **pipeline_kwargs):
+    """
+    Return the shared engine for a camera source, creating it on first use.
+    :param source: Camera URL or video path.
+    :param pipeline_kwargs: Arguments for the RecognitionPipeline, used only
+        when the engine is created.
+    """
+    with _engines_lock:
+        engine = _engines.get(source)
+        if engine is None:
+            engine = RecognitionEngine(source, **pipeline_kwargs)
+            _engines[source] = engine
+        return engine
@@ -0,0 +1,154 @@
+import threading
+
+from plate_formats import CLASS_CONFUSIONS, default_grammar
+
+CONFUSION_COST = 0.3  # Reading a character of the wrong class for one it is confused with
+EDIT_COST = 1.0  # Any other substitution, insertion or deletion
+
+
+def _fold_groups():
+    """Join the class confusion pairs that share a character, e.g. 0, C and O."""
+    groups = []
+    for pair in CLASS_CONFUSIONS:
+        joined = set(pair)
+        for group in [group for group in groups if group & pair]:
+            joined |= group
+            groups.remove(group)
+        groups.append(joined)
+    return {char: min(group) for group in groups for char in group}
+
+
+# Character -> the one all its class confusions share, for finding candidates only
+_FOLD = _fold_groups()
+
+
+def _fold(text):
+    return ''.join(_FOLD.get(char, char) for char in text)
+
+
+def plate_distance(text, plate, slots=None):
+    """
+    Confusion-weighted edit distance from an OCR reading to a registered plate.
+
+    Substituting a character of the plate costs CONFUSION_COST only when the
+    read character does not fit that position of the plate's layout and is
+    one OCR confuses with the plate's character, e.g. an 8 read where a
+    letter B belongs. Two letters or two digits are never confused: every
+    other edit costs EDIT_COST.
+    :param slots: Characters every position of the plate takes, see
+        PlateGrammar.slots(); by default the class of the plate's own characters.
+    """
+    if slots is None:
+        slots = default_grammar.slots(plate)
+    previous = [j * EDIT_COST for j in range(len(plate) + 1)]
+    for i, read in enumerate(text, start=1):
+        current = [i * EDIT_COST]
+        for j, (char, valid) in enumerate(zip(plate, slots), start=1):
+            if read == char:
+                substitution = 0.0
+            elif read not in valid and frozenset((read, char)) in CLASS_CONFUSIONS:
+                substitution = CONFUSION_COST
+            else:
+                substitution = EDIT_COST
+            current.append(min(
+                previous[j - 1] + substitution,
+                previous[j] + EDIT_COST,
+                current[j - 1] + EDIT_COST,
+            ))
+        previous = current
+    return previous[-1]
+
+
+def _deletions(key):
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class PlateMatcher:
+    """
+    Nearest registered plate lookup that tolerates OCR confusions.
+
+    Plates are indexed by a folded form in which every character stands for
+    all characters of the other class it is confused with, so a reading
+    with any number of such misreads still finds its candidates with one
+    dictionary access. On top of that every folded form is indexed by its
+    single-character deletions (as in SymSpell), which finds plates one
+    other substitution, insertion or deletion away by looking up at most
+    len(plate) + 1 keys. Only those few candidates are scored with
+    plate_distance, against the layout of each plate, so a lookup stays
+    well under a millisecond however many plates are registered.
+    """
+
+    def __init__(self, plates=(), grammar=default_grammar):
+        self.grammar = grammar
+        self._lock = threading.Lock()
+        self._plates = {}  # folded form -> {registered plate: its slots}
+        self._deletes = {}  # folded form, or one of its deletions -> folded forms
+        for plate in plates:
+            self._add(plate)
+
+    def __len__(self):
+        return sum(len(plates) for plates in self._plates.values())
+
+    def add(self, plate):
+        with self._lock:
+            self._add(plate)
+
+    def _add(self, plate):
+        key = _fold(plate)
+        plates = self._plates.get(key)
+        if plates is None:
+            plates = self._plates[key] = {}
+            self._deletes.setdefault(key, set()).add(key)
+            for variant in _deletions(key):
+                self._deletes.setdefault(variant, set()).add(key)
+        plates[plate] = self.grammar.slots(plate)
+
+    def remove(self, plate):
+        key = _fold(plate)
+        with self._lock:
+            plates = self._plates.get(key)
+            if not plates or plate not in plates:
+                return
+            del plates[plate]
+            if plates:
+                return
+            del self._plates[key]
+            for variant in _deletions(key) | {key}:
+                keys = self._deletes.get(variant)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._deletes[variant]
+
+    def match(self, text, max_distance=EDIT_COST):
+        """
+        Find the registered plate nearest to an OCR reading.
+        :param text: Plate text as read by the recognizer.
+        :param max_distance: Largest plate_distance accepted.
+        :return: (plate, distance) of the unique nearest plate, or (None, None)
+            if nothing is close enough or two plates are equally close.
+        """
+        key = _fold(text)
+        with self._lock:
+            if max_distance < EDIT_COST:
+                # Only confusions are allowed, all candidates share the folded form
+                candidates = list(self._plates.get(key, {}).items())
+            else:
+                keys = set()
+                for variant in _deletions(key) | {key}:
+                    keys |= self._deletes.get(variant, set())
+                candidates = [item for k in keys for item in self._plates[k].items()]
+
+        best, best_distance, tied = None, None, False
+        for plate, slots in candidates:
+            distance = plate_distance(text, plate, slots)
+            if distance > max_distance:
+                continue
+            if best_distance is None or distance < best_distance:
+                best, best_distance, tied = plate, distance, False
+            elif distance == best_distance:
+                tied = True
+
+        if best is None or tied:
+            return None, None
+        return best, best_distance
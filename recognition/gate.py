@@ -0,0 +1,146 @@
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from recognition.audit import audit_writer
+from recognition.hardware import get_hardware
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HOLD = 'HOLD'
+CLOSING = 'CLOSING'
+
+
+class GateController:
+    """
+    Single owner of the gate servo, driven by one worker thread.
+
+    CLOSED -> OPEN on an open request, OPEN -> HOLD when the hold time has
+    run out but the IR sensor still sees the vehicle, then -> CLOSING and
+    back to CLOSED. Open requests that arrive while the gate is open are
+    coalesced into the current cycle and only extend the hold time. "Gate
+    Opened" and "Gate Closed" are logged when the servo has actually moved.
+    """
+
+    open_angle = 180
+    closed_angle = 80
+    poll_interval = 0.2  # Seconds between IR checks while the gate is open
+    max_hold = 60.0  # Close anyway after this long, e.g. if the IR sensor is stuck
+
+    def __init__(self, hardware, hold_time=5.0, lane_id=None):
+        """
+        :param lane_id: Lane the gate belongs to, for the audit log.
+        """
+        self.hardware = hardware
+        self.hold_time = hold_time
+        self.lane_id = lane_id
+        self.state = CLOSED
+        self.events = []  # (state, timestamp) transitions, newest last
+
+        self._condition = threading.Condition()
+        self._pending = None  # Vehicle id of a waiting open request, or 0 for an anonymous one
+        self._hold_until = 0.0
+        self._opened_at = None  # time.monotonic() the servo finished opening in this cycle
+        self._on_opened = []  # Callbacks waiting for the servo to open
+        self._thread = threading.Thread(target=self._run, name='gate-controller', daemon=True)
+        self._thread.start()
+
+    def request_open(self, vehicle_id=None, on_opened=None):
+        """
+        Ask for the gate to open; returns immediately.
+        :param vehicle_id: Vehicle the gate opens for, used in the audit log.
+        :param on_opened: Called with the time.monotonic() the gate was open
+            at, from the controller thread once the servo has moved, or right
+            away if the gate already is open.
+        """
+        with self._condition:
+            if self.state in (OPEN, HOLD):
+                # Coalesce into the current cycle, just keep the gate open longer
+                self._hold_until = max(self._hold_until, time.monotonic() + self.hold_time)
+                opened_at = self._opened_at
+                if opened_at is None and on_opened:
+                    self._on_opened.append(on_opened)
+                    return
+            else:
+                if self._pending is None:
+                    self._pending = vehicle_id or 0
+                if on_opened:
+                    self._on_opened.append(on_opened)
+                self._condition.notify()
+                return
+        if on_opened:
+            self._notify_opened([on_opened], opened_at)
+
+    def _set_state(self, state):
+        with self._condition:
+            self.state = state
+            self.events.append((state, timezone.now()))
+            del self.events[:-100]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending is not None)
+                vehicle_id, self._pending = self._pending or None, None
+                # Requests made while the servo is still moving join this cycle
+                self._hold_until = 0.0
+                self._set_state(OPEN)
+
+            self.hardware.set_angle(self.open_angle)
+            opened_at = time.monotonic()
+            with self._condition:
+                self._hold_until = max(self._hold_until, opened_at + self.hold_time)
+                self._opened_at = opened_at
+                callbacks, self._on_opened = self._on_opened, []
+            audit_writer.record_gate("Gate Opened", vehicle_id, lane_id=self.lane_id)
+            self._notify_opened(callbacks, opened_at)
+
+            self._hold(opened_at)
+
+            with self._condition:
+                self._opened_at = None
+            self._set_state(CLOSING)
+            self.hardware.set_angle(self.closed_angle)
+            self._set_state(CLOSED)
+            audit_writer.record_gate("Gate Closed", vehicle_id, lane_id=self.lane_id)
+
+    @staticmethod
+    def _notify_opened(callbacks, opened_at):
+        for callback in callbacks:
+            try:
+                callback(opened_at)
+            except Exception as e:
+                print(f"Gate opened callback failed: {e}")
+
+    def _hold(self, opened_at):
+        while True:
+            now = time.monotonic()
+            if now - opened_at >= self.max_hold:
+                return
+            with self._condition:
+                hold_until = self._hold_until
+            if now >= hold_until:
+                if not self.hardware.is_ir_triggered():
+                    return
+                # The vehicle is still under the barrier
+                if self.state != HOLD:
+                    self._set_state(HOLD)
+                with self._condition:
+                    self._hold_until = now + self.poll_interval
+            time.sleep(min(self.poll_interval, max(hold_until - now, 0.01)))
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_gate_controller():
+    """Return the gate controller of this process, started on first use."""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = GateController(get_hardware(), settings.GATE_HOLD_SECONDS)
+    return _controller
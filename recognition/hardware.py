@@ -0,0 +1,145 @@
+import threading
+import time
+from time import sleep
+
+from django.conf import settings
+
+
+class GateHardware:
+    """
+    The gate servo and IR sensor of a lane.
+
+    GPIOHardware drives the real pins on a Raspberry Pi; SimulatedHardware
+    stands in for them anywhere else, so the recognition loop can run and be
+    benchmarked on ordinary Linux boxes.
+    """
+
+    def set_angle(self, angle: int) -> None:
+        """
+        Set the angle of the servo motor.
+        :param angle: Angle in degrees (0 to 180).
+        """
+        raise NotImplementedError
+
+    def is_ir_triggered(self) -> bool:
+        """True while the IR sensor detects an obstacle."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class GPIOHardware(GateHardware):
+    """Servo on a PWM pin and IR sensor on an input pin, through RPi.GPIO."""
+
+    def __init__(self, servo_pin, ir_sensor_pin):
+        import RPi.GPIO as GPIO
+
+        self.GPIO = GPIO
+        self.servo_pin = servo_pin
+        self.ir_sensor_pin = ir_sensor_pin
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+
+        GPIO.setup(servo_pin, GPIO.OUT)
+        GPIO.setup(ir_sensor_pin, GPIO.IN)  # Set up IR sensor as input
+
+        self.servo = GPIO.PWM(servo_pin, 50)  # PWM at 50Hz
+        self.servo.start(0)
+
+        # Lock for thread-safe GPIO operations
+        self.lock = threading.Lock()
+
+    def set_angle(self, angle: int) -> None:
+        if 0 <= angle <= 180:
+            duty = angle / 18 + 2
+            with self.lock:
+                self.servo.ChangeDutyCycle(duty)
+            sleep(0.2)  # Reduced sleep time for faster operation
+            with self.lock:
+                self.servo.ChangeDutyCycle(0)
+        else:
+            print("Invalid angle. Angle must be between 0 and 180.")
+
+    def is_ir_triggered(self) -> bool:
+        # The IR sensor output is LOW when an obstacle is present
+        return self.GPIO.input(self.ir_sensor_pin) == self.GPIO.LOW
+
+    def close(self) -> None:
+        self.servo.stop()
+        self.GPIO.cleanup([self.servo_pin, self.ir_sensor_pin])
+
+
+class SimulatedHardware(GateHardware):
+    """
+    In-memory gate and IR sensor.
+
+    Every servo command is recorded in `servo_commands` as a (timestamp,
+    angle) pair, using time.monotonic() timestamps. The IR sensor reads
+    triggered during the (start, end) windows of `ir_script`, in seconds
+    since the simulator was created, or after trigger_ir() is called.
+    """
+
+    def __init__(self, ir_script=(), servo_delay=0.2):
+        self.ir_script = [tuple(window) for window in ir_script]
+        self.servo_delay = servo_delay
+        self.servo_commands = []
+        self.started_at = time.monotonic()
+        self._ir_until = float('-inf')
+        self._lock = threading.Lock()
+
+    def set_angle(self, angle: int) -> None:
+        if not 0 <= angle <= 180:
+            print("Invalid angle. Angle must be between 0 and 180.")
+            return
+        with self._lock:
+            self.servo_commands.append((time.monotonic(), angle))
+        # Mimic the time the servo pulse takes on the real gate
+        sleep(self.servo_delay)
+
+    def trigger_ir(self, duration=float('inf')):
+        """Make the IR sensor read triggered for `duration` seconds from now."""
+        self._ir_until = time.monotonic() + duration
+
+    def clear_ir(self):
+        self._ir_until = float('-inf')
+
+    def is_ir_triggered(self) -> bool:
+        now = time.monotonic()
+        if now < self._ir_until:
+            return True
+        elapsed = now - self.started_at
+        return any(start <= elapsed < end for start, end in self.ir_script)
+
+
+def make_hardware(kind=None, servo_pin=None, ir_sensor_pin=None):
+    """
+    Set up gate hardware.
+    :param kind: 'gpio' or 'simulated', default settings.RECOGNITION_HARDWARE.
+    :param servo_pin: Default settings.GATE_SERVO_PIN.
+    :param ir_sensor_pin: Default settings.IR_SENSOR_PIN.
+    """
+    kind = kind or settings.RECOGNITION_HARDWARE
+    if kind == 'gpio':
+        return GPIOHardware(
+            settings.GATE_SERVO_PIN if servo_pin is None else servo_pin,
+            settings.IR_SENSOR_PIN if ir_sensor_pin is None else ir_sensor_pin,
+        )
+    if kind == 'simulated':
+        return SimulatedHardware(settings.SIMULATED_IR_SCRIPT)
+    raise ValueError(f"Unknown RECOGNITION_HARDWARE {kind!r}")
+
+
+_hardware = None
+_hardware_lock = threading.Lock()
+
+
+def get_hardware():
+    """Return the gate hardware selected by settings.RECOGNITION_HARDWARE, set up on first use."""
+    global _hardware
+    if _hardware is None:
+        with _hardware_lock:
+            if _hardware is None:
+                _hardware = make_hardware()
+    return _hardware
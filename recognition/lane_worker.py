@@ -0,0 +1,90 @@
+"""
+Entry point of a lane worker process, started by recognition.lanes.LaneSupervisor.
+
+Workers are spawned fresh, so this module only imports Django things after
+django.setup().
+"""
+import json
+import os
+import signal
+import sys
+import threading
+
+
+def run_lane(lane_id, frame_slot, cores, metrics_slot=None):
+    """
+    Run one lane's recognition pipeline, with its own gate, and publish its
+    frames to the lane's frame slot and its latency metrics to its metrics
+    slot. Returns (exit code 0) when stopped,
+    exits with 1 when the camera source ends or cannot be opened, so the
+    supervisor restarts it.
+    :param lane_id: Lane primary key.
+    :param frame_slot: Shared memory name of the lane's FrameSlot.
+    :param cores: CPU cores to run on, empty for any.
+    :param metrics_slot: Shared memory name of the lane's MetricsSlot, None to keep them in this process.
+    """
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    # Keep the inference libraries within the lane's share of the cores
+    threads = str(len(cores) or 1)
+    os.environ.setdefault('OMP_NUM_THREADS', threads)
+
+    # Stop cleanly on the supervisor's terminate(), closing the gate hardware
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    import django
+    django.setup()
+
+    import cv2
+    from django.conf import settings
+    from django.db import connection
+
+    from recognition.audit import audit_writer
+    from recognition.gate import GateController
+    from recognition.hardware import make_hardware
+    from recognition.metrics import metrics as latency_metrics
+    from recognition.model_registry import get_detector
+    from recognition.models import Lane
+    from recognition.pipeline import RecognitionPipeline
+    from recognition.shared_frames import FrameSlot, MetricsSlot
+
+    cv2.setNumThreads(int(threads))
+
+    lane = Lane.objects.get(pk=lane_id)
+    connection.close()
+
+    hardware = make_hardware(lane.hardware, lane.servo_pin, lane.ir_sensor_pin)
+    gate = GateController(hardware, settings.GATE_HOLD_SECONDS, lane_id=lane.pk)
+    slot = FrameSlot.attach(frame_slot, track=True)
+    metrics = MetricsSlot.attach(metrics_slot, track=True) if metrics_slot is not None else None
+    metrics_stopped = threading.Event()
+
+    def publish_metrics():
+        while not metrics_stopped.wait(MetricsSlot.publish_interval):
+            metrics.write(json.dumps(latency_metrics.snapshot()).encode())
+
+    publisher = threading.Thread(target=publish_metrics, name='lane-metrics', daemon=True)
+    if metrics is not None:
+        publisher.start()
+    pipeline = RecognitionPipeline(
+        lane.source, get_detector(), hardware.is_ir_triggered, gate.request_open,
+        roi=lane.roi, lane_id=lane.pk, grammar=lane.grammar(),
+    )
+    print(f"Lane {lane}: reading {lane.source} on cores {sorted(cores) or 'any'}")
+    try:
+        if not pipeline.start():
+            sys.exit(1)
+        for _, jpeg, _ in pipeline.frames():
+            slot.write(jpeg)
+        sys.exit(1)  # The source ended
+    finally:
+        pipeline.stop()
+        audit_writer.close()
+        hardware.close()
+        slot.close()
+        if metrics is not None:
+            metrics_stopped.set()
+            publisher.join()
+            # The last timings of a worker that is restarted are kept until its next one publishes
+            metrics.write(json.dumps(latency_metrics.snapshot()).encode())
+            metrics.close()
@@ -0,0 +1,236 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+from django.db import connection
+
+from recognition.engine import RecognitionEngine
+from recognition.lane_worker import run_lane
+from recognition.models import Lane
+from recognition.pipeline import FRAME_HEADER, FRAME_TRAILER
+from recognition.shared_frames import FrameSlot, MetricsSlot, metrics_slot_name, slot_name
+
+
+def available_cores():
+    """CPU cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def assign_cores(lane_ids, cores=None):
+    """
+    Share the cores out between lanes, round robin.
+    :return: {lane id: set of cores}; with more lanes than cores, lanes share a core.
+    """
+    cores = cores if cores is not None else available_cores()
+    lane_ids = sorted(lane_ids)
+    if len(lane_ids) <= len(cores):
+        return {lane_id: set(cores[index::len(lane_ids)]) for index, lane_id in enumerate(lane_ids)}
+    return {lane_id: {cores[index % len(cores)]} for index, lane_id in enumerate(lane_ids)}
+
+
+class _LaneWorker:
+    def __init__(self, lane_id, version):
+        self.lane_id = lane_id
+        self.version = version  # Lane.updated_at the worker was started with
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.restart_at = None
+
+
+class LaneSupervisor:
+    """
+    Runs one recognition worker process per enabled lane.
+
+    Each worker (see lane_worker.run_lane) gets its share of the CPU cores
+    and publishes its frames to a FrameSlot and its latency metrics to a
+    MetricsSlot the supervisor owns, which web server processes stream and
+    report from. A worker that exits is restarted after a
+    delay that doubles with every consecutive failure; one that ran for
+    `stable_after` seconds counts as recovered. Lanes are re-read every
+    `reload_interval` seconds, and workers of lanes that were edited,
+    disabled or deleted are restarted or stopped.
+    """
+
+    poll_interval = 1.0
+    reload_interval = 10.0
+    restart_delay = 2.0
+    max_restart_delay = 60.0
+    stable_after = 60.0
+
+    def __init__(self, lane_ids=None):
+        """
+        :param lane_ids: Run only these lanes, default all enabled ones.
+        """
+        self.lane_ids = lane_ids
+        self.workers = {}  # lane id -> _LaneWorker
+        self._slots = {}  # lane id -> FrameSlot
+        self._metrics_slots = {}  # lane id -> MetricsSlot
+        self._cores = {}  # lane id -> cores
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = threading.Event()
+
+    def _enabled_lanes(self):
+        lanes = Lane.objects.filter(enabled=True)
+        if self.lane_ids:
+            lanes = lanes.filter(pk__in=self.lane_ids)
+        versions = dict(lanes.values_list('pk', 'updated_at'))
+        connection.close()
+        return versions
+
+    def run(self):
+        """Supervise the lanes until stop() is called."""
+        next_reload = 0.0
+        try:
+            while not self._stop_event.is_set():
+                now = time.monotonic()
+                if now >= next_reload:
+                    self._sync(self._enabled_lanes())
+                    next_reload = now + self.reload_interval
+                self._check(now)
+                self._stop_event.wait(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _sync(self, lanes):
+        for lane_id, worker in list(self.workers.items()):
+            if lanes.get(lane_id) != worker.version:
+                print(f"Lane {lane_id} changed or was disabled, stopping its worker")
+                self._terminate(worker)
+                del self.workers[lane_id]
+
+        self._cores = assign_cores(lanes)
+        for lane_id, version in lanes.items():
+            if lane_id not in self.workers:
+                self.workers[lane_id] = _LaneWorker(lane_id, version)
+                self._start(self.workers[lane_id])
+
+    def _start(self, worker):
+        slot = self._slots.get(worker.lane_id)
+        if slot is None:
+            slot = self._slots[worker.lane_id] = FrameSlot.create(slot_name(worker.lane_id))
+        metrics_slot = self._metrics_slots.get(worker.lane_id)
+        if metrics_slot is None:
+            metrics_slot = self._metrics_slots[worker.lane_id] = MetricsSlot.create(metrics_slot_name(worker.lane_id))
+        worker.process = self._context.Process(
+            target=run_lane,
+            args=(worker.lane_id, slot.memory.name, self._cores.get(worker.lane_id, set()), metrics_slot.memory.name),
+            name=f'lane-{worker.lane_id}', daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+
+    def _check(self, now):
+        for worker in self.workers.values():
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    print(f"Restarting lane {worker.lane_id}")
+                    self._start(worker)
+                continue
+            if worker.process.is_alive():
+                continue
+
+            if now - worker.started_at >= self.stable_after:
+                worker.failures = 0
+            worker.failures += 1
+            delay = min(self.restart_delay * 2 ** (worker.failures - 1), self.max_restart_delay)
+            worker.restart_at = now + delay
+            print(f"Lane {worker.lane_id} worker exited with code {worker.process.exitcode}, restarting in {delay:.0f}s")
+
+    @staticmethod
+    def _terminate(worker, timeout=5.0):
+        process = worker.process
+        if process is None or not process.is_alive():
+            return
+        process.terminate()
+        process.join(timeout)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _shutdown(self):
+        for worker in self.workers.values():
+            self._terminate(worker)
+        self.workers = {}
+        for slot in [*self._slots.values(), *self._metrics_slots.values()]:
+            slot.close()
+        self._slots = {}
+        self._metrics_slots = {}
+
+
+class LaneFeed(RecognitionEngine):
+    """
+    A lane's video feed in a web server process.
+
+    Instead of running a pipeline, the engine thread polls the lane's frame
+    slot, written by the lane worker, and fans new frames out to this
+    process's stream clients like any RecognitionEngine. If the slot goes
+    quiet it is opened again, in case the supervisor was restarted.
+    """
+
+    poll_interval = 0.01  # Seconds between checks for a new frame
+    stale_after = 5.0  # Seconds without a frame before reopening the slot
+
+    def _run(self):
+        slot = None
+        sequence = 0
+        last_frame_at = time.monotonic()
+        while not self.stopped:
+            if slot is None:
+                try:
+                    slot = FrameSlot.attach(self.source)
+                except FileNotFoundError:
+                    self._stop_event.wait(self.retry_delay)
+                    continue
+                sequence = 0
+                last_frame_at = time.monotonic()
+
+            sequence, jpeg = slot.read(sequence)
+            if jpeg is not None:
+                last_frame_at = time.monotonic()
+                self._publish((FRAME_HEADER, jpeg, FRAME_TRAILER))
+            elif time.monotonic() - last_frame_at > self.stale_after:
+                slot.close()
+                slot = None
+            else:
+                self._stop_event.wait(self.poll_interval)
+        if slot is not None:
+            slot.close()
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_lane_feed(lane_id):
+    """Return this process's feed of a lane, creating it on first use."""
+    with _feeds_lock:
+        feed = _feeds.get(lane_id)
+        if feed is None:
+            feed = _feeds[lane_id] = LaneFeed(slot_name(lane_id))
+        return feed
+
+
+def lane_metrics():
+    """{lane id: LatencyMetrics.snapshot()} of the lane workers that are publishing theirs."""
+    snapshots = {}
+    for lane_id in Lane.objects.filter(enabled=True).values_list('pk', flat=True):
+        try:
+            slot = MetricsSlot.attach(metrics_slot_name(lane_id))
+        except FileNotFoundError:
+            continue  # Not run by a supervisor on this host
+        try:
+            _, data = slot.read()
+        finally:
+            slot.close()
+        if data is not None:
+            snapshots[lane_id] = json.loads(data)
+    return snapshots
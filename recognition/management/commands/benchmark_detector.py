@@ -0,0 +1,70 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.detectors import DETECTOR_BACKENDS, average_precision, load_detector
+from recognition.sources import expand_sources, iter_frames
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure frames per second of detector backends on sample frames, and their "
+        "mAP@0.5 drift against the first backend listed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help="Images, image directories or videos.")
+        parser.add_argument(
+            '--backend', action='append', dest='backends', default=[],
+            metavar='BACKEND:MODEL',
+            help="Backend and model to benchmark, e.g. onnx:license_plate_detector-int8.onnx. "
+                 "May be repeated; the first one is the reference (default: the configured detector).",
+        )
+        parser.add_argument('--max-frames', type=int, default=200)
+        parser.add_argument('--step', type=int, default=5, help="Use every n-th frame of videos.")
+        parser.add_argument('--warmup', type=int, default=3)
+
+    def handle(self, *args, **options):
+        specs = options['backends'] or [f'{settings.PLATE_DETECTOR_BACKEND}:{settings.PLATE_DETECTOR_MODEL}']
+        backends = []
+        for spec in specs:
+            backend, _, model_path = spec.partition(':')
+            if backend not in DETECTOR_BACKENDS or not model_path:
+                raise CommandError(f"Expected BACKEND:MODEL with BACKEND in {sorted(DETECTOR_BACKENDS)}, got {spec!r}")
+            backends.append((backend, model_path))
+
+        frames = []
+        for path in expand_sources(options['sources']):
+            for _, frame in iter_frames(path, step=options['step']):
+                frames.append(frame)
+                if len(frames) >= options['max_frames']:
+                    break
+            if len(frames) >= options['max_frames']:
+                break
+        if not frames:
+            raise CommandError("No frames could be read from the given sources.")
+
+        self.stdout.write(f"Benchmarking {len(backends)} backend(s) on {len(frames)} frame(s)")
+        self.stdout.write(f"{'backend':<12} {'model':<40} {'fps':>8} {'ms/frame':>9} {'mAP@0.5':>8} {'drift':>7}")
+
+        reference = None
+        for backend, model_path in backends:
+            detector = load_detector(backend, model_path)
+            for frame in frames[:options['warmup']]:
+                detector.detect(frame)
+
+            detections = []
+            started = time.perf_counter()
+            for frame in frames:
+                detections.append(detector.detect(frame))
+            elapsed = time.perf_counter() - started
+
+            if reference is None:
+                reference = detections
+            mean_ap = average_precision(detections, reference)
+
+            self.stdout.write(
+                f"{backend:<12} {str(model_path):<40} {len(frames) / elapsed:>8.2f} "
+                f"{1000 * elapsed / len(frames):>9.1f} {mean_ap:>8.3f} {1 - mean_ap:>7.3f}"
+            )
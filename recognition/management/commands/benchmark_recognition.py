@@ -0,0 +1,271 @@
+import datetime
+import json
+import platform
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from recognition import benchmark_fixtures
+from recognition.detectors import average_precision, load_detector, preprocess_plate_crop
+
+BENCHMARKS = ['format_license', 'license_complies_format', 'read_license_plate', 'detector', 'pipeline']
+
+# Metric name suffixes where a larger value is better; for every other
+# metric (latencies) a smaller value is better
+HIGHER_IS_BETTER = ('fps', 'per_second', 'accuracy', 'map50')
+
+
+def _latency_summary(seconds):
+    seconds = np.asarray(seconds)
+    return {
+        'mean_ms': round(1000 * float(seconds.mean()), 3),
+        'p50_ms': round(1000 * float(np.percentile(seconds, 50)), 3),
+        'p95_ms': round(1000 * float(np.percentile(seconds, 95)), 3),
+    }
+
+
+def _time_calls(func, args, repeat):
+    """Call func over every argument `repeat` times and report its throughput."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for arg in args:
+            func(arg)
+    elapsed = time.perf_counter() - started
+    calls = repeat * len(args)
+    return {'calls_per_second': round(calls / elapsed, 1), 'mean_us': round(1e6 * elapsed / calls, 3)}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare benchmark results with a baseline.
+    :param tolerance: Relative change a metric may get worse by before it counts as a regression.
+    :return: List of (benchmark, metric, baseline value, value) regressions.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(name, {}).get(metric)
+            if not isinstance(expected, (int, float)) or isinstance(expected, bool):
+                continue
+            if value is None:
+                regressions.append((name, metric, expected, value))
+            elif metric.endswith(HIGHER_IS_BETTER):
+                if value < expected * (1 - tolerance):
+                    regressions.append((name, metric, expected, value))
+            elif value > expected * (1 + tolerance):
+                regressions.append((name, metric, expected, value))
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the recognition hot path (plate formatting, OCR, detector and the full "
+        "pipeline with simulated gate hardware) on the checked-in synthetic fixtures, and "
+        "compare throughput, latency and accuracy with a stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=BENCHMARKS, help="Run only this benchmark; may be repeated.")
+        parser.add_argument('--fixtures', default=str(benchmark_fixtures.FIXTURE_DIR), help="Fixture directory.")
+        parser.add_argument('--generate-fixtures', action='store_true', help="Regenerate the fixtures first.")
+        parser.add_argument('--baseline', help="Baseline JSON (default: baseline.json in the fixture directory).")
+        parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression (default: 0.15).")
+        parser.add_argument('--output', help="Also write the results as JSON to this file.")
+        parser.add_argument('--repeat', type=int, default=2000, help="Repetitions of the plate formatting benchmarks.")
+        parser.add_argument('--backend', help="Detector backend (default: settings.PLATE_DETECTOR_BACKEND).")
+        parser.add_argument('--model', help="Detector model (default: settings.PLATE_DETECTOR_MODEL).")
+
+    def handle(self, *args, **options):
+        fixtures = Path(options['fixtures'])
+        if options['generate_fixtures']:
+            benchmark_fixtures.generate(fixtures)
+        try:
+            manifest = benchmark_fixtures.load_manifest(fixtures)
+        except FileNotFoundError:
+            raise CommandError(f"No fixtures in {fixtures}, run with --generate-fixtures first.")
+
+        scenes = [(cv2.imread(str(fixtures / image['file'])), image) for image in manifest['images']]
+        self._detector = None
+        self._options = options
+
+        results = {}
+        for name in options['only'] or BENCHMARKS:
+            self.stdout.write(f"Running {name}...")
+            results[name] = getattr(self, f'bench_{name}')(scenes, manifest, fixtures)
+            self.stdout.write('  ' + ', '.join(f'{metric}={value}' for metric, value in results[name].items()))
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'opencv': cv2.__version__,
+                'backend': options['backend'],
+                'model': options['model'],
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        baseline_path = Path(options['baseline'] or fixtures / 'baseline.json')
+        if options['save_baseline']:
+            with open(baseline_path, 'w') as baseline_file:
+                json.dump(report, baseline_file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Saved baseline to {baseline_path}"))
+            return
+        if not baseline_path.exists():
+            raise CommandError(
+                f"No baseline at {baseline_path}: record one with --save-baseline on the target hardware, "
+                f"with the production models installed."
+            )
+
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        environment = baseline.get('environment', {})
+        for key, value in report['environment'].items():
+            if environment.get(key) != value:
+                self.stdout.write(self.style.WARNING(
+                    f"Baseline was recorded with {key}={environment.get(key)}, this run has {value}"
+                ))
+        regressions = compare(results, baseline['results'], options['tolerance'])
+        for name, metric, expected, value in regressions:
+            self.stdout.write(self.style.ERROR(f"{name}.{metric}: {value} (baseline {expected})"))
+        if regressions:
+            raise CommandError(f"{len(regressions)} metric(s) regressed by more than {options['tolerance']:.0%}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {baseline_path}"))
+
+    def _get_detector(self):
+        if self._detector is None:
+            self._detector = load_detector(self._options['backend'], self._options['model'])
+        return self._detector
+
+    def bench_format_license(self, scenes, manifest, fixtures):
+        from util import format_license
+
+        # The plates as read, and with the usual OCR confusions in them
+        readings = [image['plate'] for _, image in scenes]
+        readings += [plate.translate(str.maketrans('OISB', '0158')) for plate in readings]
+        return _time_calls(format_license, readings, self._options['repeat'])
+
+    def bench_license_complies_format(self, scenes, manifest, fixtures):
+        from util import license_complies_format
+
+        readings = [image['plate'] for _, image in scenes]
+        readings += [plate[::-1] for plate in readings]
+        return _time_calls(license_complies_format, readings, self._options['repeat'])
+
+    def bench_read_license_plate(self, scenes, manifest, fixtures):
+        from recognition.model_registry import get_reader
+        from util import read_license_plate
+
+        get_reader()
+        crops = [(preprocess_plate_crop(frame, image['box']), image['plate']) for frame, image in scenes]
+        read_license_plate(crops[0][0])  # Warm up
+
+        seconds, correct = [], 0
+        for crop, plate in crops:
+            started = time.perf_counter()
+            text, _ = read_license_plate(crop)
+            seconds.append(time.perf_counter() - started)
+            correct += text == plate
+        return {
+            'calls_per_second': round(len(seconds) / sum(seconds), 2),
+            **_latency_summary(seconds),
+            'accuracy': round(correct / len(crops), 3),
+        }
+
+    def bench_detector(self, scenes, manifest, fixtures):
+        detector = self._get_detector()
+        detector.detect(scenes[0][0])  # Warm up
+
+        seconds, detections = [], []
+        for frame, _ in scenes:
+            started = time.perf_counter()
+            detections.append(detector.detect(frame))
+            seconds.append(time.perf_counter() - started)
+        references = [[image['box']] for _, image in scenes]
+        return {
+            'fps': round(len(seconds) / sum(seconds), 2),
+            **_latency_summary(seconds),
+            'map50': round(average_precision(detections, references), 3),
+        }
+
+    def bench_pipeline(self, scenes, manifest, fixtures):
+        """
+        Replay the clip through the shared recognition engine at its recorded
+        frame rate, as the video feed would: with the clip's plate registered
+        and approved in a throwaway test database, the gate decided from the
+        plate index, audit rows written, and simulated gate hardware.
+        """
+        from border.models import Vehicle, LicensePlate, BorderCheck
+        from recognition.audit import audit_writer
+        from recognition.engine import get_engine
+        from recognition.gate import GateController
+        from recognition.hardware import SimulatedHardware
+        from recognition.metrics import STAGE_SECONDS, VEHICLE_SECONDS, metrics
+        from recognition.model_registry import get_reader
+        from recognition.models import PlateRecognition
+        from recognition.plate_index import plate_index
+
+        clip = manifest['clip']
+        duration = len(clip['boxes']) / clip['fps']
+        get_reader()
+        detector = self._get_detector()
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(RECOGNITION_TRACE_FILE=''):
+                vehicle = Vehicle.objects.create(
+                    vehicle_model='Benchmark', vehicle_color='White', owner_name='Benchmark',
+                    country_of_origin='Rwanda', destination_country='Uganda',
+                )
+                LicensePlate.objects.create(vehicle=vehicle, license_plate_number=clip['plate'], issued_at=datetime.date.today())
+                BorderCheck.objects.create(vehicle=vehicle, border_name='Benchmark', is_approved=True)
+                plate_index.load()
+
+                hardware = SimulatedHardware(ir_script=[(0, duration)], servo_delay=0.2)
+                gate = GateController(hardware)
+
+                def open_gate(vehicle_id=None, on_opened=None):
+                    gate.request_open(vehicle_id, on_opened)
+
+                detections = metrics.histogram(STAGE_SECONDS, 'stage', 'detect')
+                spans = {span: metrics.histogram(VEHICLE_SECONDS, 'span', span)
+                         for span in ('capture_to_decision', 'capture_to_gate')}
+                detected_before = detections.count
+                seen_before = {span: histogram.count for span, histogram in spans.items()}
+
+                engine = get_engine(
+                    str(fixtures / clip['file']), detector=detector, is_triggered=hardware.is_ir_triggered,
+                    open_gate=open_gate, playback_fps=clip['fps'],
+                )
+                # The engine replays a finished source after its retry delay, stop it before that
+                threading.Timer(duration + 1.0, engine.stop).start()
+                started = time.perf_counter()
+                streamed = [time.perf_counter() for _ in engine.subscribe()]
+                time.sleep(0.5)  # Let a gate request made at the end land
+                audit_writer.close()  # Writes the queued recognitions
+
+                first = {}
+                for span, histogram in spans.items():
+                    new = histogram.count - seen_before[span]
+                    first[span] = round(list(histogram.recent)[-new], 3) if new else None
+                decided = PlateRecognition.objects.order_by('detected_at').values_list('plate_number', flat=True).first()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        return {
+            'stream_fps': round((len(streamed) - 1) / (streamed[-1] - streamed[0]), 2) if len(streamed) > 1 else None,
+            'detect_fps': round((detections.count - detected_before) / (streamed[-1] - started), 2) if streamed else None,
+            'decision_seconds': first['capture_to_decision'],
+            'gate_seconds': first['capture_to_gate'],
+            'accuracy': float(decided == clip['plate']),
+        }
@@ -0,0 +1,112 @@
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.detectors import letterbox, to_blob
+from recognition.sources import expand_sources, iter_frames
+
+
+class Command(BaseCommand):
+    help = "Export the license plate detector checkpoint to ONNX, optionally quantized to FP16 or INT8."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weights', default='license_plate_detector.pt', help="YOLO checkpoint to export.")
+        parser.add_argument('--output', help="Path of the exported model (default: next to the checkpoint).")
+        parser.add_argument('--imgsz', type=int, default=640, help="Square detector input size.")
+        parser.add_argument('--opset', type=int, default=12)
+        parser.add_argument('--quantize', choices=['none', 'fp16', 'int8'], default='none')
+        parser.add_argument(
+            '--calibration', nargs='*', default=[],
+            help="Images or videos for static INT8 calibration; dynamic quantization is used without them.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from ultralytics import YOLO
+        except ImportError:
+            raise CommandError("Exporting needs the ultralytics package.")
+
+        weights = Path(options['weights'])
+        if not weights.exists():
+            raise CommandError(f"Checkpoint not found: {weights}")
+
+        quantize = options['quantize']
+        suffix = '' if quantize == 'none' else f'-{quantize}'
+        output = Path(options['output'] or weights.with_name(f'{weights.stem}{suffix}.onnx'))
+
+        self.stdout.write(f"Exporting {weights} to ONNX at {options['imgsz']}x{options['imgsz']}...")
+        exported = Path(YOLO(str(weights)).export(
+            format='onnx', imgsz=options['imgsz'], opset=options['opset'], simplify=True, dynamic=False,
+        ))
+
+        if quantize == 'fp16':
+            self._to_fp16(exported, output)
+        elif quantize == 'int8':
+            self._to_int8(exported, output, options['calibration'], options['imgsz'])
+        elif exported.resolve() != output.resolve():
+            shutil.move(str(exported), output)
+
+        self.stdout.write(self.style.SUCCESS(f"Exported detector to {output}"))
+        self.stdout.write(
+            f"Run it with PLATE_DETECTOR_BACKEND=onnx PLATE_DETECTOR_MODEL={output} "
+            f"(currently {settings.PLATE_DETECTOR_BACKEND}: {settings.PLATE_DETECTOR_MODEL})"
+        )
+
+    def _to_fp16(self, source, output):
+        try:
+            import onnx
+            from onnxconverter_common import float16
+        except ImportError:
+            raise CommandError("FP16 conversion needs the onnx and onnxconverter-common packages.")
+
+        model = float16.convert_float_to_float16(onnx.load(str(source)), keep_io_types=True)
+        onnx.save(model, str(output))
+
+    def _to_int8(self, source, output, calibration, imgsz):
+        try:
+            from onnxruntime import quantization
+        except ImportError:
+            raise CommandError("INT8 quantization needs the onnxruntime package.")
+
+        if not calibration:
+            # Weights only, activations are quantized on the fly
+            quantization.quantize_dynamic(
+                str(source), str(output), weight_type=quantization.QuantType.QUInt8,
+            )
+            return
+
+        quantization.quantize_static(
+            str(source), str(output), CalibrationFrames(source, calibration, imgsz),
+            quant_format=quantization.QuantFormat.QDQ,
+            activation_type=quantization.QuantType.QUInt8,
+            weight_type=quantization.QuantType.QInt8,
+        )
+
+
+class CalibrationFrames:
+    """ONNX Runtime calibration data reader over sample images and videos."""
+
+    max_frames = 200
+
+    def __init__(self, model_path, paths, imgsz):
+        import onnxruntime
+
+        session = onnxruntime.InferenceSession(str(model_path), providers=['CPUExecutionProvider'])
+        self.input_name = session.get_inputs()[0].name
+        self.imgsz = imgsz
+        self._frames = (
+            frame for path in expand_sources(paths) for _, frame in iter_frames(path, step=15)
+        )
+        self._count = 0
+
+    def get_next(self):
+        if self._count >= self.max_frames:
+            return None
+        frame = next(self._frames, None)
+        if frame is None:
+            return None
+        self._count += 1
+        image, _, _, _ = letterbox(frame, (self.imgsz, self.imgsz))
+        return {self.input_name: to_blob(image)}
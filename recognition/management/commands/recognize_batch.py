@@ -0,0 +1,159 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+import cv2
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.sources import IMAGE_EXTENSIONS, expand_sources, iter_frames
+
+CSV_FIELDS = ['source', 'frame', 'x1', 'y1', 'x2', 'y2', 'detection_score', 'plate', 'ocr_score']
+
+# Per worker process state, filled in by _init_worker
+_detector = None
+_read_license_plates = None
+
+
+def _init_worker(backend, model_path):
+    """Load the detector and the OCR reader once per worker process."""
+    global _detector, _read_license_plates
+
+    # One process per core: keep the inference libraries from oversubscribing it
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    cv2.setNumThreads(1)
+
+    import django
+    django.setup()
+
+    from recognition.detectors import load_detector
+    from util import get_reader, read_license_plates
+
+    _detector = load_detector(backend, model_path)
+    get_reader()
+    _read_license_plates = read_license_plates
+
+
+def _recognize_task(task):
+    """
+    Detect and read the plates of one task.
+    :param task: (path, first_frame, last_frame, step) for a video segment,
+        or (paths, None, None, None) for a chunk of images.
+    :return: List of result rows, one per detected plate.
+    """
+    from recognition.detectors import clip_boxes, preprocess_plate_crop
+
+    path, first_frame, last_frame, step = task
+    if first_frame is None:
+        frames = ((str(image), index, frame) for image in path for index, frame in iter_frames(image))
+    else:
+        frames = _video_segment(path, first_frame, last_frame, step)
+
+    rows = []
+    for source, frame_index, frame in frames:
+        boxes = clip_boxes(_detector.detect(frame), frame.shape)
+        readings = _read_license_plates([preprocess_plate_crop(frame, box) for box, _ in boxes])
+        for ((x1, y1, x2, y2), detection_score), (plate, ocr_score) in zip(boxes, readings):
+            rows.append({
+                'source': source, 'frame': frame_index,
+                'x1': x1, 'y1': y1, 'x2': x2, 'y2': y2,
+                'detection_score': round(float(detection_score), 4),
+                'plate': plate, 'ocr_score': None if ocr_score is None else round(float(ocr_score), 4),
+            })
+    return rows
+
+
+def _video_segment(path, first_frame, last_frame, step):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        print(f"Error opening video file: {path}")
+        return
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+        for frame_index in range(first_frame, last_frame):
+            # grab() skips decoding the frames that are not needed
+            if (frame_index - first_frame) % step:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield path, frame_index, frame
+    finally:
+        cap.release()
+
+
+class Command(BaseCommand):
+    help = (
+        "Recognize license plates in recorded videos and image folders using a pool of "
+        "worker processes, writing one row per detected plate to CSV or JSONL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('sources', nargs='+', help="Video files, image files or image directories.")
+        parser.add_argument('--output', '-o', default='-', help="Output file, .csv or .jsonl (default: JSONL on stdout).")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Output format (default: from the output extension).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--step', type=int, default=1, help="Process every n-th video frame.")
+        parser.add_argument('--segment-frames', type=int, default=1500, help="Video frames per task.")
+        parser.add_argument('--images-per-task', type=int, default=50)
+        parser.add_argument('--backend', help="Detector backend (default: settings.PLATE_DETECTOR_BACKEND).")
+        parser.add_argument('--model', help="Detector model (default: settings.PLATE_DETECTOR_MODEL).")
+
+    def handle(self, *args, **options):
+        output_format = options['format'] or ('csv' if options['output'].endswith('.csv') else 'jsonl')
+        tasks = self._tasks(options)
+        if not tasks:
+            raise CommandError("No readable images or videos in the given sources.")
+
+        out = sys.stdout if options['output'] == '-' else open(options['output'], 'w', newline='')
+        try:
+            if output_format == 'csv':
+                writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+                writer.writeheader()
+                write = writer.writerow
+            else:
+                def write(row):
+                    out.write(json.dumps(row) + '\n')
+
+            # spawn, not fork: the inference libraries do not survive forking with threads running
+            context = multiprocessing.get_context('spawn')
+            plates = 0
+            with context.Pool(
+                options['workers'], initializer=_init_worker,
+                initargs=(options['backend'], options['model']),
+            ) as pool:
+                for done, rows in enumerate(pool.imap(_recognize_task, tasks), start=1):
+                    for row in rows:
+                        write(row)
+                    plates += len(rows)
+                    self.stderr.write(f"\r{done}/{len(tasks)} tasks, {plates} plates", ending='')
+            self.stderr.write('')
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    def _tasks(self, options):
+        images, tasks = [], []
+        for path in expand_sources(options['sources']):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                images.append(path)
+                continue
+
+            cap = cv2.VideoCapture(str(path))
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+            cap.release()
+            if frame_count <= 0:
+                self.stderr.write(f"Skipping unreadable video: {path}")
+                continue
+
+            segment = options['segment_frames'] - options['segment_frames'] % options['step'] or options['step']
+            for first_frame in range(0, frame_count, segment):
+                tasks.append((str(path), first_frame, min(first_frame + segment, frame_count), options['step']))
+
+        size = options['images_per_task']
+        for start in range(0, len(images), size):
+            tasks.append((images[start:start + size], None, None, None))
+        return tasks
@@ -0,0 +1,33 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recognition.lanes import LaneSupervisor
+from recognition.models import Lane
+
+
+class Command(BaseCommand):
+    help = (
+        "Run one recognition worker process per enabled lane, spread over the CPU cores, "
+        "and restart workers that fail. The web server streams each lane at "
+        "recognition/video-feed/<lane_id>/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lane', type=int, action='append', help="Run only this lane id; may be repeated.")
+
+    def handle(self, *args, **options):
+        lanes = Lane.objects.filter(enabled=True)
+        if options['lane']:
+            lanes = lanes.filter(pk__in=options['lane'])
+        if not lanes.exists():
+            raise CommandError("No enabled lanes, add one in the admin first.")
+
+        supervisor = LaneSupervisor(options['lane'])
+        signal.signal(signal.SIGTERM, lambda signum, frame: supervisor.stop())
+        self.stdout.write(f"Supervising {lanes.count()} lane(s), Ctrl-C to stop")
+        try:
+            supervisor.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Stopped every lane")
@@ -0,0 +1,160 @@
+import bisect
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """
+    Latency histogram with cumulative buckets, plus a window of the most
+    recent observations to report p50/p95/p99 from.
+    """
+
+    window = 2048
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=self.window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+
+    def quantiles(self, qs=(0.5, 0.95, 0.99)):
+        """Quantiles of the recent observations, None when there are none."""
+        with self._lock:
+            values = sorted(self.recent)
+        if not values:
+            return {q: None for q in qs}
+        return {q: values[min(int(q * len(values)), len(values) - 1)] for q in qs}
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+    def state(self):
+        """[buckets, bucket counts, sum, count, [[quantile, seconds], ...], recent sum, recent count], JSON-able."""
+        counts, total, count = self.snapshot()
+        with self._lock:
+            recent = list(self.recent)
+        return [list(self.buckets), counts, total, count, [list(item) for item in self.quantiles().items()], sum(recent), len(recent)]
+
+
+class LatencyMetrics:
+    """
+    Named families of latency histograms, each split by one label, e.g.
+    `recognition_stage_seconds` by `stage`.
+    """
+
+    def __init__(self):
+        self._families = {}  # name -> (help, label, {label value: Histogram})
+        self._lock = threading.Lock()
+
+    def histogram(self, name, label, value, help_text=''):
+        with self._lock:
+            _, _, histograms = self._families.setdefault(name, (help_text, label, {}))
+            if value not in histograms:
+                histograms[value] = Histogram()
+            return histograms[value]
+
+    def observe(self, name, label, value, seconds, help_text=''):
+        self.histogram(name, label, value, help_text).observe(seconds)
+
+    def snapshot(self):
+        """Every histogram's state, as JSON-able {name: [help, label, {label value: Histogram.state()}]}."""
+        with self._lock:
+            families = {name: (help_text, label, dict(histograms))
+                        for name, (help_text, label, histograms) in self._families.items()}
+        return {
+            name: [help_text, label, {value: histogram.state() for value, histogram in histograms.items()}]
+            for name, (help_text, label, histograms) in families.items()
+        }
+
+    def render(self, lanes=None):
+        """
+        All histograms in the Prometheus text exposition format.
+        :param lanes: {lane id: snapshot()} of the lane worker processes,
+            rendered next to this process's histograms with a `lane` label.
+        """
+        families = {}  # name -> (help, label, [(extra labels, label value, state)])
+        sources = [('', self.snapshot())] + [(f'lane="{lane_id}",', snapshot) for lane_id, snapshot in sorted((lanes or {}).items())]
+        for labels, snapshot in sources:
+            for name, (help_text, label, histograms) in snapshot.items():
+                _, _, rows = families.setdefault(name, (help_text, label, []))
+                rows += [(labels, value, state) for value, state in sorted(histograms.items())]
+
+        lines = []
+        for name, (help_text, label, rows) in sorted(families.items()):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, value, (buckets, counts, total, count, _, _, _) in rows:
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + [float('inf')], counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{labels}{label}="{value}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}{label}="{value}"}} {total}')
+                lines.append(f'{name}_count{{{labels}{label}="{value}"}} {count}')
+
+            # p50/p95/p99 over the recent window, as a companion summary
+            lines.append(f'# HELP {name}_recent {help_text} (last {Histogram.window} observations)')
+            lines.append(f'# TYPE {name}_recent summary')
+            for labels, value, (_, _, _, _, quantiles, recent_sum, recent_count) in rows:
+                for q, seconds in quantiles:
+                    if seconds is not None:
+                        lines.append(f'{name}_recent{{{labels}{label}="{value}",quantile="{q}"}} {seconds}')
+                lines.append(f'{name}_recent_sum{{{labels}{label}="{value}"}} {recent_sum}')
+                lines.append(f'{name}_recent_count{{{labels}{label}="{value}"}} {recent_count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = LatencyMetrics()
+
+STAGE_SECONDS = 'recognition_stage_seconds'
+VEHICLE_SECONDS = 'recognition_vehicle_seconds'
+
+
+def observe_stage(stage, seconds):
+    metrics.observe(STAGE_SECONDS, 'stage', stage, seconds, 'Time spent in each recognition stage.')
+
+
+def observe_vehicle(span, seconds):
+    metrics.observe(VEHICLE_SECONDS, 'span', span, seconds, 'Per-vehicle latency from first capture.')
+
+
+@contextmanager
+def timed(stage):
+    """Time the body of a with block as one observation of `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+_trace_lock = threading.Lock()
+
+
+def write_trace(trace):
+    """Append one per-vehicle trace as a JSON line to settings.RECOGNITION_TRACE_FILE, if set."""
+    path = settings.RECOGNITION_TRACE_FILE
+    if not path:
+        return
+    line = json.dumps(trace, default=str) + '\n'
+    with _trace_lock:
+        with open(path, 'a') as trace_file:
+            trace_file.write(line)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0002_alter_platerecognition_is_successful'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='platerecognition',
+            name='score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='motorcontrollog',
+            name='triggered_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='platerecognition',
+            name='detected_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recognition', '0003_audit_event_times'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lane',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('source', models.CharField(help_text='Camera stream URL or video file path.', max_length=500)),
+                ('enabled', models.BooleanField(default=True)),
+                ('hardware', models.CharField(blank=True, choices=[('', 'Project default (RECOGNITION_HARDWARE)'), ('gpio', 'Raspberry Pi GPIO'), ('simulated', 'Simulated')], max_length=20)),
+                ('servo_pin', models.PositiveSmallIntegerField(blank=True, help_text='Gate servo BCM pin, default GATE_SERVO_PIN.', null=True)),
+                ('ir_sensor_pin', models.PositiveSmallIntegerField(blank=True, help_text='IR sensor BCM pin, default IR_SENSOR_PIN.', null=True)),
+                ('roi', models.JSONField(blank=True, help_text='Region of interest as [[x, y], ...] in fractions of the frame, empty for the whole frame.', null=True)),
+                ('plate_countries', models.CharField(blank=True, help_text='Comma separated countries whose plate formats are read, e.g. RW,UG; empty for all.', max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='motorcontrollog',
+            name='lane',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='recognition.lane'),
+        ),
+        migrations.AddField(
+            model_name='platerecognition',
+            name='lane',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='recognition.lane'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+import util
+from recognition.detectors import load_detector
+
+# Seconds spent on each model loading and warm-up step, by step name
+startup_timings = {}
+
+_detector = None
+_lock = threading.Lock()
+
+
+def _timed(step, func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    startup_timings[step] = time.perf_counter() - started
+    print(f"{step.replace('_', ' ').capitalize()} took {startup_timings[step]:.2f}s")
+    return result
+
+
+def get_detector():
+    """Return the shared license plate detector, loading it on first use."""
+    global _detector
+    if _detector is None:
+        with _lock:
+            if _detector is None:
+                _detector = _timed('detector_load', load_detector)
+    return _detector
+
+
+def get_reader():
+    """Return the shared EasyOCR reader, loading it on first use."""
+    if 'ocr_load' not in startup_timings:
+        with _lock:
+            if 'ocr_load' not in startup_timings:
+                return _timed('ocr_load', util.get_reader)
+    return util.get_reader()
+
+
+def warm_up():
+    """
+    Load both models and run one dummy inference through each, so the first
+    vehicle does not pay for lazy loading or first-call initialization.
+    """
+    started = time.perf_counter()
+    detector = get_detector()
+    get_reader()
+
+    _timed('detector_warmup', detector.detect, np.zeros((480, 640, 3), dtype=np.uint8))
+    _timed('ocr_warmup', util.read_license_plates, [np.zeros((40, 160), dtype=np.uint8)])
+    startup_timings['warmup_total'] = time.perf_counter() - started
+
+
+def _warm_up_safely():
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Model warm-up failed: {e}")
+
+
+def warm_up_in_background():
+    """Start warm_up() in a daemon thread if settings.RECOGNITION_WARMUP is set."""
+    if settings.RECOGNITION_WARMUP:
+        threading.Thread(target=_warm_up_safely, name='model-warmup', daemon=True).start()
@@ -1,10 +1,70 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from border.models import Vehicle
+from plate_formats import DEFAULT_FORMATS, PlateGrammar, default_grammar
+from recognition.roi import RegionOfInterest
+
+
+class Lane(models.Model):
+    """
+    One lane of the border post: a camera, the gate it controls and the
+    plates it reads. The run_lanes command runs one recognition worker
+    process per enabled lane.
+    """
+    HARDWARE_CHOICES = [
+        ('', 'Project default (RECOGNITION_HARDWARE)'),
+        ('gpio', 'Raspberry Pi GPIO'),
+        ('simulated', 'Simulated'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    source = models.CharField(max_length=500, help_text="Camera stream URL or video file path.")
+    enabled = models.BooleanField(default=True)
+    hardware = models.CharField(max_length=20, choices=HARDWARE_CHOICES, blank=True)
+    servo_pin = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Gate servo BCM pin, default GATE_SERVO_PIN.")
+    ir_sensor_pin = models.PositiveSmallIntegerField(null=True, blank=True, help_text="IR sensor BCM pin, default IR_SENSOR_PIN.")
+    roi = models.JSONField(
+        null=True, blank=True,
+        help_text="Region of interest as [[x, y], ...] in fractions of the frame, empty for the whole frame.",
+    )
+    plate_countries = models.CharField(
+        max_length=100, blank=True,
+        help_text="Comma separated countries whose plate formats are read, e.g. RW,UG; empty for all.",
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if self.roi:
+            try:
+                RegionOfInterest(self.roi)
+            except (TypeError, ValueError) as e:
+                raise ValidationError({'roi': str(e)})
+        unknown = set(self.countries()) - {plate_format.country for plate_format in DEFAULT_FORMATS}
+        if unknown:
+            raise ValidationError({'plate_countries': f"No plate formats for {', '.join(sorted(unknown))}."})
+
+    def countries(self):
+        return [country.strip().upper() for country in self.plate_countries.split(',') if country.strip()]
+
+    def grammar(self):
+        """Plate grammar of the lane's countries."""
+        countries = self.countries()
+        if not countries:
+            return default_grammar
+        return PlateGrammar([plate_format for plate_format in DEFAULT_FORMATS if plate_format.country in countries])
+
 
 class PlateRecognition(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True, blank=True)
+    lane = models.ForeignKey(Lane, on_delete=models.SET_NULL, null=True, blank=True)
     plate_number = models.CharField(max_length=20)
-    detected_at = models.DateTimeField(auto_now_add=True)
+    score = models.FloatField(null=True, blank=True)
+    # Set from the event time, rows are written later in batches by the audit writer
+    detected_at = models.DateTimeField(default=timezone.now)
     is_successful = models.BooleanField(default=False, null=True)
     
     def __str__(self):
@@ -12,8 +72,9 @@ class PlateRecognition(models.Model):
 
 class MotorControlLog(models.Model):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, null=True, blank=True)
+    lane = models.ForeignKey(Lane, on_delete=models.SET_NULL, null=True, blank=True)
     action = models.CharField(max_length=50)  # "Open Gate" or "Close Gate"
-    triggered_at = models.DateTimeField(auto_now_add=True)
+    triggered_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.action} for Vehicle {self.vehicle} at {self.triggered_at}"
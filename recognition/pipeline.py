@@ -0,0 +1,408 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+from django.db import connection
+from django.utils import timezone
+
+from recognition.audit import audit_writer
+from recognition.detectors import clip_boxes, preprocess_plate_crop
+from recognition.metrics import observe_stage, observe_vehicle, timed, write_trace
+from recognition.plate_index import plate_index
+from recognition.roi import RegionOfInterest
+from recognition.scheduler import AdaptiveScheduler
+from recognition.tracker import PlateTracker
+
+from util import read_license_plate_candidates
+
+# Multipart boundary around every JPEG of the video stream
+FRAME_HEADER = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+FRAME_TRAILER = b'\r\n\r\n'
+
+
+def put_latest(q, item, on_drop=None):
+    """
+    Put an item on a bounded queue, dropping the oldest entries if it is full.
+    :param q: Bounded queue.Queue shared between two stages.
+    :param item: Item to enqueue.
+    :param on_drop: Called with every item dropped to make room.
+    """
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                dropped = q.get_nowait()
+            except queue.Empty:
+                continue
+            if on_drop is not None:
+                on_drop(dropped)
+
+
+class FramePool:
+    """
+    Reusable frame buffers, shared between pipeline stages.
+
+    acquire() hands out a buffer of the requested shape. A buffer has one
+    owner at a time: handing it to the next stage hands it over, and the
+    stage that is done with it, or the queue that drops it, release()s it
+    back to the pool for a later frame instead of it being garbage
+    collected. Nothing may read a buffer after releasing it.
+    """
+
+    def __init__(self, dtype=np.uint8):
+        self.dtype = dtype
+        self.allocated = 0
+        self._free = {}  # shape -> free buffers
+        self._lock = threading.Lock()
+
+    def acquire(self, shape):
+        with self._lock:
+            free = self._free.get(shape)
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=self.dtype)
+
+    def release(self, buffer):
+        with self._lock:
+            self._free.setdefault(buffer.shape, []).append(buffer)
+
+
+class RecognitionPipeline:
+    """
+    Multi-stage recognition pipeline for one video source.
+
+    capture -> detect -> OCR -> decide run in their own worker threads and
+    hand work to each other through small bounded queues. Captured frames also
+    go to the encode stage, which draws the most recent detections and
+    JPEG-encodes them, so the stream keeps up with the camera while recognition
+    runs as fast as the CPU allows. When a stage falls behind, the oldest
+    queued item is dropped instead of blocking the stage before it. An
+    AdaptiveScheduler picks which frames are detected and streamed from
+    motion and the IR sensor.
+
+    Detection runs inside the lane's region of interest, cut out of the full
+    resolution frame, and plates are cropped for OCR at that resolution too;
+    only the preview is downscaled to `frame_size`.
+
+    Detected boxes are tracked across frames, and each track is only OCR'd
+    until its votes settle on a plate, which is then decided once. Every
+    stage reports its timings to recognition.metrics, and every decided
+    vehicle leaves a trace from first capture to gate.
+    """
+
+    frame_size = (640, 480)  # Size of the streamed preview
+    annotation_ttl = 0.5  # Seconds a detection stays drawn on the stream
+    ocr_batch_frames = 4  # Frames whose crops may share one OCR batch
+    playback_fps = None  # Replay recorded sources at this frame rate, None reads them as fast as possible
+
+    def __init__(self, source, detector, is_triggered, open_gate, queue_size=2, roi=None, lane_id=None,
+                 grammar=None, playback_fps=None):
+        self.source = source
+        if playback_fps is not None:
+            self.playback_fps = playback_fps
+        self.lane_id = lane_id
+        self.grammar = grammar  # Plate formats read by OCR, None for util's default ones
+        self.detector = detector
+        self.is_triggered = is_triggered
+        self.open_gate = open_gate
+        self.roi = roi if isinstance(roi, RegionOfInterest) else RegionOfInterest(roi)
+
+        self.detect_queue = queue.Queue(maxsize=queue_size)
+        self.ocr_queue = queue.Queue(maxsize=max(queue_size, self.ocr_batch_frames))
+        self.decide_queue = queue.Queue(maxsize=queue_size * 8)
+        self.encode_queue = queue.Queue(maxsize=queue_size)
+        self.output_queue = queue.Queue(maxsize=queue_size)
+
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._annotations = []
+        self._annotations_at = 0.0
+        self._annotations_lock = threading.Lock()
+
+        self.tracker = PlateTracker()
+        self.scheduler = AdaptiveScheduler(is_triggered)
+        self.frame_pool = FramePool()
+
+    def start(self):
+        """Open the video source and start one worker thread per stage."""
+        # Load the registered plates before the first vehicle shows up, and keep them current
+        plate_index.start()
+
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            print(f"Error opening video file: {self.source}")
+            return False
+
+        stages = [
+            ('capture', lambda: self._capture(cap)),
+            ('detect', self._detect),
+            ('ocr', self._ocr),
+            ('decide', self._decide),
+            ('encode', self._encode),
+        ]
+        for name, target in stages:
+            thread = threading.Thread(target=target, name=f'pipeline-{name}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return True
+
+    def stop(self):
+        """Ask every stage to finish; stages exit at their next queue poll."""
+        self._stop_event.set()
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def frames(self, timeout=1.0):
+        """
+        Yield encoded frames until the pipeline stops, each as the
+        (FRAME_HEADER, memoryview of the JPEG, FRAME_TRAILER) parts of
+        one multipart chunk.
+        :param timeout: Seconds between checks of the stop flag while idle.
+        """
+        while not self.stopped:
+            try:
+                yield self.output_queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+    def _get(self, q):
+        """Block on a stage queue, returning None once the pipeline stops."""
+        while not self.stopped:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _capture(self, cap):
+        frame_interval = 1.0 / self.playback_fps if self.playback_fps else 0.0
+        next_frame_at = time.monotonic()
+        frame = None
+        pool = self.frame_pool
+        try:
+            while not self.stopped:
+                if frame_interval:
+                    # Deliver the frames of a recording as a live camera would
+                    next_frame_at += frame_interval
+                    time.sleep(max(next_frame_at - time.monotonic(), 0.0))
+                with timed('frame_read'):
+                    # Decode into the previous frame's buffer, only resize reads it
+                    ret, frame = cap.read(frame)
+                if not ret:
+                    print("End of video file or error reading frame.")
+                    break
+                captured_at = time.monotonic()
+
+                # Resize frame for the motion check and the preview
+                width, height = self.frame_size
+                resized_frame = pool.acquire((height, width, 3))
+                with timed('resize'):
+                    cv2.resize(frame, self.frame_size, dst=resized_frame)
+
+                detect, preview = self.scheduler.observe(resized_frame, captured_at)
+                if preview:
+                    put_latest(self.encode_queue, resized_frame, pool.release)
+                else:
+                    pool.release(resized_frame)
+                if detect:
+                    # Cut the region of interest out at full resolution
+                    x1, y1, x2, y2 = self.roi.rect(frame.shape)
+                    roi_frame = pool.acquire((y2 - y1, x2 - x1, 3))
+                    np.copyto(roi_frame, frame[y1:y2, x1:x2])
+                    put_latest(
+                        self.detect_queue, (roi_frame, (x1, y1), frame.shape, captured_at),
+                        lambda item: pool.release(item[0]),
+                    )
+        finally:
+            # Release the video capture object and clean up resources
+            cap.release()
+            self.stop()
+
+    def _detect(self):
+        while True:
+            item = self._get(self.detect_queue)
+            if item is None:
+                return
+            roi_frame, (offset_x, offset_y), frame_shape, captured_at = item
+
+            # DETECT LICENSE PLATES
+            with timed('detect'):
+                detections = self.detector.detect(roi_frame)
+
+            # Map the boxes back to full frame coordinates, keeping those inside the lane
+            roi_boxes, boxes = [], []
+            for (x1, y1, x2, y2), _ in clip_boxes(detections, roi_frame.shape):
+                box = (x1 + offset_x, y1 + offset_y, x2 + offset_x, y2 + offset_y)
+                if self.roi.contains(box, frame_shape):
+                    roi_boxes.append((x1, y1, x2, y2))
+                    boxes.append(box)
+
+            self.scheduler.report(len(boxes))
+            tracks = self.tracker.update(boxes, captured_at)
+
+            # Plates already read with enough confidence are not OCR'd again
+            with timed('threshold'):
+                plates = [
+                    (track, preprocess_plate_crop(roi_frame, roi_box))
+                    for track, roi_box in zip(tracks, roi_boxes) if track.needs_ocr
+                ]
+            # The crops are copies, the frame can be reused
+            self.frame_pool.release(roi_frame)
+
+            if plates:
+                put_latest(self.ocr_queue, plates)
+
+            # Draw the boxes at preview scale
+            scale_x = self.frame_size[0] / frame_shape[1]
+            scale_y = self.frame_size[1] / frame_shape[0]
+            annotations = []
+            for track in tracks:
+                x1, y1, x2, y2 = track.box
+                box = (round(x1 * scale_x), round(y1 * scale_y), round(x2 * scale_x), round(y2 * scale_y))
+                annotations.append((box, track.label))
+            self._set_annotations(annotations)
+
+    def _ocr(self):
+        while True:
+            plates = self._get(self.ocr_queue)
+            if plates is None:
+                return
+
+            # Batch the crops of every frame already waiting, not just this one
+            jobs = [plates]
+            while len(jobs) < self.ocr_batch_frames:
+                try:
+                    jobs.append(self.ocr_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            crops = [crop for job in jobs for _, crop in job]
+            tracks = [track for job in jobs for track, _ in job]
+            # The text detector only gets one go per track the recognizer keeps missing
+            text_detection = [track.wants_text_detection for track in tracks]
+            started = time.perf_counter()
+            readings = read_license_plate_candidates(crops, text_detection=text_detection, grammar=self.grammar)
+            elapsed = time.perf_counter() - started
+            observe_stage('ocr', elapsed)
+
+            for track, detected, candidates in zip(tracks, text_detection, readings):
+                print(f'License plate candidates: {candidates}')
+                track.ocr_calls += 1
+                track.ocr_seconds += elapsed / len(crops)
+                if detected:
+                    track.text_detected = True
+                elif not candidates:
+                    track.ocr_misses += 1
+
+                if candidates:
+                    put_latest(self.decide_queue, (track, candidates))
+
+    def _decide(self):
+        try:
+            while True:
+                reading = self._get(self.decide_queue)
+                if reading is None:
+                    return
+
+                track, candidates = reading
+                with timed('vote'):
+                    probable_plate = track.add_reading(candidates)
+                if probable_plate:
+                    print(f'probable plate: {probable_plate} (track {track.id}, posterior {track.posterior:.2f})')
+                    self._handle_plate(track)
+        finally:
+            connection.close()
+
+    def _handle_plate(self, track):
+        decided_at = time.monotonic()
+
+        # Check if the vehicle is registered, and approved for travel by its border check
+        registration = plate_index.lookup(track.plate)
+        lookup_seconds = time.monotonic() - decided_at
+        observe_stage('lookup', lookup_seconds)
+        vehicle_id, approved = registration or (None, False)
+        audit_writer.record_recognition(
+            track.plate, track.score, vehicle_id, is_successful=registration is not None, lane_id=self.lane_id,
+        )
+
+        observe_vehicle('capture_to_decision', decided_at - track.first_seen)
+        trace = {
+            'decided_at': timezone.now().isoformat(),
+            'lane': self.lane_id,
+            'track': track.id,
+            'plate': track.plate,
+            'score': track.score,
+            'vehicle_id': vehicle_id,
+            'approved': approved,
+            'readings': len(track.readings),
+            'posterior': track.posterior,
+            'ocr_calls': track.ocr_calls,
+            'ocr_seconds': track.ocr_seconds,
+            'capture_to_decision_seconds': decided_at - track.first_seen,
+            'lookup_seconds': lookup_seconds,
+        }
+
+        if registration:
+            if approved:
+                # Open the gate automatically if approved, the gate controller logs
+                # the motor control actions once the servo has moved
+                def gate_opened(opened_at):
+                    trace['gate_seconds'] = opened_at - decided_at
+                    trace['capture_to_gate_seconds'] = opened_at - track.first_seen
+                    observe_stage('gate', trace['gate_seconds'])
+                    observe_vehicle('capture_to_gate', trace['capture_to_gate_seconds'])
+                    write_trace(trace)
+
+                self.open_gate(vehicle_id, on_opened=gate_opened)
+                print('Gate opened: Vehicle approved for travel')
+                return
+            else:
+                # Redirect to vehicle creation page if not approved
+                print("Vehicle not approved for travel: Redirecting to vehicle creation page")
+        else:
+            # Vehicle not found in the database, redirect to vehicle creation page
+            print("Vehicle not found: Redirecting to vehicle creation page")
+
+        write_trace(trace)
+
+    def _set_annotations(self, annotations):
+        with self._annotations_lock:
+            self._annotations = annotations
+            self._annotations_at = time.monotonic()
+
+    def _current_annotations(self):
+        with self._annotations_lock:
+            if time.monotonic() - self._annotations_at > self.annotation_ttl:
+                return []
+            return self._annotations
+
+    def _encode(self):
+        while True:
+            frame = self._get(self.encode_queue)
+            if frame is None:
+                return
+
+            # Only the encoder holds preview frames, draw on them directly
+            for (x1, y1, x2, y2), text in self._current_annotations():
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                if text:
+                    cv2.putText(
+                        frame, text, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.9, (36, 255, 12), 2
+                    )
+
+            # Encode the frame to JPEG, it already is BGR
+            ok, jpeg = cv2.imencode('.jpg', frame)
+            self.frame_pool.release(frame)
+            if not ok:
+                continue
+
+            # The JPEG buffer is passed on as is, RecognitionEngine joins it into one chunk for all its clients
+            put_latest(self.output_queue, (FRAME_HEADER, memoryview(jpeg), FRAME_TRAILER))
@@ -0,0 +1,249 @@
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from border.models import LicensePlate, BorderCheck, RegistryVersion
+from plate_formats import PlateGrammar, plate_key
+from recognition.fuzzy_match import PlateMatcher
+
+
+class PlateIndex:
+    """
+    In-process plate -> (vehicle_id, approved) index for gate decisions.
+
+    The index is loaded once from the registered plates and then kept
+    current by the signal handlers in recognition.signals, so a lookup on
+    the hot path is a dictionary access with no database round trip.
+    Changes made in other processes, like lane workers, other web server
+    processes or management commands, send no signal here: a background
+    thread started by start() reads the registry version (see
+    border.models.RegistryVersion) every settings.PLATE_INDEX_CHECK_SECONDS,
+    and once a version this process did not apply itself has come in and
+    stopped moving (a bulk import bumps it once per chunk), reloads the
+    index and swaps it in. Lookups keep answering from the index they have
+    meanwhile, and never touch the database.
+
+    A reading matches the registered plate with the same cleaned number, or
+    else the only one with the same plate key (see plate_formats.plate_key),
+    which undoes letter/digit confusions; a vehicle's approval comes from
+    its first border check. Readings that match neither fall back to the
+    registered number nearest to the cleaned reading within
+    settings.PLATE_MATCH_MAX_DISTANCE (see fuzzy_match).
+    """
+
+    max_settle_checks = 10  # Reload after this many checks even if the version keeps moving
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None  # RegistryVersion the index is current with
+        self._applied = set()  # Later versions whose change the signal handlers applied
+        self._plates = {}  # license plate pk -> (cleaned number, plate key, vehicle id)
+        self._vehicles = {}  # cleaned number -> set of vehicle ids
+        self._keys = {}  # plate key -> set of cleaned numbers
+        self._approved = {}  # vehicle id -> is_approved of its first border check
+        self._matcher = PlateMatcher()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def load(self):
+        """(Re)build the whole index from the database and swap it in."""
+        # Read before the rows, so a change made while loading triggers another load
+        version = RegistryVersion.current()
+        plates = {
+            pk: (PlateGrammar.clean(number), key, vehicle_id)
+            for pk, number, key, vehicle_id in (
+                LicensePlate.objects.filter(plate_key__isnull=False)
+                .values_list('pk', 'license_plate_number', 'plate_key', 'vehicle_id')
+            )
+        }
+        approved = {}
+        for vehicle_id, is_approved in BorderCheck.objects.order_by('vehicle_id', 'pk').values_list('vehicle_id', 'is_approved'):
+            approved.setdefault(vehicle_id, is_approved)
+
+        vehicles, keys = {}, {}
+        for number, key, vehicle_id in plates.values():
+            vehicles.setdefault(number, set()).add(vehicle_id)
+            keys.setdefault(key, set()).add(number)
+
+        with self._lock:
+            matcher, loaded = self._matcher, set(self._vehicles) if self._loaded else None
+        if loaded is None:
+            matcher = PlateMatcher(vehicles)
+        else:
+            # Building a matcher takes seconds for a large registry, a reload
+            # usually only changes a few of its numbers
+            for number in loaded - vehicles.keys():
+                matcher.remove(number)
+            for number in vehicles.keys() - loaded:
+                matcher.add(number)
+
+        with self._lock:
+            self._plates = plates
+            self._vehicles = vehicles
+            self._keys = keys
+            self._approved = approved
+            self._matcher = matcher
+            self._version = version
+            # A change applied before the swap is lost with the old dicts,
+            # forget it so the next refresh() reloads it if it is not in these
+            self._applied = set()
+            self._loaded = True
+
+    def start(self):
+        """Load the index if needed, and keep it current from a background thread."""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            if not self._loaded:
+                self.load()
+            self._thread = threading.Thread(target=self._run, name='plate-index', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        interval = settings.PLATE_INDEX_CHECK_SECONDS
+        try:
+            while not self._stop_event.wait(interval):
+                close_old_connections()
+                try:
+                    version = RegistryVersion.current()
+                    if self._is_current(version):
+                        continue
+                    # Wait for a bulk import to finish instead of reloading after each of its chunks
+                    for _ in range(self.max_settle_checks):
+                        if self._stop_event.wait(interval):
+                            return
+                        latest = RegistryVersion.current()
+                        if latest == version:
+                            break
+                        version = latest
+                    print(f"Registry changed elsewhere (version {version}), reloading the plate index")
+                    self.load()
+                except Exception as e:
+                    print(f"Error refreshing the plate index: {e}")
+        finally:
+            connection.close()
+
+    def refresh(self):
+        """
+        Reload the index now if the registry changed in a way it has not seen.
+        :return: True if it was reloaded.
+        """
+        if self._is_current(RegistryVersion.current()):
+            return False
+        self.load()
+        return True
+
+    def _is_current(self, version):
+        """Whether the index has every change up to `version`, counting the ones its signals applied."""
+        with self._lock:
+            if self._version is None:
+                return False
+            while self._version < version and self._version + 1 in self._applied:
+                self._version += 1
+                self._applied.discard(self._version)
+            return self._version >= version
+
+    def _applied_at(self, version):
+        # Caller holds self._lock, and has just made the change that bumped the registry to version
+        if version is not None and self._version is not None and version > self._version:
+            self._applied.add(version)
+
+    def lookup(self, plate_number):
+        """
+        Find the registered vehicle for a plate.
+        :param plate_number: Plate text as read by the recognizer.
+        :return: (vehicle_id, approved) or None if the plate is not registered.
+        """
+        if not self._loaded:
+            print(f"Plate index not loaded, plate {plate_number} not looked up")
+            return None
+        number = PlateGrammar.clean(plate_number)
+        if not number:
+            return None
+        with self._lock:
+            vehicle_ids = self._vehicles.get(number)
+            if not vehicle_ids:
+                numbers = self._keys.get(plate_key(number), ())
+                if len(numbers) == 1:
+                    vehicle_ids = self._vehicles.get(next(iter(numbers)))
+                elif numbers:
+                    print(f"Plate {plate_number} reads as any of {', '.join(sorted(numbers))}, not matched")
+                    return None
+            matcher = self._matcher
+
+        if not vehicle_ids:
+            registered, distance = matcher.match(number, settings.PLATE_MATCH_MAX_DISTANCE)
+            if registered is None:
+                return None
+            print(f"Plate {plate_number} matched registered plate {registered} (distance {distance:.1f})")
+            with self._lock:
+                vehicle_ids = self._vehicles.get(registered)
+            if not vehicle_ids:
+                return None
+
+        vehicle_id = min(vehicle_ids)
+        return vehicle_id, self._approved.get(vehicle_id, False)
+
+    # The updates below are made by the signal handlers of this process,
+    # each with the registry version its change bumped to (see
+    # border.signals), so that change does not make the index reload.
+
+    def update_plate(self, pk, plate_number, key, vehicle_id, version=None):
+        number = PlateGrammar.clean(plate_number)
+        with self._lock:
+            self._remove_plate(pk)
+            if key is not None:
+                self._plates[pk] = (number, key, vehicle_id)
+                self._vehicles.setdefault(number, set()).add(vehicle_id)
+                self._keys.setdefault(key, set()).add(number)
+                self._matcher.add(number)
+            self._applied_at(version)
+
+    def remove_plate(self, pk, version=None):
+        with self._lock:
+            self._remove_plate(pk)
+            self._applied_at(version)
+
+    def _remove_plate(self, pk):
+        old = self._plates.pop(pk, None)
+        if old is None:
+            return
+        number, key, vehicle_id = old
+        vehicle_ids = self._vehicles.get(number, set())
+        vehicle_ids.discard(vehicle_id)
+        if not vehicle_ids:
+            self._vehicles.pop(number, None)
+            numbers = self._keys.get(key, set())
+            numbers.discard(number)
+            if not numbers:
+                self._keys.pop(key, None)
+            self._matcher.remove(number)
+
+    def refresh_approval(self, vehicle_id, version=None):
+        """Reload the approval of one vehicle after its border checks changed."""
+        is_approved = (
+            BorderCheck.objects.filter(vehicle_id=vehicle_id)
+            .order_by('pk').values_list('is_approved', flat=True).first()
+        )
+        with self._lock:
+            if is_approved is None:
+                self._approved.pop(vehicle_id, None)
+            else:
+                self._approved[vehicle_id] = is_approved
+            self._applied_at(version)
+
+    def remove_vehicle(self, vehicle_id, version=None):
+        with self._lock:
+            self._approved.pop(vehicle_id, None)
+            for pk in [pk for pk, (_, _, vid) in self._plates.items() if vid == vehicle_id]:
+                self._remove_plate(pk)
+            self._applied_at(version)
+
+
+plate_index = PlateIndex()
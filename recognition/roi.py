@@ -0,0 +1,60 @@
+import cv2
+import numpy as np
+from django.conf import settings
+
+
+class RegionOfInterest:
+    """
+    Lane polygon the plate detector runs in.
+
+    The polygon is given in fractions of the frame width and height, so it
+    holds whatever resolution the camera delivers. Detection runs on the
+    polygon's bounding rectangle, cut out of the full resolution frame, and
+    only plates centred inside the polygon itself are kept.
+    """
+
+    def __init__(self, polygon=None):
+        """
+        :param polygon: (x, y) points in [0, 1], None for the whole frame.
+        """
+        if polygon is None:
+            polygon = [(0, 0), (1, 0), (1, 1), (0, 1)]
+        self.polygon = np.array(polygon, dtype=np.float32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError("A region of interest needs at least 3 points")
+        self._frame_size = None
+        self._rect = None
+        self._points = None
+
+    def _resolve(self, shape):
+        height, width = shape[:2]
+        if self._frame_size != (width, height):
+            points = self.polygon * (width, height)
+            x, y, w, h = cv2.boundingRect(np.round(points).astype(np.int32))
+            x1, y1 = max(x, 0), max(y, 0)
+            x2, y2 = min(x + w, width), min(y + h, height)
+            if x2 <= x1 or y2 <= y1:
+                raise ValueError(f"Region of interest {self.polygon.tolist()} is outside the frame")
+            self._frame_size = (width, height)
+            self._rect = (x1, y1, x2, y2)
+            self._points = points.reshape(-1, 1, 2).astype(np.float32)
+        return self._rect
+
+    def rect(self, shape):
+        """
+        Bounding rectangle of the polygon in a frame of the given shape.
+        :return: (x1, y1, x2, y2) pixel coordinates, clipped to the frame.
+        """
+        return self._resolve(shape)
+
+    def contains(self, box, shape):
+        """True if the centre of a frame coordinate box lies inside the polygon."""
+        self._resolve(shape)
+        x1, y1, x2, y2 = box
+        centre = ((x1 + x2) / 2, (y1 + y2) / 2)
+        return cv2.pointPolygonTest(self._points, centre, False) >= 0
+
+
+def get_roi(source):
+    """Region of interest configured for a camera source in settings.RECOGNITION_ROIS, or the whole frame."""
+    return RegionOfInterest(settings.RECOGNITION_ROIS.get(source))
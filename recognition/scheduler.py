@@ -0,0 +1,118 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class AdaptiveScheduler:
+    """
+    Decide, frame by frame, whether to run detection and whether to stream.
+
+    A cheap downscaled frame difference and the IR sensor tell whether the
+    lane is active. While it is, the detection interval ramps down towards
+    every frame as long as plates keep being found; once the lane has been
+    quiet for `active_hold` seconds the detector only runs an occasional
+    probe and the preview drops to `idle_preview_fps`.
+    """
+
+    motion_size = (160, 120)  # Resolution the motion check runs at
+    motion_threshold = 25  # Grey level change that counts a pixel as moving
+    motion_ratio = 0.01  # Share of moving pixels that counts as motion
+    ir_poll_interval = 0.2  # Seconds between IR sensor reads
+
+    active_hold = 2.0  # Seconds the lane stays active after the last activity
+    active_interval = 0.3  # Detection interval when the lane becomes active
+    min_interval = 0.0  # Fastest detection interval: every frame
+    idle_interval = 10.0  # Detection probe interval while the lane is idle
+    idle_preview_fps = 2.0
+
+    def __init__(self, is_triggered):
+        self.is_triggered = is_triggered
+        self.interval = self.idle_interval
+        self.active = False
+
+        self._lock = threading.Lock()
+        # Motion check buffers, reused for every frame
+        width, height = self.motion_size
+        self._small = np.empty((height, width, 3), dtype=np.uint8)
+        self._grey = np.empty((height, width), dtype=np.uint8)
+        self._previous = np.empty((height, width), dtype=np.uint8)
+        self._difference = np.empty((height, width), dtype=np.uint8)
+        self._has_previous = False
+        self._ir_state = False
+        self._ir_checked_at = float('-inf')
+        self._active_until = float('-inf')
+        self._detected_at = float('-inf')
+        self._previewed_at = float('-inf')
+
+    def _has_motion(self, frame):
+        cv2.resize(frame, self.motion_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._grey)
+        grey, previous = self._grey, self._previous
+        self._grey, self._previous = previous, grey
+        if not self._has_previous:
+            self._has_previous = True
+            return False
+
+        cv2.absdiff(grey, previous, dst=self._difference)
+        cv2.threshold(self._difference, self.motion_threshold, 255, cv2.THRESH_BINARY, dst=self._difference)
+        return cv2.countNonZero(self._difference) > self.motion_ratio * self._difference.size
+
+    def _ir_triggered(self, now):
+        if now - self._ir_checked_at >= self.ir_poll_interval:
+            self._ir_state = self.is_triggered()
+            self._ir_checked_at = now
+        return self._ir_state
+
+    def observe(self, frame, now=None):
+        """
+        Look at a captured frame and schedule it.
+        :param frame: BGR frame from the capture stage.
+        :param now: Capture timestamp, defaults to time.monotonic().
+        :return: (detect, preview) flags for this frame.
+        """
+        now = time.monotonic() if now is None else now
+        motion = self._has_motion(frame)
+        ir_triggered = self._ir_triggered(now)
+
+        with self._lock:
+            if motion or ir_triggered:
+                if not self.active:
+                    self.interval = self.active_interval
+                self.active = True
+                self._active_until = now + self.active_hold
+            elif self.active and now > self._active_until:
+                self.active = False
+                self.interval = self.idle_interval
+
+            detect = now - self._detected_at >= self.interval
+            if detect:
+                self._detected_at = now
+
+            preview = self.active or now - self._previewed_at >= 1.0 / self.idle_preview_fps
+            if preview:
+                self._previewed_at = now
+
+        return detect, preview
+
+    def report(self, plates_found, now=None):
+        """
+        Feed back the result of a detection to ramp the detection rate.
+        :param plates_found: Number of plates the detector found.
+        :param now: Detection timestamp, defaults to time.monotonic().
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if plates_found:
+                # A vehicle is present: keep the lane active and detect more often
+                if not self.active:
+                    self.interval = self.active_interval
+                elif self.interval > 0.05:
+                    self.interval /= 2
+                else:
+                    self.interval = self.min_interval
+                self.active = True
+                self._active_until = max(self._active_until, now + self.active_hold)
+            elif self.active:
+                self.interval = min(self.active_interval, max(self.interval * 2, 0.05))
@@ -0,0 +1,138 @@
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+JPEG_START = b'\xff\xd8'
+JPEG_END = b'\xff\xd9'
+
+
+def slot_name(lane_id):
+    """Shared memory name of a lane's frame slot."""
+    return f'border_control_lane_{lane_id}'
+
+
+def metrics_slot_name(lane_id):
+    """Shared memory name of a lane's MetricsSlot."""
+    return f'border_control_lane_{lane_id}_metrics'
+
+
+class FrameSlot:
+    """
+    Latest JPEG frame of a lane, in shared memory.
+
+    One lane worker process writes every encoded frame into the slot and any
+    number of web server processes read the newest one from it, with no
+    copy through a pipe or socket. The slot starts with a sequence number
+    and the frame length; the writer makes the sequence odd while it
+    copies a frame in and even again when done (a seqlock), so a reader
+    that sees the sequence change under it knows its copy is torn and
+    retries.
+    """
+
+    header_size = 16  # uint64 sequence, uint64 frame length
+    default_capacity = 4 * 1024 * 1024  # Bytes, enough for a high quality 1080p JPEG
+
+    def __init__(self, memory, owner=False):
+        self.memory = memory
+        self.owner = owner
+        self._header = np.ndarray((2,), dtype=np.uint64, buffer=memory.buf)
+        self._data = memory.buf[self.header_size:]
+        self.capacity = len(self._data)
+
+    @classmethod
+    def create(cls, name, capacity=None):
+        """Create the slot, or take over one a crashed supervisor left behind."""
+        size = cls.header_size + (capacity or cls.default_capacity)
+        try:
+            memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            memory = shared_memory.SharedMemory(name)
+        slot = cls(memory, owner=True)
+        slot._header[:] = 0
+        return slot
+
+    @classmethod
+    def attach(cls, name, track=False):
+        """
+        Open an existing slot; raises FileNotFoundError if it does not exist.
+        :param track: Leave the segment registered with this process's
+            resource tracker, which unlinks it once the tracker exits. Only
+            for processes that share the supervisor's tracker, i.e. its
+            lane workers.
+        """
+        if sys.version_info >= (3, 13):
+            return cls(shared_memory.SharedMemory(name, track=track))
+        memory = shared_memory.SharedMemory(name)
+        if not track:
+            # Opening a segment registers it before Python 3.13
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(memory._name, 'shared_memory')
+        return cls(memory)
+
+    @property
+    def sequence(self):
+        return int(self._header[0])
+
+    def write(self, jpeg):
+        """Publish a frame; frames larger than the slot are dropped."""
+        length = len(jpeg)
+        if length > self.capacity:
+            print(f"Frame of {length} bytes does not fit the {self.capacity} byte frame slot, dropped")
+            return
+        sequence = int(self._header[0])
+        self._header[0] = sequence + 1
+        self._data[:length] = jpeg
+        self._header[1] = length
+        self._header[0] = sequence + 2
+
+    def read(self, after=0, retries=3):
+        """
+        The newest frame, if it is newer than `after`.
+        :param after: Sequence of the frame the caller already has.
+        :return: (sequence, JPEG bytes), or (after, None) if there is no
+            newer complete frame.
+        """
+        for _ in range(retries):
+            sequence = int(self._header[0])
+            if sequence == after or sequence == 0:
+                return after, None
+            if sequence % 2:
+                time.sleep(0.001)  # Being written
+                continue
+            length = int(self._header[1])
+            jpeg = bytes(self._data[:length])
+            if int(self._header[0]) == sequence and self._complete(jpeg):
+                return sequence, jpeg
+        return after, None
+
+    @staticmethod
+    def _complete(data):
+        return data.startswith(JPEG_START) and data.endswith(JPEG_END)
+
+    def close(self):
+        self._header = None
+        self._data.release()
+        self.memory.close()
+        if self.owner:
+            try:
+                self.memory.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class MetricsSlot(FrameSlot):
+    """
+    Latest latency metrics of a lane worker process, as the JSON of
+    recognition.metrics.LatencyMetrics.snapshot(), in shared memory. The
+    worker rewrites it every `publish_interval` seconds, and the metrics
+    endpoint of the web server reads every lane's to report it.
+    """
+
+    default_capacity = 256 * 1024
+    publish_interval = 5.0
+
+    @staticmethod
+    def _complete(data):
+        return data.startswith(b'{') and data.endswith(b'}')
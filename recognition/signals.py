@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from border.models import Vehicle, LicensePlate, BorderCheck
+from recognition.plate_index import plate_index
+
+
+# The index is only touched once the change is committed, so a rolled back
+# edit never reaches the gate. Every change comes with the registry version
+# border.signals bumped for it, which keeps the index from reloading for a
+# change it already has.
+
+def _version(instance):
+    return getattr(instance, '_registry_version', None)
+
+
+@receiver(post_save, sender=LicensePlate)
+def license_plate_saved(sender, instance, **kwargs):
+    pk, number, key, vehicle_id = instance.pk, instance.license_plate_number, instance.plate_key, instance.vehicle_id
+    version = _version(instance)
+    transaction.on_commit(lambda: plate_index.update_plate(pk, number, key, vehicle_id, version))
+
+
+@receiver(post_delete, sender=LicensePlate)
+def license_plate_deleted(sender, instance, **kwargs):
+    pk, version = instance.pk, _version(instance)
+    transaction.on_commit(lambda: plate_index.remove_plate(pk, version))
+
+
+@receiver(post_save, sender=BorderCheck)
+@receiver(post_delete, sender=BorderCheck)
+def border_check_changed(sender, instance, **kwargs):
+    vehicle_id, version = instance.vehicle_id, _version(instance)
+    transaction.on_commit(lambda: plate_index.refresh_approval(vehicle_id, version))
+
+
+@receiver(post_delete, sender=Vehicle)
+def vehicle_deleted(sender, instance, **kwargs):
+    vehicle_id, version = instance.pk, _version(instance)
+    transaction.on_commit(lambda: plate_index.remove_vehicle(vehicle_id, version))
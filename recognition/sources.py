@@ -0,0 +1,55 @@
+from pathlib import Path
+
+import cv2
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def expand_sources(paths):
+    """
+    Expand files and directories into a sorted list of image and video files.
+    :param paths: Image files, video files or directories of images.
+    """
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_frames(path, step=1):
+    """
+    Yield (frame_index, frame) pairs from an image or a video file.
+    :param path: Image or video file.
+    :param step: Only yield every `step`-th frame of a video.
+    """
+    path = Path(path)
+    if path.suffix.lower() in IMAGE_EXTENSIONS:
+        frame = cv2.imread(str(path))
+        if frame is None:
+            print(f"Error reading image file: {path}")
+            return
+        yield 0, frame
+        return
+
+    cap = cv2.VideoCapture(str(path))
+    if not cap.isOpened():
+        print(f"Error opening video file: {path}")
+        return
+    try:
+        frame_index = 0
+        while True:
+            # grab() skips decoding the frames that are not needed
+            if frame_index % step:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame_index, frame
+            frame_index += 1
+    finally:
+        cap.release()
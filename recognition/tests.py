@@ -1,3 +1,746 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import math
+import os
+import queue
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+import util
+
+from border.models import Vehicle, LicensePlate, BorderCheck
+from plate_formats import DIGITS, LETTERS, PlateFormat, PlateGrammar, default_grammar
+from recognition import gate, hardware, model_registry
+from recognition.audit import AuditWriter
+from recognition.detectors import average_precision, clip_boxes, letterbox, preprocess_plate_crop
+from recognition.engine import RecognitionEngine, get_engine
+from recognition.fuzzy_match import PlateMatcher, plate_distance
+from recognition.lanes import assign_cores
+from recognition.management.commands.benchmark_recognition import compare
+from recognition.management.commands.recognize_batch import Command as RecognizeBatchCommand
+from recognition.metrics import Histogram, LatencyMetrics
+from recognition.models import PlateRecognition, MotorControlLog
+from recognition.pipeline import FramePool, put_latest
+from recognition.plate_index import PlateIndex, plate_index
+from recognition.roi import RegionOfInterest
+from recognition.scheduler import AdaptiveScheduler
+from recognition.shared_frames import FrameSlot, MetricsSlot
+from recognition.tracker import PlateTrack, PlateTracker, PlateVotes
+
+
+class PutLatestTests(SimpleTestCase):
+    def test_full_queue_drops_the_oldest_item(self):
+        q = queue.Queue(maxsize=2)
+        for item in range(4):
+            put_latest(q, item)
+        self.assertEqual([q.get_nowait(), q.get_nowait()], [2, 3])
+
+
+class FramePoolTests(SimpleTestCase):
+    def test_released_buffers_are_handed_out_again(self):
+        pool = FramePool()
+        first, second = pool.acquire((4, 4, 3)), pool.acquire((4, 4, 3))
+        pool.release(first)
+        self.assertIs(pool.acquire((4, 4, 3)), first)
+        pool.release(second)
+        pool.release(first)
+        for _ in range(10):
+            buffer = pool.acquire((4, 4, 3))
+            pool.release(buffer)
+        self.assertEqual(pool.allocated, 2)
+
+    def test_buffers_are_pooled_by_shape(self):
+        pool = FramePool()
+        small = pool.acquire((2, 2, 3))
+        pool.release(small)
+        self.assertEqual(pool.acquire((4, 4, 3)).shape, (4, 4, 3))
+        self.assertIs(pool.acquire((2, 2, 3)), small)
+
+
+class IdleEngine(RecognitionEngine):
+    """An engine without a pipeline, fed through _publish() by the test."""
+
+    def _run(self):
+        self._stop_event.wait()
+
+
+class RecognitionEngineTests(SimpleTestCase):
+    def test_subscribers_share_each_published_frame(self):
+        engine = IdleEngine('test-source')
+        first, second = engine.subscribe(), engine.subscribe()
+        engine._publish((b'--frame\r\n', memoryview(b'jpeg'), b'\r\n'))
+        chunk = next(first)
+        self.assertEqual(chunk, b'--frame\r\njpeg\r\n')
+        self.assertIs(next(second), chunk)
+        self.assertEqual(engine.subscribers, 2)
+        engine.stop()
+        self.assertEqual(list(first), [])
+
+    def test_one_engine_per_source(self):
+        self.assertIs(get_engine('test-camera', detector=None), get_engine('test-camera'))
+
+
+class BoxRecognizer:
+    """Stands in for the EasyOCR recognizer, reading each box as the text given for its top."""
+
+    def __init__(self, texts, fragments=()):
+        self.texts = texts  # box top -> (text, confidence)
+        self.fragments = list(fragments)  # What the text detector finds in any crop
+        self.calls = 0
+        self.text_detections = 0
+
+    def recognize(self, image, horizontal_list, free_list, batch_size, allowlist):
+        self.calls += 1
+        return [([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], *self.texts[y1]) for x1, x2, y1, y2 in horizontal_list]
+
+    def readtext(self, image, allowlist, paragraph):
+        self.text_detections += 1
+        return self.fragments
+
+
+class ReadLicensePlatesTests(SimpleTestCase):
+    def test_readings_come_back_in_crop_order(self):
+        crops = [np.zeros((20, 100), np.uint8), np.zeros((30, 80), np.uint8), np.zeros((25, 90), np.uint8)]
+        recognizer = BoxRecognizer({0: ('rab 123c', 0.9), 20: ('hello', 0.8), 50: ('RAD456E', 0.7)})
+        with mock.patch.object(util, 'get_reader', return_value=recognizer):
+            results = util.read_license_plates(crops, batch_size=8)
+        self.assertEqual(results, [('RAB123C', 0.9), (None, None), ('RAD456E', 0.7)])
+        self.assertEqual(recognizer.calls, 1)
+
+    def test_two_line_plates_are_read_with_the_text_detector(self):
+        crops = [np.zeros((40, 100), np.uint8), np.zeros((40, 100), np.uint8)]
+        # Bottom line first, as the detector may return them
+        fragments = [([[0, 22], [90, 22], [90, 38], [0, 38]], '123C', 0.8), ([[0, 2], [40, 2], [40, 18], [0, 18]], 'RAB', 0.9)]
+        recognizer = BoxRecognizer({0: ('RAB', 0.9), 40: ('RAB', 0.9)}, fragments)
+        with mock.patch.object(util, 'get_reader', return_value=recognizer):
+            results = util.read_license_plate_candidates(crops, text_detection=[True, False])
+        self.assertEqual(results[0][0][0], 'RAB123C')
+        self.assertAlmostEqual(results[0][0][1], (0.9 * 3 + 0.8 * 4) / 7)
+        self.assertEqual(results[1], [])
+        self.assertEqual(recognizer.text_detections, 1)
+
+    def test_candidates_are_ranked_by_confidence_and_corrections(self):
+        candidates = util._rank_candidates([('RA8123C', 0.9)])
+        self.assertEqual(candidates[0][0], 'RAB123C')
+        self.assertAlmostEqual(candidates[0][1], 0.9 * math.exp(-0.3))
+        self.assertEqual(util._rank_candidates([('HELLO', 0.9)]), [])
+
+    def test_a_lane_reads_only_its_own_formats(self):
+        crops = [np.zeros((20, 100), np.uint8), np.zeros((20, 100), np.uint8)]
+        recognizer = BoxRecognizer({0: ('RAB123C', 0.9), 20: ('T123ABC', 0.9)})
+        grammar = PlateGrammar([f for f in default_grammar.formats if f.country == 'TZ'])
+        with mock.patch.object(util, 'get_reader', return_value=recognizer):
+            results = util.read_license_plate_candidates(crops, text_detection=[False, False], grammar=grammar)
+        self.assertEqual(results[0], [])
+        self.assertEqual(results[1][0][0], 'T123ABC')
+        self.assertIs(util.plate_grammar, default_grammar)
+
+    def test_crops_are_recognized_in_batches(self):
+        crops = [np.zeros((20, 100), np.uint8)] * 3
+        recognizer = BoxRecognizer({0: ('RAB123C', 0.9), 20: ('RAB124C', 0.9)})
+        with mock.patch.object(util, 'get_reader', return_value=recognizer):
+            results = util.read_license_plates(crops, batch_size=2)
+        self.assertEqual(results, [('RAB123C', 0.9), ('RAB124C', 0.9), ('RAB123C', 0.9)])
+        self.assertEqual(recognizer.calls, 2)
+
+
+class PlateTrackerTests(SimpleTestCase):
+    def test_overlapping_boxes_continue_their_track(self):
+        tracker = PlateTracker()
+        first, second = tracker.update([(0, 0, 100, 40), (300, 0, 400, 40)], now=0.0)
+        moved = tracker.update([(305, 2, 405, 42), (10, 0, 110, 40)], now=0.1)
+        self.assertEqual([track.id for track in moved], [second.id, first.id])
+        self.assertEqual(moved[0].box, (305, 2, 405, 42))
+
+    def test_tracks_not_seen_for_a_while_are_dropped(self):
+        tracker = PlateTracker()
+        old, = tracker.update([(0, 0, 100, 40)], now=0.0)
+        new, = tracker.update([(0, 0, 100, 40)], now=tracker.max_age + 1)
+        self.assertNotEqual(new.id, old.id)
+        self.assertEqual(list(tracker.tracks), [new.id])
+
+    def test_text_detection_is_tried_once_after_repeated_misses(self):
+        track, = PlateTracker().update([(0, 0, 100, 40)], now=0.0)
+        wanted = []
+        for _ in range(4):
+            wanted.append(track.wants_text_detection)
+            if track.wants_text_detection:
+                track.text_detected = True
+            else:
+                track.ocr_misses += 1
+        self.assertEqual(wanted, [False, False, True, False])
+
+    def test_track_stops_needing_ocr_once_its_votes_agree(self):
+        track, = PlateTracker().update([(0, 0, 100, 40)], now=0.0)
+        self.assertIsNone(track.add_reading([('RAB123C', 0.9)]))
+        self.assertEqual(track.add_reading([('RAB123C', 0.9)]), 'RAB123C')
+        self.assertFalse(track.needs_ocr)
+        self.assertIsNone(track.add_reading([('RAB123C', 0.9)]))
+
+
+class AdaptiveSchedulerTests(SimpleTestCase):
+    def setUp(self):
+        self.triggered = False
+        self.scheduler = AdaptiveScheduler(lambda: self.triggered)
+        self.frame = np.zeros((480, 640, 3), np.uint8)
+
+    def test_idle_lane_only_probes_occasionally(self):
+        self.assertEqual(self.scheduler.observe(self.frame, now=0.0), (True, True))
+        self.assertEqual(self.scheduler.observe(self.frame, now=1.0), (False, True))
+        self.assertEqual(self.scheduler.observe(self.frame, now=1.1), (False, False))
+        self.assertFalse(self.scheduler.active)
+
+    def test_ir_trigger_activates_the_lane_until_it_goes_quiet(self):
+        self.scheduler.observe(self.frame, now=0.0)
+        self.triggered = True
+        self.assertEqual(self.scheduler.observe(self.frame, now=0.5), (True, True))
+        self.assertEqual(self.scheduler.interval, self.scheduler.active_interval)
+
+        self.triggered = False
+        self.scheduler.observe(self.frame, now=1.0)
+        self.assertTrue(self.scheduler.active)
+        self.scheduler.observe(self.frame, now=0.5 + self.scheduler.active_hold + 0.1)
+        self.assertFalse(self.scheduler.active)
+        self.assertEqual(self.scheduler.interval, self.scheduler.idle_interval)
+
+    def test_motion_activates_the_lane(self):
+        self.scheduler.observe(self.frame, now=0.0)
+        self.assertTrue(self.scheduler.observe(np.full_like(self.frame, 255), now=0.1)[1])
+        self.assertTrue(self.scheduler.active)
+
+    def test_found_plates_ramp_detection_up_to_every_frame(self):
+        self.scheduler.report(1, now=0.0)
+        intervals = [self.scheduler.interval]
+        for _ in range(5):
+            self.scheduler.report(1, now=0.0)
+            intervals.append(self.scheduler.interval)
+        self.assertEqual(intervals[0], self.scheduler.active_interval)
+        self.assertEqual(intervals, sorted(intervals, reverse=True))
+        self.assertEqual(intervals[-1], self.scheduler.min_interval)
+
+
+class DetectorHelperTests(SimpleTestCase):
+    def test_letterbox_keeps_the_aspect_ratio(self):
+        image, ratio, pad_x, pad_y = letterbox(np.zeros((480, 640, 3), np.uint8), (320, 320))
+        self.assertEqual(image.shape, (320, 320, 3))
+        self.assertEqual((ratio, pad_x, pad_y), (0.5, 0, 40))
+
+    def test_boxes_are_clipped_to_the_frame(self):
+        rows = [[-5.2, 10.7, 700.0, 40.0, 0.9, 0], [600, 470, 600, 500, 0.8, 0]]
+        self.assertEqual(clip_boxes(rows, (480, 640, 3)), [((0, 10, 640, 40), 0.9)])
+
+    def test_plate_crops_are_binarized(self):
+        frame = np.zeros((480, 640, 3), np.uint8)
+        frame[10:20, 10:20] = 255
+        crop = preprocess_plate_crop(frame, (0, 0, 40, 30))
+        self.assertEqual(crop.shape, (30, 40))
+        self.assertEqual((crop[15, 15], crop[0, 0]), (0, 255))
+
+    def test_average_precision(self):
+        references = [[[0, 0, 10, 10]], [[0, 0, 10, 10]]]
+        perfect = [[[0, 0, 10, 10, 0.9, 0]], [[1, 1, 10, 10, 0.8, 0]]]
+        self.assertEqual(average_precision(perfect, references), 1.0)
+
+        # The best scored detection is a miss, so precision at full recall is 2/3
+        with_miss = [[[0, 0, 10, 10, 0.9, 0], [50, 50, 60, 60, 0.95, 0]], [[0, 0, 10, 10, 0.8, 0]]]
+        self.assertAlmostEqual(average_precision(with_miss, references), 2 / 3)
+        self.assertEqual(average_precision([[]], [[]]), 1.0)
+
+
+class PlateIndexTests(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(
+            vehicle_model='Corolla', vehicle_color='White', owner_name='Owner',
+            country_of_origin='Rwanda', destination_country='Uganda',
+        )
+        LicensePlate.objects.create(vehicle=self.vehicle, license_plate_number='RXY 789C', issued_at=datetime.date.today())
+        BorderCheck.objects.create(vehicle=self.vehicle, border_name='Gatuna', is_approved=True)
+        self.index = PlateIndex()
+        self.index.load()
+
+    def test_readings_find_their_registered_plate(self):
+        for reading in ('RXY789C', 'rxy-789c', 'RXY7B9C'):
+            self.assertEqual(self.index.lookup(reading), (self.vehicle.pk, True), reading)
+
+    def test_a_different_letter_is_another_plate(self):
+        self.assertIsNone(self.index.lookup('RXY789D'))
+        self.assertIsNone(self.index.lookup('RXY789O'))
+
+    def test_numbers_sharing_a_key_need_an_exact_reading(self):
+        other = Vehicle.objects.create(
+            vehicle_model='Hilux', vehicle_color='Red', owner_name='Other',
+            country_of_origin='Rwanda', destination_country='Kenya',
+        )
+        LicensePlate.objects.create(vehicle=other, license_plate_number='RXY7B9C', issued_at=datetime.date.today())
+        self.index.refresh()
+        self.assertEqual(self.index.lookup('RXY7B9C'), (other.pk, False))
+        self.assertEqual(self.index.lookup('RXY789C'), (self.vehicle.pk, True))
+        self.assertIsNone(self.index.lookup('RXY7890'))
+
+    def test_committed_changes_reach_the_index(self):
+        plate_index.load()
+        other = Vehicle.objects.create(
+            vehicle_model='Hilux', vehicle_color='Red', owner_name='Other',
+            country_of_origin='Rwanda', destination_country='Kenya',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            LicensePlate.objects.create(vehicle=other, license_plate_number='RAD456E', issued_at=datetime.date.today())
+            BorderCheck.objects.create(vehicle=other, border_name='Gatuna', is_approved=True)
+        self.assertEqual(plate_index.lookup('RAD456E'), (other.pk, True))
+        # The index has them already, so they do not make it reload
+        self.assertFalse(plate_index.refresh())
+
+    def test_changes_from_other_processes_are_reloaded(self):
+        # As another process would: the signals only update that process's own index
+        BorderCheck.objects.filter(vehicle=self.vehicle).update(is_approved=False)
+        BorderCheck.objects.create(vehicle=self.vehicle, border_name='Cyanika')
+        self.assertEqual(self.index.lookup('RXY789C'), (self.vehicle.pk, True))
+        self.assertTrue(self.index.refresh())
+        self.assertEqual(self.index.lookup('RXY789C'), (self.vehicle.pk, False))
+        self.vehicle.delete()
+        self.assertTrue(self.index.refresh())
+        self.assertIsNone(self.index.lookup('RXY789C'))
+        self.assertFalse(self.index.refresh())
+
+    def test_unloaded_index_looks_nothing_up(self):
+        self.assertIsNone(PlateIndex().lookup('RXY789C'))
+
+    @override_settings(PLATE_MATCH_MAX_DISTANCE=0.6)
+    def test_misreads_fall_back_to_the_nearest_plate(self):
+        self.assertEqual(self.index.lookup('RXY7B9C'), (self.vehicle.pk, True))
+        self.assertIsNone(self.index.lookup('RXY789O'))
+
+    def test_deleted_vehicles_are_removed(self):
+        plate_index.load()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vehicle.delete()
+        self.assertIsNone(plate_index.lookup('RXY789C'))
+        self.assertFalse(plate_index.refresh())
+
+
+class UnstartedAuditWriter(AuditWriter):
+    """An audit writer whose rows stay queued until the test takes them."""
+
+    def start(self):
+        pass
+
+    def drain(self):
+        rows = []
+        while not self._queue.empty():
+            rows.append(self._queue.get_nowait())
+        return rows
+
+
+class AuditWriterTests(TestCase):
+    def test_rows_are_written_with_one_insert_per_model(self):
+        writer = UnstartedAuditWriter()
+        writer.record_recognition('RAB123C', 0.9)
+        writer.record_gate('Open Gate')
+        writer.record_recognition('RAD456E', 0.8)
+        with self.assertNumQueries(2):
+            writer._flush(writer.drain())
+        self.assertEqual(
+            sorted(PlateRecognition.objects.values_list('plate_number', flat=True)), ['RAB123C', 'RAD456E']
+        )
+        self.assertEqual(MotorControlLog.objects.get().action, 'Open Gate')
+
+    @mock.patch.object(UnstartedAuditWriter, 'max_pending', 3)
+    def test_events_beyond_the_queue_bound_are_dropped(self):
+        writer = UnstartedAuditWriter()
+        for _ in range(5):
+            writer.record_gate('Open Gate')
+        self.assertEqual(writer.dropped, 2)
+        self.assertEqual(len(writer.drain()), 3)
+
+
+class AuditWriterThreadTests(TransactionTestCase):
+    def test_close_writes_every_queued_row(self):
+        writer = AuditWriter()
+        writer.flush_interval = 60.0
+        for number in range(3):
+            writer.record_recognition(f'RAB12{number}C', 0.9)
+        writer.close()
+        self.assertFalse(writer._thread.is_alive())
+        self.assertEqual(PlateRecognition.objects.count(), 3)
+
+
+class PlateMatcherTests(SimpleTestCase):
+    def test_wrong_class_confusions_are_cheap(self):
+        self.assertAlmostEqual(plate_distance('RA8123C', 'RAB123C'), 0.3)
+        self.assertAlmostEqual(plate_distance('RAB12OC', 'RAB120C'), 0.3)
+
+    def test_shapes_outside_the_confusion_maps_are_cheap_too(self):
+        for reading in ('RAB1D3C', 'RAB1Q3C', 'RAB1U3C'):
+            self.assertAlmostEqual(plate_distance(reading, 'RAB103C'), 0.3, reading)
+        self.assertAlmostEqual(plate_distance('RAB1T3C', 'RAB173C'), 0.3)
+        self.assertAlmostEqual(plate_distance('RAB1L3C', 'RAB113C'), 0.3)
+        self.assertEqual(PlateMatcher(['RAB103C']).match('RAB1D3C', 0.6), ('RAB103C', 0.3))
+
+    def test_same_class_substitutions_cost_a_full_edit(self):
+        self.assertEqual(plate_distance('RAB123D', 'RAB123C'), 1.0)
+        self.assertEqual(plate_distance('RAB123O', 'RAB123C'), 1.0)
+        self.assertEqual(plate_distance('RAB128C', 'RAB123C'), 1.0)
+
+    def test_match_within_distance(self):
+        matcher = PlateMatcher(['RAB123C', 'RXY789C'])
+        self.assertEqual(matcher.match('RA8I23C', 0.6), ('RAB123C', 0.6))
+        self.assertEqual(matcher.match('RAB123D', 0.6), (None, None))
+        self.assertEqual(matcher.match('RAB23C', 1.0), ('RAB123C', 1.0))
+
+    def test_equally_near_plates_do_not_match(self):
+        matcher = PlateMatcher(['RAB123C', 'RAB123E'])
+        self.assertEqual(matcher.match('RAB123D', 1.0), (None, None))
+
+    def test_removed_plates_no_longer_match(self):
+        matcher = PlateMatcher(['RAB123C'])
+        matcher.remove('RAB123C')
+        self.assertEqual(matcher.match('RAB123C', 1.0), (None, None))
+        self.assertEqual(len(matcher), 0)
+
+
+class RecognizeBatchTests(SimpleTestCase):
+    def test_videos_are_split_into_segments_and_images_into_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            for index in range(3):
+                cv2.imwrite(str(directory / f'{index}.png'), np.zeros((8, 8, 3), np.uint8))
+            video = directory / 'lane.avi'
+            writer = cv2.VideoWriter(str(video), cv2.VideoWriter_fourcc(*'MJPG'), 10, (32, 32))
+            for _ in range(25):
+                writer.write(np.zeros((32, 32, 3), np.uint8))
+            writer.release()
+
+            tasks = RecognizeBatchCommand()._tasks({
+                'sources': [str(directory), str(video)], 'segment_frames': 10, 'step': 3, 'images_per_task': 2,
+            })
+
+        # Segments are cut at a multiple of the step, so no frame is sampled twice
+        self.assertEqual(
+            [task[1:] for task in tasks[:3]], [(0, 9, 3), (9, 18, 3), (18, 25, 3)],
+        )
+        self.assertEqual([[path.name for path in task[0]] for task in tasks[3:]], [['0.png', '1.png'], ['2.png']])
+
+
+class CountingDetector:
+    """A detector that finds nothing and counts the frames it was given."""
+
+    def __init__(self):
+        self.frames = 0
+
+    def detect(self, frame):
+        self.frames += 1
+        return []
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(model_registry, _detector=None, startup_timings={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_detector_is_loaded_once(self):
+        with mock.patch.object(model_registry, 'load_detector', side_effect=CountingDetector) as load:
+            self.assertIs(model_registry.get_detector(), model_registry.get_detector())
+        self.assertEqual(load.call_count, 1)
+        self.assertIn('detector_load', model_registry.startup_timings)
+
+    def test_warm_up_runs_one_inference_through_each_model(self):
+        detector = CountingDetector()
+        recognizer = BoxRecognizer({0: ('', 0.0)})
+        with mock.patch.object(model_registry, 'load_detector', return_value=detector), \
+                mock.patch.object(util, 'get_reader', return_value=recognizer):
+            model_registry.warm_up()
+        self.assertEqual((detector.frames, recognizer.calls), (1, 1))
+        self.assertEqual(
+            set(model_registry.startup_timings),
+            {'detector_load', 'ocr_load', 'detector_warmup', 'ocr_warmup', 'warmup_total'},
+        )
+
+
+class SimulatedHardwareTests(SimpleTestCase):
+    def test_servo_commands_are_recorded(self):
+        gate = hardware.SimulatedHardware(servo_delay=0)
+        gate.set_angle(80)
+        gate.set_angle(200)
+        gate.set_angle(0)
+        self.assertEqual([angle for _, angle in gate.servo_commands], [80, 0])
+
+    def test_ir_sensor_follows_its_script_and_manual_triggers(self):
+        gate = hardware.SimulatedHardware(ir_script=[(0, 60)])
+        self.assertTrue(gate.is_ir_triggered())
+        gate.started_at -= 60
+        self.assertFalse(gate.is_ir_triggered())
+        gate.trigger_ir()
+        self.assertTrue(gate.is_ir_triggered())
+        gate.clear_ir()
+        self.assertFalse(gate.is_ir_triggered())
+
+    @override_settings(RECOGNITION_HARDWARE='simulated', SIMULATED_IR_SCRIPT=[[1, 2]])
+    def test_hardware_is_chosen_in_the_settings(self):
+        with mock.patch.object(hardware, '_hardware', None):
+            gate = hardware.get_hardware()
+            self.assertIsInstance(gate, hardware.SimulatedHardware)
+            self.assertEqual(gate.ir_script, [(1, 2)])
+            self.assertIs(hardware.get_hardware(), gate)
+
+
+class GateControllerTests(SimpleTestCase):
+    def setUp(self):
+        self.audit = UnstartedAuditWriter()
+        patcher = mock.patch.object(gate, 'audit_writer', self.audit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.hardware = hardware.SimulatedHardware(servo_delay=0.05)
+        self.controller = gate.GateController(self.hardware, hold_time=0.1)
+        self.controller.poll_interval = 0.02
+
+    def wait_until_closed(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            states = [state for state, _ in self.controller.events]
+            if states and states[-1] == gate.CLOSED:
+                return states
+            time.sleep(0.01)
+        self.fail(f"Gate did not close, states: {self.controller.events}")
+
+    def test_gate_opens_and_closes_after_the_hold_time(self):
+        self.controller.request_open(7)
+        self.assertEqual(self.wait_until_closed(), [gate.OPEN, gate.CLOSING, gate.CLOSED])
+        self.assertEqual([angle for _, angle in self.hardware.servo_commands], [180, 80])
+        self.assertEqual(
+            [(row.action, row.vehicle_id) for row in self.audit.drain()],
+            [('Gate Opened', 7), ('Gate Closed', 7)],
+        )
+
+    def test_requests_while_open_join_the_current_cycle(self):
+        self.controller.request_open(7)
+        for _ in range(5):
+            self.controller.request_open(8)
+            time.sleep(0.02)
+        self.wait_until_closed()
+        self.assertEqual([angle for _, angle in self.hardware.servo_commands], [180, 80])
+
+    def test_gate_holds_while_the_vehicle_is_under_it(self):
+        self.hardware.trigger_ir(0.4)
+        self.controller.request_open()
+        self.assertEqual(self.wait_until_closed(), [gate.OPEN, gate.HOLD, gate.CLOSING, gate.CLOSED])
+        opened, closed = (at for at, _ in self.hardware.servo_commands)
+        self.assertGreaterEqual(closed - opened, 0.3)
+
+
+class LatencyMetricsTests(SimpleTestCase):
+    def test_histogram_buckets_and_recent_quantiles(self):
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(seconds)
+        self.assertEqual(histogram.snapshot(), ([2, 1, 1], 2.65, 4))
+        self.assertEqual(histogram.quantiles((0.5, 0.99)), {0.5: 0.5, 0.99: 2.0})
+        self.assertEqual(Histogram().quantiles((0.5,)), {0.5: None})
+
+    def test_render_in_the_prometheus_text_format(self):
+        metrics = LatencyMetrics()
+        metrics.observe('stage_seconds', 'stage', 'ocr', 0.02, 'Time per stage.')
+        metrics.observe('stage_seconds', 'stage', 'ocr', 0.2, 'Time per stage.')
+        lines = metrics.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP stage_seconds Time per stage.', '# TYPE stage_seconds histogram'])
+        self.assertIn('stage_seconds_bucket{stage="ocr",le="0.025"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="ocr",le="+Inf"} 2', lines)
+        self.assertIn('stage_seconds_count{stage="ocr"} 2', lines)
+        self.assertIn('stage_seconds_recent{stage="ocr",quantile="0.99"} 0.2', lines)
+
+    def test_lane_snapshots_render_with_a_lane_label(self):
+        lane = LatencyMetrics()
+        lane.observe('stage_seconds', 'stage', 'ocr', 0.02, 'Time per stage.')
+        # As a lane worker publishes it and the web server reads it back
+        snapshot = json.loads(json.dumps(lane.snapshot()))
+        lines = LatencyMetrics().render(lanes={2: snapshot}).splitlines()
+        self.assertEqual(lines.count('# TYPE stage_seconds histogram'), 1)
+        self.assertIn('stage_seconds_count{lane="2",stage="ocr"} 1', lines)
+        self.assertIn('stage_seconds_recent{lane="2",stage="ocr",quantile="0.5"} 0.02', lines)
+
+
+class FrameSlotTests(SimpleTestCase):
+    def make_slot(self, slot_class=FrameSlot, capacity=1024):
+        slot = slot_class.create(f'border_control_test_{os.getpid()}_{id(self)}', capacity)
+        self.addCleanup(slot.close)
+        return slot
+
+    def test_newest_frame_is_read_once(self):
+        slot = self.make_slot()
+        self.assertEqual(slot.read(), (0, None))
+        slot.write(b'\xff\xd8first\xff\xd9')
+        slot.write(b'\xff\xd8second\xff\xd9')
+        sequence, jpeg = slot.read()
+        self.assertEqual((sequence, jpeg), (4, b'\xff\xd8second\xff\xd9'))
+        self.assertEqual(slot.read(after=sequence), (sequence, None))
+
+    def test_frames_larger_than_the_slot_are_dropped(self):
+        slot = self.make_slot(capacity=16)
+        slot.write(b'\xff\xd8' + bytes(32) + b'\xff\xd9')
+        self.assertEqual(slot.sequence, 0)
+
+    def test_torn_frames_are_not_returned(self):
+        slot = self.make_slot()
+        slot.write(b'\xff\xd8first\xff\xd9')
+        # A writer stopped halfway through copying the next frame in
+        slot._header[0] += 1
+        slot._data[:8] = b'\xff\xd8second'[:8]
+        self.assertEqual(slot.read(after=2), (2, None))
+        # A length from one frame over the bytes of another
+        slot._header[0] += 1
+        slot._header[1] = 6
+        self.assertEqual(slot.read(after=2), (2, None))
+
+    def test_metrics_slot_carries_a_snapshot(self):
+        slot = self.make_slot(MetricsSlot)
+        metrics = LatencyMetrics()
+        metrics.observe('stage_seconds', 'stage', 'ocr', 0.02)
+        slot.write(json.dumps(metrics.snapshot()).encode())
+        _, data = slot.read()
+        self.assertEqual(json.loads(data), json.loads(json.dumps(metrics.snapshot())))
+
+
+class AssignCoresTests(SimpleTestCase):
+    def test_lanes_split_the_cores(self):
+        self.assertEqual(assign_cores([2, 1], cores=[0, 1, 2, 3]), {1: {0, 2}, 2: {1, 3}})
+        self.assertEqual(assign_cores([1, 2, 3], cores=[0, 1, 2, 3]), {1: {0, 3}, 2: {1}, 3: {2}})
+
+    def test_more_lanes_than_cores_share_them(self):
+        self.assertEqual(assign_cores([1, 2, 3], cores=[4, 5]), {1: {4}, 2: {5}, 3: {4}})
+
+
+class BenchmarkRecognitionTests(SimpleTestCase):
+    def test_compare_flags_regressions_in_the_direction_that_matters(self):
+        baseline = {'detector': {'fps': 10.0, 'mean_ms': 100.0, 'map50': 0.9}, 'pipeline': {'accuracy': 1.0}}
+        results = {
+            'detector': {'fps': 8.0, 'mean_ms': 90.0, 'map50': 0.9, 'new_metric': 1.0},
+            'pipeline': {'accuracy': None},
+        }
+        self.assertEqual(compare(results, baseline, 0.15), [
+            ('detector', 'fps', 10.0, 8.0), ('pipeline', 'accuracy', 1.0, None),
+        ])
+        self.assertEqual(compare({'detector': {'mean_ms': 114.0}}, baseline, 0.15), [])
+        self.assertEqual(compare({'detector': {'mean_ms': 116.0}}, baseline, 0.15), [('detector', 'mean_ms', 100.0, 116.0)])
+
+    def test_runs_fail_without_a_baseline(self):
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            options = {'only': ['format_license'], 'repeat': 1, 'baseline': str(baseline), 'stdout': io.StringIO()}
+            with self.assertRaisesMessage(CommandError, 'No baseline'):
+                call_command('benchmark_recognition', **options)
+
+            call_command('benchmark_recognition', save_baseline=True, **options)
+            self.assertIn('format_license', json.loads(baseline.read_text())['results'])
+
+
+class RegionOfInterestTests(SimpleTestCase):
+    def test_rect_follows_the_frame_resolution(self):
+        roi = RegionOfInterest([(0.25, 0.5), (0.75, 0.5), (0.75, 1), (0.25, 1)])
+        self.assertEqual(roi.rect((480, 640, 3)), (160, 240, 481, 480))
+        self.assertEqual(roi.rect((1080, 1920, 3)), (480, 540, 1441, 1080))
+
+    def test_only_boxes_centred_in_the_polygon_are_kept(self):
+        # Triangle over the bottom left half of the frame
+        roi = RegionOfInterest([(0, 0), (1, 1), (0, 1)])
+        self.assertTrue(roi.contains((10, 80, 30, 90), (100, 100)))
+        self.assertFalse(roi.contains((70, 10, 90, 20), (100, 100)))
+
+    def test_default_is_the_whole_frame(self):
+        self.assertEqual(RegionOfInterest().rect((480, 640, 3)), (0, 0, 640, 480))
+
+    def test_invalid_regions_are_rejected(self):
+        with self.assertRaises(ValueError):
+            RegionOfInterest([(0, 0), (1, 1)])
+        with self.assertRaises(ValueError):
+            RegionOfInterest([(1.5, 1.5), (2, 1.5), (2, 2)]).rect((480, 640, 3))
+
+
+class PlateGrammarTests(SimpleTestCase):
+    def test_complies_with_exact_formats_only(self):
+        for plate in ('RAB123C', 'RAB123CD', 'UAB123C', 'KAB123C', 'T123ABC'):
+            self.assertTrue(default_grammar.complies(plate), plate)
+        for text in ('RA8123C', 'RAB123', 'rab123c', 'RAB 123C', 'XAB123C', 'RAB123CDE', ''):
+            self.assertFalse(default_grammar.complies(text), text)
+
+    def test_position_confusions_are_not_compliant(self):
+        # The RW private format reads an O in the last position as a C
+        self.assertFalse(default_grammar.complies('RAB123O'))
+        self.assertEqual(default_grammar.best_match('RAB123O').plate, 'RAB123C')
+
+    def test_best_match_undoes_confusions_by_position(self):
+        match = default_grammar.best_match('RA8I23C')
+        self.assertEqual((match.plate, match.country), ('RAB123C', 'RW'))
+        self.assertAlmostEqual(match.cost, 0.6)
+
+    def test_best_match_drops_extra_characters(self):
+        match = default_grammar.best_match('RW RAB123C')
+        self.assertEqual(match.plate, 'RAB123C')
+        self.assertEqual(match.cost, 2.0)
+
+    def test_best_match_agrees_with_matches(self):
+        for text in ('RAB123C', 'RA8123C', 'RAB1230', 'xRAB123CD', 'T12345A', 'RAB12', 'RRAB123C0'):
+            matches = default_grammar.matches(text)
+            best = default_grammar.best_match(text)
+            self.assertEqual(best, matches[0] if matches else None, text)
+
+    def test_earlier_format_wins_a_tie(self):
+        grammar = PlateGrammar([PlateFormat('AA', 'one', '@@#'), PlateFormat('BB', 'two', '@@#')])
+        self.assertEqual(grammar.best_match('AB1').country, 'AA')
+
+    def test_slots_follow_the_format_or_the_plate_itself(self):
+        self.assertEqual(default_grammar.slots('RAB123C'), ['R', LETTERS, LETTERS, DIGITS, DIGITS, DIGITS, LETTERS])
+        self.assertEqual(default_grammar.slots('AB-1'), [LETTERS, LETTERS, '-', DIGITS])
+        # A '*' position takes both classes, so no letter/digit swap there is a misread
+        grammar = PlateGrammar([PlateFormat('AA', 'any', '@*#')])
+        self.assertEqual(plate_distance('A81', 'AB1', grammar.slots('AB1')), 1.0)
+        self.assertAlmostEqual(plate_distance('A81', 'AB1'), 0.3)
+
+
+class PlateVotesTests(SimpleTestCase):
+    def reads_to_decide(self, candidates, limit=10):
+        track = PlateTrack(1, (0, 0, 10, 10), 0.0)
+        for reads in range(1, limit + 1):
+            if track.add_reading(candidates):
+                return reads, track.plate
+        return None
+
+    def test_one_reading_never_decides(self):
+        track = PlateTrack(1, (0, 0, 10, 10), 0.0)
+        self.assertIsNone(track.add_reading([('RAB123C', 0.99), ('RAB123G', 0.98), ('RAB128C', 0.97)]))
+        self.assertIsNone(track.plate)
+
+    def test_agreeing_readings_decide(self):
+        self.assertEqual(self.reads_to_decide([('RAB123C', 0.9)]), (2, 'RAB123C'))
+
+    def test_drop_variants_do_not_dilute_longer_plates(self):
+        # How util._rank_candidates ranks a clean 8 character read
+        candidates = [('RAB123CD', 0.9), ('RAB123C', 0.9 * 0.368)]
+        self.assertEqual(self.reads_to_decide(candidates), (2, 'RAB123CD'))
+
+    def test_candidates_share_their_reading_confidence(self):
+        votes = PlateVotes()
+        votes.add_reading([('RAB123C', 0.8), ('RAB128C', 0.8)])
+        self.assertAlmostEqual(votes.total, 0.8)
+        self.assertEqual(votes.readings, 1)
+
+    def test_split_readings_stay_undecided(self):
+        track = PlateTrack(1, (0, 0, 10, 10), 0.0)
+        track.max_votes = 100
+        for _ in range(5):
+            self.assertIsNone(track.add_reading([('RAB123C', 0.9), ('RAB128C', 0.9)]))
+
+    def test_max_votes_decides_the_leader(self):
+        track = PlateTrack(1, (0, 0, 10, 10), 0.0)
+        decided = None
+        for plate in ('RAB123C', 'RAB128C', 'RAB123C', 'RAB128C', 'RAB123C', 'RAB128C'):
+            decided = decided or track.add_reading([(plate, 0.5)])
+        self.assertEqual(len(track.readings), track.max_votes)
+        self.assertIn(decided, ('RAB123C', 'RAB128C'))
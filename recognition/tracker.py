@@ -0,0 +1,225 @@
+import itertools
+import time
+
+
+def box_iou(a, b):
+    """
+    Intersection over union of two (x1, y1, x2, y2) boxes.
+    """
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(ix2 - ix1, 0) * max(iy2 - iy1, 0)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class PlateVotes:
+    """
+    Streaming per-position votes over the OCR readings of one plate.
+
+    The candidates of a reading share out that reading's confidence, the
+    confidence of its best candidate, in proportion to their own, so a
+    reading weighs the same however many candidates it has. Every candidate
+    adds its share to the weight of its length and of each of its characters
+    at their positions, so plates of any length can be voted on side by
+    side. The posterior of the leading plate is the smallest share of weight
+    its length and each of its characters hold, counting `prior_weight` of
+    unseen evidence against them.
+    """
+
+    prior_weight = 0.25
+
+    def __init__(self):
+        self.readings = 0
+        self.total = 0.0
+        self.lengths = {}  # length -> weight
+        self.positions = {}  # length -> one {character: weight} per position
+
+    def add_reading(self, candidates):
+        """
+        Vote with the candidates of one reading.
+        :param candidates: (plate, confidence) candidates, most confident first.
+        """
+        confidences = sum(confidence for _, confidence in candidates)
+        if confidences <= 0.0:
+            return
+        scale = candidates[0][1] / confidences
+        self.readings += 1
+        for plate, confidence in candidates:
+            self.add(plate, confidence * scale)
+
+    def add(self, plate, weight):
+        self.total += weight
+        self.lengths[len(plate)] = self.lengths.get(len(plate), 0.0) + weight
+        positions = self.positions.setdefault(len(plate), [{} for _ in plate])
+        for votes, character in zip(positions, plate):
+            votes[character] = votes.get(character, 0.0) + weight
+
+    def best(self):
+        """
+        The leading plate and its posterior.
+        :return: (plate, posterior), or (None, 0.0) before the first vote.
+        """
+        if not self.lengths:
+            return None, 0.0
+        length = max(self.lengths, key=self.lengths.get)
+        length_weight = self.lengths[length]
+        posterior = length_weight / (self.total + self.prior_weight)
+
+        characters = []
+        for votes in self.positions[length]:
+            character = max(votes, key=votes.get)
+            characters.append(character)
+            posterior = min(posterior, votes[character] / (length_weight + self.prior_weight))
+        return ''.join(characters), posterior
+
+
+class PlateTrack:
+    """
+    One plate followed across frames, with the OCR votes collected for it.
+
+    Readings are only added by the decide stage, so a track needs no lock;
+    other stages only read `plate`, `label` and `needs_ocr`.
+    """
+
+    decision_threshold = 0.6  # Posterior at which the plate is decided
+    min_readings = 2  # Readings voted on before any plate is decided
+    max_votes = 6  # Decide on the leading plate once this many reads are in
+    min_score = 0.3  # Candidates less confident than this are not voted on
+    decision_timeout = 8.0  # Seconds after the first reading before the track gives up
+    text_detection_after = 2  # Recognizer misses before a crop is read once with the text detector
+
+    def __init__(self, track_id, box, now):
+        self.id = track_id
+        self.box = box
+        self.first_seen = now
+        self.last_seen = now
+        self.readings = []
+        self.scores = []
+        self.votes = PlateVotes()
+        self.posterior = 0.0
+        self.last_text = None
+        self.plate = None
+        self.first_read_at = None
+        self.ocr_calls = 0
+        self.ocr_seconds = 0.0
+        self.ocr_misses = 0  # Recognizer reads that found no plate
+        self.text_detected = False
+
+    @property
+    def expired(self):
+        """True once the track has been read for `decision_timeout` seconds without a decision."""
+        return (
+            self.plate is None and self.first_read_at is not None
+            and time.monotonic() - self.first_read_at > self.decision_timeout
+        )
+
+    @property
+    def needs_ocr(self):
+        """True until the plate of this track has been decided or the track expired."""
+        return self.plate is None and not self.expired
+
+    @property
+    def wants_text_detection(self):
+        """
+        True for the one read of this track that may fall back to the text
+        detector, once the recognizer alone missed `text_detection_after` times.
+        """
+        return not self.text_detected and self.ocr_misses >= self.text_detection_after
+
+    @property
+    def score(self):
+        """Mean OCR confidence of the best candidate of the readings that were voted on."""
+        return sum(self.scores) / len(self.scores) if self.scores else None
+
+    @property
+    def label(self):
+        """Text drawn next to the track on the stream."""
+        return self.plate or self.last_text
+
+    def add_reading(self, candidates):
+        """
+        Vote with the candidates of one OCR reading and try to decide the plate.
+        :param candidates: (plate, confidence) candidates of the reading, most confident first.
+        :return: The decided plate if this reading settled it, otherwise None.
+        """
+        if not self.needs_ocr or not candidates:
+            return None
+
+        if self.first_read_at is None:
+            self.first_read_at = time.monotonic()
+        self.last_text = candidates[0][0]
+
+        voted = [(plate, confidence) for plate, confidence in candidates if confidence >= self.min_score]
+        if voted:
+            self.readings.append(voted[0][0])
+            self.scores.append(voted[0][1])
+            self.votes.add_reading(voted)
+
+        plate, self.posterior = self.votes.best()
+        if len(self.readings) < self.min_readings:
+            return None
+        if plate and (self.posterior >= self.decision_threshold or len(self.readings) >= self.max_votes):
+            self.plate = plate
+            return self.plate
+        return None
+
+
+class PlateTracker:
+    """
+    Greedy IoU tracker that gives every detected plate box a track.
+
+    Used from the detect stage only. Boxes overlapping a live track by at
+    least `iou_threshold` continue it; the rest start new tracks, and tracks
+    not seen for `max_age` seconds are dropped.
+    """
+
+    iou_threshold = 0.3
+    max_age = 1.5
+
+    def __init__(self):
+        self.tracks = {}
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, now=None):
+        """
+        Match this frame's boxes to tracks.
+        :param boxes: List of (x1, y1, x2, y2) boxes detected in the frame.
+        :param now: Timestamp of the frame, defaults to time.monotonic().
+        :return: List of tracks, one per box and in the same order.
+        """
+        now = time.monotonic() if now is None else now
+
+        for track_id in [tid for tid, track in self.tracks.items() if now - track.last_seen > self.max_age]:
+            del self.tracks[track_id]
+
+        pairs = sorted(
+            ((box_iou(box, track.box), index, track_id)
+             for index, box in enumerate(boxes)
+             for track_id, track in self.tracks.items()),
+            reverse=True,
+        )
+
+        matched = [None] * len(boxes)
+        used = set()
+        for iou, index, track_id in pairs:
+            if iou < self.iou_threshold:
+                break
+            if matched[index] is not None or track_id in used:
+                continue
+            matched[index] = self.tracks[track_id]
+            used.add(track_id)
+
+        for index, box in enumerate(boxes):
+            track = matched[index]
+            if track is None:
+                track = PlateTrack(next(self._ids), box, now)
+                self.tracks[track.id] = track
+                matched[index] = track
+            track.box = box
+            track.last_seen = now
+
+        return matched
@@ -6,4 +6,6 @@ app_name = 'recognition'
 urlpatterns = [
     path('', views.home, name='home'),
     path('video-feed/', views.video_feed, name='video_feed'),
+    path('video-feed/<int:lane_id>/', views.lane_video_feed, name='lane_video_feed'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
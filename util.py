@@ -1,107 +1,226 @@
+import math
 import string
-import easyocr
+import threading
+import numpy as np
 
-# Initialize the OCR reader
-reader = easyocr.Reader(['en'], gpu=False)
+from plate_formats import DIGIT_CONFUSIONS, LETTER_CONFUSIONS, default_grammar
+
+# The OCR reader is created on first use, see get_reader()
+_reader = None
+_reader_lock = threading.Lock()
 
 # Comprehensive mapping dictionaries for character-to-digit and digit-to-character conversion
-dict_char_to_int = {'O': '0', 'I': '1', 'J': '3', 'A': '4', 'G': '6', 'S': '5', 'B': '8', 'Z': '2'}
-dict_int_to_char = {'0': 'C', '1': 'I', '3': 'J', '4': 'A', '6': 'G', '5': 'S', '8': 'B', '2': 'Z'}
+dict_char_to_int = DIGIT_CONFUSIONS
+dict_int_to_char = LETTER_CONFUSIONS
+
+# Plate formats readings are normalized and validated against, see plate_formats
+plate_grammar = default_grammar
+# Readings that need more corrections than this are not considered plates
+MAX_READING_COST = 2.0
+
+# Characters the recognizer may emit when reading a plate crop
+PLATE_CHARACTERS = string.ascii_uppercase + string.digits
+
+def get_reader():
+    """
+    Return the shared EasyOCR reader, creating it on first use.
+
+    Building the reader loads its models, which takes several seconds, so it
+    is not done at import time.
+
+    Returns:
+        easyocr.Reader: English reader running on the CPU.
+    """
+    global _reader
+    if _reader is None:
+        with _reader_lock:
+            if _reader is None:
+                import easyocr
+
+                _reader = easyocr.Reader(['en'], gpu=False)
+    return _reader
 
 def license_complies_format(text):
     """
-    Check if the license plate text complies with the Rwandan format.
+    Check if the license plate text complies with one of the known plate formats.
 
     Args:
         text (str): License plate text.
 
     Returns:
-        bool: True if the license plate complies with the format, False otherwise.
-    """
-    if len(text) == 7:  # Format: RAB123C
-        return (text[0] == 'R' and
-                text[1] in string.ascii_uppercase and
-                text[2] in string.ascii_uppercase and
-                text[3] in string.digits and
-                text[4] in string.digits and
-                text[5] in string.digits and
-                text[6] in string.ascii_uppercase)
-    elif len(text) == 8:  # Format: RAB123CD
-        return (text[0] == 'R' and
-                text[1] in string.ascii_uppercase and
-                text[2] in string.ascii_uppercase and
-                text[3] in string.digits and
-                text[4] in string.digits and
-                text[5] in string.digits and
-                text[6] in string.ascii_uppercase and
-                text[7] in string.ascii_uppercase)
-    else:
-        return False
+        bool: True if the text is a plate of one of the formats as is, False otherwise.
+    """
+    return plate_grammar.complies(text)
 
 def format_license(text):
     """
-    Format the license plate text by converting characters using the mapping dictionaries
-    and ensuring it follows the Rwandan license plate format.
+    Format the license plate text by reading it as the plate format it fits best,
+    correcting characters OCR commonly confuses along the way.
 
     Args:
         text (str): License plate text.
 
     Returns:
-        str: Formatted license plate text.
+        str: Formatted license plate text, or the text unchanged if it fits no format.
     """
-    license_plate_ = 'R'  # Force the first character to be 'R'
+    match = plate_grammar.best_match(text)
+    return match.plate if match else text
     
-    # Ensure the second and third characters are letters
-    for j in range(1, 3):
-        if text[j] in dict_int_to_char:  # If a digit looks like a letter, convert it back
-            license_plate_ += dict_int_to_char[text[j]]
-        elif text[j] in string.ascii_uppercase:
-            license_plate_ += text[j]
-        else:
-            license_plate_ += 'A'  # Default to 'A' if an error occurs
-
-    # Ensure the next three characters are digits
-    for j in range(3, 6):
-        if text[j] in dict_char_to_int:  # If a letter looks like a digit, convert it back
-            license_plate_ += dict_char_to_int[text[j]]
-        elif text[j] in string.digits:
-            license_plate_ += text[j]
-        else:
-            license_plate_ += '0'  # Default to '0' if an error occurs
-
-    # Ensure the last character is a letter
-    if len(text) > 6:
-        if text[6] == 'O':
-            license_plate_ += 'C'
-        elif text[6] in dict_int_to_char:  # If a digit looks like a letter, convert it back
-            license_plate_ += dict_int_to_char[text[6]]
-        elif text[6] in string.ascii_uppercase:
-            license_plate_ += text[6]
+def _reading_order(detections):
+    """
+    Sort text fragments found in a crop into reading order: lines top to
+    bottom, and fragments left to right within a line.
+
+    Args:
+        detections (list): (bbox, text, score) tuples as returned by EasyOCR.
+
+    Returns:
+        list: (text, score) tuples in reading order.
+    """
+    fragments = []
+    for bbox, text, score in detections:
+        ys = [point[1] for point in bbox]
+        xs = [point[0] for point in bbox]
+        fragments.append(((min(ys) + max(ys)) / 2, max(ys) - min(ys), min(xs), text, score))
+    fragments.sort()
+
+    lines = []
+    for centre, height, x, text, score in fragments:
+        # A fragment starts a new line once it is clearly below the current one
+        if lines and centre - lines[-1][0] <= height / 2:
+            lines[-1][1].append((x, text, score))
         else:
-            license_plate_ += 'A'  # Default to 'A' if an error occurs
+            lines.append((centre, [(x, text, score)]))
+    return [(text, score) for _, line in lines for _, text, score in sorted(line)]
+
+
+def _rank_candidates(fragments, max_candidates=5, grammar=None):
+    """
+    Score every plate that can be read from a crop's text fragments.
+
+    Every run of consecutive fragments is joined and read against all plate
+    formats. A candidate's confidence is the character-weighted OCR score of
+    its fragments, lowered for each confused or dropped character.
+
+    Args:
+        fragments (list): (text, score) tuples in reading order.
+        max_candidates (int): Number of candidates to return.
+        grammar (PlateGrammar): Plate formats to read, default plate_grammar.
+
+    Returns:
+        list: (plate, confidence) tuples, most confident first.
+    """
+    grammar = grammar or plate_grammar
+    candidates = {}
+    for start in range(len(fragments)):
+        for end in range(start + 1, len(fragments) + 1):
+            run = fragments[start:end]
+            text = ''.join(fragment for fragment, _ in run)
+            length = sum(len(fragment) for fragment, _ in run)
+            if not length:
+                continue
+            score = sum(fragment_score * len(fragment) for fragment, fragment_score in run) / length
+
+            for match in grammar.matches(text, max_cost=MAX_READING_COST):
+                confidence = score * math.exp(-match.cost)
+                if confidence > candidates.get(match.plate, 0.0):
+                    candidates[match.plate] = confidence
+
+    return sorted(candidates.items(), key=lambda item: item[1], reverse=True)[:max_candidates]
+
+
+def read_license_plate_candidates(license_plate_crops, batch_size=8, max_candidates=5, text_detection=None,
+                                  grammar=None):
+    """
+    Read ranked plate candidates from several cropped images.
+
+    The crops are already tight plate regions, so EasyOCR's CRAFT text detector
+    is skipped at first: the crops are stacked on one grayscale canvas and only
+    the recognizer runs, once per box of each batch. Crops whose single line of
+    text is not a plate, e.g. two-line or widely spaced plates, can be read again
+    with the text detector, and their fragments are combined in reading order.
+    That costs far more than the recognizer, and blurry or non-plate crops
+    would pay it every time, so callers reading a stream should only allow it
+    where the recognizer keeps failing.
+
+    Args:
+        license_plate_crops (list): Grayscale (numpy) crops containing one license plate each.
+        batch_size (int): Number of crops recognized per recognizer call.
+        max_candidates (int): Number of candidates to keep per crop.
+        text_detection (list): One bool per crop, whether it may be read with the
+            text detector if the recognizer finds no plate; None allows it for all.
+        grammar (PlateGrammar): Plate formats to read, e.g. those of a lane;
+            default plate_grammar.
+
+    Returns:
+        list: One list of (plate, confidence) tuples per crop, in input order, most
+        confident first; empty where no plate could be read.
+    """
+    results = [[] for _ in license_plate_crops]
+
+    for start in range(0, len(license_plate_crops), batch_size):
+        batch = license_plate_crops[start:start + batch_size]
+
+        # Stack the crops vertically, remembering where each one starts
+        width = max(crop.shape[1] for crop in batch)
+        height = sum(crop.shape[0] for crop in batch)
+        canvas = np.zeros((height, width), dtype=np.uint8)
+        boxes = []
+        offsets = {}
+        y = 0
+        for index, crop in enumerate(batch, start=start):
+            crop_height, crop_width = crop.shape[:2]
+            canvas[y:y + crop_height, :crop_width] = crop
+            boxes.append([0, crop_width, y, y + crop_height])
+            offsets[y] = index
+            y += crop_height
+
+        detections = get_reader().recognize(
+            canvas, horizontal_list=boxes, free_list=[],
+            batch_size=batch_size, allowlist=PLATE_CHARACTERS,
+        )
+
+        for bbox, text, score in detections:
+            index = offsets.get(int(bbox[0][1]))
+            if index is not None:
+                results[index] = _rank_candidates([(text, score)], max_candidates, grammar)
+
+    for index, candidates in enumerate(results):
+        if not candidates and (text_detection is None or text_detection[index]):
+            detections = get_reader().readtext(
+                license_plate_crops[index], allowlist=PLATE_CHARACTERS, paragraph=False,
+            )
+            results[index] = _rank_candidates(_reading_order(detections), max_candidates, grammar)
+
+    return results
+
+
+def read_license_plates(license_plate_crops, batch_size=8):
+    """
+    Read the license plate text from several cropped images in batches.
+
+    Args:
+        license_plate_crops (list): Grayscale (numpy) crops containing one license plate each.
+        batch_size (int): Number of crops recognized per recognizer call.
+
+    Returns:
+        list: One (text, score) tuple per crop, in input order, holding its most
+        confident candidate; (None, None) where no valid plate was read.
+    """
+    return [
+        candidates[0] if candidates else (None, None)
+        for candidates in read_license_plate_candidates(license_plate_crops, batch_size)
+    ]
+
 
-    return license_plate_
-    
 def read_license_plate(license_plate_crop):
     """
     Read the license plate text from the given cropped image.
 
     Args:
-        license_plate_crop (PIL.Image.Image): Cropped image containing the license plate.
+        license_plate_crop (numpy.ndarray): Grayscale crop containing the license plate.
 
     Returns:
         tuple: Tuple containing the corrected license plate text and its confidence score.
     """
-    detections = reader.readtext(license_plate_crop)
-
-    for detection in detections:
-        bbox, text, score = detection
-        text = text.upper().replace(' ', '')  # Remove spaces and convert to uppercase
-        
-        if len(text) >= 7:
-            formatted_license = format_license(text)
-            
-            if license_complies_format(formatted_license):
-                return formatted_license, score
-    
-    return None, None
+    return read_license_plates([license_plate_crop])[0]